@@ -0,0 +1,4 @@
+# Nạp .env đúng 1 lần khi package được import lần đầu (trước khi các module đọc os.getenv).
+from dotenv import load_dotenv
+
+load_dotenv()
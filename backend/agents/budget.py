@@ -0,0 +1,139 @@
+# agents/budget.py
+"""Ngân sách token cho prompt: đếm token và cắt các trường đầu vào theo độ ưu tiên.
+
+Mỗi prompt builder khai báo các trường biến thiên (report, draft, JSON, ...) kèm độ ưu
+tiên rồi gọi `trim_fields(call, fields, ...)` trước khi dựng prompt. Nếu tổng vượt ngân sách
+của call, các trường ít quan trọng nhất bị cắt trước (cùng mức thì cắt đều, trường dài
+nhất bị cắt nhiều nhất); trường trong `keep` không bao giờ bị cắt. Mỗi lần cắt đều log.
+
+Đếm token bằng tiktoken (encoding theo model); không có tiktoken / không tải được
+encoding (offline) hoặc TOKEN_COUNT_APPROX=true thì ước lượng chars / 4.
+
+Ngân sách input (token) theo call, ưu tiên từ cụ thể tới chung:
+    PROMPT_BUDGET_<CALL> (vd PROMPT_BUDGET_BUYERLIST)   PROMPT_BUDGET (8000)
+"""
+import functools
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from agents.cache import env_flag
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+_BUDGETS: Dict[str, int] = {
+    "assumption_builder": 3000,
+    "narrative": 3000,
+    "fallback_modeler": 3000,
+    "refresh": 6000,
+    "buyerlist": 6000,
+    "aggregate": 6000,
+    "combine": 12000,
+}
+
+_TRUNCATED = "\n…[truncated {n} tokens]"
+
+
+@functools.lru_cache(maxsize=16)
+def _encoding(model: str) -> Any:
+    """tiktoken encoding cho model; None nếu không dùng được (kết quả được nhớ, không thử lại)."""
+    if env_flag("TOKEN_COUNT_APPROX"):
+        return None
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # encoding phải tải về lần đầu -> offline thì fail
+        log.info("tiktoken unavailable for %s (%s); estimating tokens as chars/4", model, type(e).__name__)
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    enc = _encoding(model or DEFAULT_MODEL)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Giữ phần đầu `text` trong `max_tokens`, cắt lùi về cuối dòng gần nhất, ghi chú số token bị bỏ."""
+    total = count_tokens(text, model)
+    if total <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    keep = max(0, max_tokens - count_tokens(_TRUNCATED.format(n=total), model))
+    enc = _encoding(model or DEFAULT_MODEL)
+    head = enc.decode(enc.encode(text, disallowed_special=())[:keep]) if enc else text[:keep * 4]
+    # không để bảng markdown / câu bị cắt giữa dòng nếu mất ít hơn 1/5
+    nl = head.rfind("\n")
+    if nl >= len(head) * 4 // 5:
+        head = head[:nl]
+    return head.rstrip() + _TRUNCATED.format(n=total - count_tokens(head, model))
+
+
+def budget_for(call: str) -> int:
+    env = os.getenv(f"PROMPT_BUDGET_{call.upper()}") or os.getenv("PROMPT_BUDGET")
+    if env:
+        return int(env)
+    return _BUDGETS.get(call, 8000)
+
+
+def _caps(sizes: List[int], allowed: int) -> List[int]:
+    """Water-filling: mức trần chung c sao cho sum(min(size, c)) <= allowed."""
+    remaining, caps = allowed, list(sizes)
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    for k, i in enumerate(order):
+        share = remaining // (len(order) - k)
+        if sizes[i] <= share:
+            remaining -= sizes[i]
+            continue
+        for j in order[k:]:
+            caps[j] = share
+        break
+    return caps
+
+
+def trim_fields(call: str, fields: Dict[str, str], *, priority: Optional[Dict[str, int]] = None,
+                keep: Iterable[str] = (), template: str = "", budget: Optional[int] = None,
+                model: Optional[str] = None) -> Dict[str, str]:
+    """Trim `fields` so that template + fields fit the input budget of `call`.
+
+    `priority`: 0 = quan trọng nhất; mức lớn hơn bị cắt trước (mặc định 0).
+    `template`: phần cố định của prompt (chỉ dẫn), tính vào ngân sách nhưng không bị cắt.
+    """
+    budget = budget if budget is not None else budget_for(call)
+    priority, keep = priority or {}, set(keep)
+    sizes = {k: count_tokens(v or "", model) for k, v in fields.items()}
+    over = count_tokens(template, model) + sum(sizes.values()) - budget
+    if over <= 0:
+        return dict(fields)
+
+    out = dict(fields)
+    levels = sorted({priority.get(k, 0) for k in fields if k not in keep}, reverse=True)
+    for level in levels:
+        names = [k for k in fields if k not in keep and priority.get(k, 0) == level and sizes[k]]
+        if not names:
+            continue
+        group = sum(sizes[k] for k in names)
+        caps = _caps([sizes[k] for k in names], max(0, group - over))
+        for k, cap in zip(names, caps):
+            if cap < sizes[k]:
+                out[k] = truncate(fields[k] or "", cap, model)
+                log.warning("prompt budget %s (%d tokens): trimmed %s %d -> %d tokens",
+                            call, budget, k, sizes[k], cap)
+        over -= group - sum(caps)
+        if over <= 0:
+            break
+    if over > 0:
+        log.warning("prompt budget %s (%d tokens): still %d tokens over after trimming", call, budget, over)
+    return out
@@ -1,22 +1,322 @@
 # agents/buyerlist.py
-import os, textwrap
-from typing import Optional
-from langchain_openai import ChatOpenAI
+"""BuyerList: acquirer phù hợp với profile tài chính của target.
+
+Assumptions đã validate (projections.Assumptions, lưu trong kb["financial"]["assumptions"])
+-> band tăng trưởng / margin / doanh thu acquirer và FitScore tính bằng Python:
+
+    FitScore = 0.5*GrowthFit + 0.3*MarginFit + 0.2*Adjacency   (0–100)
+
+Ứng viên lấy từ acquirer universe cục bộ (agents/universe.py): lọc theo band + xếp hạng
+vectorized, LLM chỉ chấm Adjacency 0–100 + viết rationale cho shortlist (JSON gọn). Universe
+không đủ ứng viên (tắt / dataset nhỏ) thì LLM tự đề xuất ứng viên kèm số liệu ước lượng.
+Assumptions không hợp lệ thì LLM làm cả bảng như trước (không arithmetic-check), giống
+fallback_modeler của financial swarm.
+"""
+import json
+import os
+import re
+import textwrap
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from agents.budget import trim_fields
+from agents.entity import prompt_subject
+from agents.llm import routed_model
+from agents.memo import memoized
+from agents.projections import (CAGR_RANGE, MARGIN_RANGE, SCENARIOS, Assumptions, fmt_usd, in_range, parse_rate,
+                                parse_usd)
+from agents.universe import get_universe
+
+# FitScore = WEIGHTS · (GrowthFit, MarginFit, Adjacency)
+WEIGHTS = (0.5, 0.3, 0.2)
+# fit giảm tuyến tính từ 100 (trong band) về 0 khi lệch quá tolerance (điểm phần trăm)
+GROWTH_TOLERANCE = 0.15
+MARGIN_TOLERANCE = 0.20
+# chỉ số chưa biết (vd. quỹ PE không có margin) -> điểm trung tính
+NEUTRAL_FIT = 50.0
+# acquirer nên có doanh thu >= N lần doanh thu base-year của target
+MIN_REVENUE_MULTIPLE = float(os.getenv("BUYERLIST_MIN_REVENUE_MULTIPLE", "3"))
+# PE: dry powder >= N lần doanh thu base-year (đủ equity cho deal, chưa tính nợ)
+MIN_DRY_POWDER_MULTIPLE = float(os.getenv("BUYERLIST_MIN_DRY_POWDER_MULTIPLE", "1"))
+# shortlist từ universe gửi LLM chấm (strategic, PE); ít hơn MIN_SHORTLIST -> LLM tự đề xuất
+SHORTLIST = (10, 5)
+MIN_SHORTLIST = 4
+
+
+class BuyerListError(ValueError):
+    """LLM không trả về ứng viên nào dùng được."""
+
 
 def _llm():
-    return ChatOpenAI(model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"), temperature=0.2)
+    return memoized(routed_model("buyerlist", temperature=0.2))
+
+
+# ========================= BANDS / FITSCORE =========================
+@dataclass(frozen=True)
+class Bands:
+    growth: Tuple[float, float]            # CAGR Bear..Bull của target
+    margin: Tuple[float, float]            # EBIT margin Bear..Bull của target
+    min_revenue: Optional[float] = None    # USD; None nếu base-year revenue unknown
+
+
+def derive_bands(a: Assumptions) -> Bands:
+    cagr = [a.scenarios[s].cagr for s in SCENARIOS]
+    margin = [a.scenarios[s].ebit_margin for s in SCENARIOS]
+    rev = a.base_year_revenue * MIN_REVENUE_MULTIPLE if a.base_year_revenue else None
+    return Bands(growth=(min(cagr), max(cagr)), margin=(min(margin), max(margin)), min_revenue=rev)
+
+
+def band_fit(x: np.ndarray, band: Tuple[float, float], tolerance: float) -> np.ndarray:
+    """100 trong band, giảm tuyến tính về 0 khi cách band `tolerance`; NaN -> NEUTRAL_FIT."""
+    lo, hi = band
+    dist = np.maximum(lo - x, 0.0) + np.maximum(x - hi, 0.0)
+    fit = np.clip(100.0 * (1.0 - dist / tolerance), 0.0, 100.0)
+    return np.where(np.isnan(x), NEUTRAL_FIT, fit)
+
+
+def fit_scores(growth: np.ndarray, margin: np.ndarray, adjacency: np.ndarray, bands: Bands) -> Dict[str, np.ndarray]:
+    """Vectorized: mảng cùng shape (NaN = chưa biết) -> GrowthFit, MarginFit, Adjacency, FitScore."""
+    g = band_fit(np.asarray(growth, dtype=float), bands.growth, GROWTH_TOLERANCE)
+    m = band_fit(np.asarray(margin, dtype=float), bands.margin, MARGIN_TOLERANCE)
+    adj = np.clip(np.nan_to_num(np.asarray(adjacency, dtype=float), nan=NEUTRAL_FIT), 0.0, 100.0)
+    score = WEIGHTS[0] * g + WEIGHTS[1] * m + WEIGHTS[2] * adj
+    return {"growth_fit": g, "margin_fit": m, "adjacency": adj, "fit_score": score}
+
+
+# ========================= CANDIDATES (LLM) =========================
+@dataclass(frozen=True)
+class Candidate:
+    name: str
+    kind: str                      # strategic | financial
+    revenue: Optional[float]       # USD
+    growth: Optional[float]        # tăng trưởng doanh thu gần đây (0.12 = 12%)
+    margin: Optional[float]        # EBIT margin
+    adjacency: Optional[float]     # 0–100
+    rationale: str = ""
+    dry_powder: Optional[float] = None   # USD, PE
+
+
+def _score(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rate_or_none(value: Any, bounds) -> Optional[float]:
+    # tỉ lệ ngoài khoảng hợp lệ (vd. 12 thay vì 0.12) -> coi như không biết, không đoán đơn vị
+    x = parse_rate(value)
+    return x if in_range(x, bounds) else None
+
+
+def parse_candidates(content: Any) -> List[Candidate]:
+    """JSON array của LLM -> ứng viên (bỏ trùng tên, bỏ item sai format)."""
+    text = content if isinstance(content, str) else str(content)
+    m = re.search(r"\[.*\]", text, re.S)
+    try:
+        items = json.loads(m.group(0)) if m else None
+    except json.JSONDecodeError:
+        items = None
+    if not isinstance(items, list):
+        raise BuyerListError("buyerlist: LLM did not return a JSON array of candidates")
+    out: List[Candidate] = []
+    seen = set()
+    for it in items:
+        if not isinstance(it, dict) or not str(it.get("name") or "").strip():
+            continue
+        name = " ".join(str(it["name"]).split())
+        if name.lower() in seen:
+            continue
+        seen.add(name.lower())
+        kind = str(it.get("type") or "").lower()
+        out.append(Candidate(
+            name=name,
+            kind="financial" if ("financ" in kind or "pe" in kind.split() or "private" in kind) else "strategic",
+            revenue=parse_usd(it.get("revenue_usd")),
+            growth=_rate_or_none(it.get("revenue_growth"), CAGR_RANGE),
+            margin=_rate_or_none(it.get("ebit_margin"), MARGIN_RANGE),
+            adjacency=_score(it.get("adjacency")),
+            rationale=" ".join(str(it.get("rationale") or "").split()),
+        ))
+    if not out:
+        raise BuyerListError("buyerlist: no usable candidates in LLM output")
+    return out
+
+
+def _pct(x: float) -> str:
+    return f"{x:.1%}"
+
+
+def _bands_md(a: Assumptions, bands: Bands) -> str:
+    rev = (f"≥ {fmt_usd(bands.min_revenue)} ({MIN_REVENUE_MULTIPLE:g}× base-year revenue {fmt_usd(a.base_year_revenue)})"
+           if bands.min_revenue else f"n/a (base-year revenue unknown: {a.base_year_revenue_raw})")
+    return "\n".join([
+        f"- Revenue growth (3y CAGR, Bear–Bull): {_pct(bands.growth[0])} – {_pct(bands.growth[1])}",
+        f"- EBIT margin (Bear–Bull): {_pct(bands.margin[0])} – {_pct(bands.margin[1])}",
+        f"- Acquirer revenue: {rev}",
+    ])
 
-def run_buyerlist(company: str, financial_model_md: str, assumptions_json: str, feedback: Optional[str]=None) -> str:
-    prompt = f"""
-            You are a BuyerList agent.
 
-            Inputs:
-            - Company: {company}
-            - ASSUMPTIONS_JSON:
-            {assumptions_json}
-            - FINANCIAL_MODEL_MD:
-            {financial_model_md}
-            {f"Reviewer feedback:\n{feedback}" if feedback else ""}
+def _candidates_prompt(company: str, bands_md: str, feedback: str) -> str:
+    fb_txt = f"\nReviewer feedback:\n{feedback}\n" if feedback else ""
+    return textwrap.dedent("""
+    You are a BuyerList agent.
+
+    TASK:
+    Propose 8–12 potential acquirers of the company below that fit its TARGET PROFILE: strategic
+    buyers and financial sponsors (PE). No web search, no citations; use general knowledge.
+    For each, give your best estimates (null when unknown; for PE use the profile of assets it backs):
+    - revenue_usd: acquirer's annual revenue, e.g. "$25B"
+    - revenue_growth: acquirer's recent annual revenue growth as a decimal (0.12 = 12%)
+    - ebit_margin: acquirer's EBIT margin as a decimal
+    - adjacency: 0–100, how close the acquirer's products, customers and technology are to the company's
+    - rationale: one short line
+    Do NOT compute any fit score; scores are computed from these fields.
+    Return ONLY a JSON array:
+    [{{"name": "...", "type": "strategic|financial", "revenue_usd": "...", "revenue_growth": 0.1,
+      "ebit_margin": 0.2, "adjacency": 70, "rationale": "..."}}]
+
+    Company: {company}
+    TARGET PROFILE (computed from the financial model):
+    {bands_md}
+    {fb_txt}
+    """).format(company=company, bands_md=bands_md, fb_txt=fb_txt)
+
+
+def _budgeted_candidates_prompt(company: str, bands_md: str, feedback: Optional[str]) -> str:
+    f = trim_fields("buyerlist", {"feedback": feedback or ""}, template=_candidates_prompt(company, bands_md, ""))
+    return _candidates_prompt(company, bands_md, f["feedback"])
+
+
+# ========================= SHORTLIST (universe cục bộ) =========================
+def shortlist(company: str, a: Assumptions) -> List[Candidate]:
+    """Ứng viên từ universe: lọc theo band, xếp theo FitScore sơ bộ (Adjacency = sector overlap).
+
+    Adjacency ở đây chỉ là proxy (NaN nếu target không có trong universe); LLM chấm lại sau.
+    """
+    u = get_universe()
+    if not len(u):
+        return []
+    bands = derive_bands(a)
+    t = u.find(company)
+    overlap = u.sector_overlap(u.sectors[t] if t is not None else None)
+    base = a.base_year_revenue
+    mask = u.eligible(min_revenue=bands.min_revenue,
+                      min_dry_powder=base * MIN_DRY_POWDER_MULTIPLE if base else None,
+                      exclude=[t] if t is not None else [])
+    pre = fit_scores(u.growth, u.margin, overlap * 100.0, bands)["fit_score"]
+    picked: List[int] = []
+    for kind, k in zip(("strategic", "financial"), SHORTLIST):
+        idx = np.flatnonzero(mask & (u.kind == kind))
+        picked += [int(i) for i in idx[np.argsort(-pre[idx], kind="stable")][:k]]
+    out = []
+    for i in picked:
+        r = u.row(i)
+        out.append(Candidate(name=r["name"], kind=r["type"], revenue=r["revenue"], growth=r["growth"],
+                             margin=r["margin"], dry_powder=r["dry_powder"],
+                             adjacency=None if np.isnan(overlap[i]) else float(overlap[i] * 100.0),
+                             rationale=f"Sectors: {', '.join(r['sectors'])} ({r['geography']})"))
+    return out
+
+
+def _annotate_prompt(company: str, bands_md: str, candidates: List[Candidate], feedback: str) -> str:
+    fb_txt = f"\nReviewer feedback:\n{feedback}\n" if feedback else ""
+    rows = "\n".join(f"- {c.name} | {c.kind} | {c.rationale}" for c in candidates)
+    return textwrap.dedent("""
+    You are a BuyerList analyst.
+
+    TASK:
+    The candidate acquirers below were pre-selected and ranked from a local dataset against the
+    financial profile of the company. For EACH candidate judge:
+    - adjacency: 0–100, how close its products, customers and technology are to the company's
+    - rationale: one short line on why it would (or would not) buy the company
+    Do not add candidates, do not rename them, do not estimate financials. No web search, no citations.
+    Return ONLY a JSON array:
+    [{{"name": "...", "adjacency": 70, "rationale": "..."}}]
+
+    Company: {company}
+    TARGET PROFILE (computed from the financial model):
+    {bands_md}
+    CANDIDATES (name | type | sectors):
+    {rows}
+    {fb_txt}
+    """).format(company=company, bands_md=bands_md, rows=rows, fb_txt=fb_txt)
+
+
+def _budgeted_annotate_prompt(company: str, bands_md: str, candidates: List[Candidate], feedback: Optional[str]) -> str:
+    f = trim_fields("buyerlist", {"feedback": feedback or ""},
+                    template=_annotate_prompt(company, bands_md, candidates, ""))
+    return _annotate_prompt(company, bands_md, candidates, f["feedback"])
+
+
+def annotate(candidates: List[Candidate], content: Any) -> List[Candidate]:
+    """Gắn Adjacency + rationale của LLM vào shortlist (theo tên); thiếu thì giữ proxy sector overlap."""
+    try:
+        notes = {c.name.lower(): c for c in parse_candidates(content)}
+    except BuyerListError:
+        notes = {}
+    out = []
+    for c in candidates:
+        n = notes.get(c.name.lower())
+        if n is not None:
+            c = replace(c, adjacency=n.adjacency if n.adjacency is not None else c.adjacency,
+                        rationale=n.rationale or c.rationale)
+        out.append(c)
+    return out
+
+
+_UNIVERSE_NOTE = ("Candidates, revenue, growth, margin and dry powder come from the local acquirer universe "
+                  "(approximate figures); Adjacency and rationale are model judgments. Verify before use.")
+
+
+def render_buyerlist(a: Assumptions, candidates: List[Candidate], *, source_note: Optional[str] = None) -> str:
+    """Bảng Strategic / Financial xếp theo FitScore (tính cục bộ) + Assumptions & Caveats."""
+    bands = derive_bands(a)
+    nan = float("nan")
+    s = fit_scores(np.array([c.growth if c.growth is not None else nan for c in candidates]),
+                   np.array([c.margin if c.margin is not None else nan for c in candidates]),
+                   np.array([c.adjacency if c.adjacency is not None else nan for c in candidates]),
+                   bands)
+    parts = ["# Buyer List", "", "## Target Bands", _bands_md(a, bands)]
+    below = 0
+    for kind, title in (("strategic", "Strategic"), ("financial", "Financial (PE)")):
+        idx = sorted((i for i, c in enumerate(candidates) if c.kind == kind), key=lambda i: -s["fit_score"][i])
+        if not idx:
+            continue
+        parts += ["", f"## {title}",
+                  "| # | Buyer | FitScore | GrowthFit | MarginFit | Adjacency | Revenue | Rationale |",
+                  "|---|---|---|---|---|---|---|---|"]
+        for rank, i in enumerate(idx, 1):
+            c = candidates[i]
+            rev = fmt_usd(c.revenue) if c.revenue else \
+                f"{fmt_usd(c.dry_powder)} dry powder" if c.dry_powder else "n/a"
+            if c.revenue and bands.min_revenue and kind == "strategic" and c.revenue < bands.min_revenue:
+                rev += " (below band)"
+                below += 1
+            parts.append(f"| {rank} | {c.name} | {s['fit_score'][i]:.0f} | {s['growth_fit'][i]:.0f} | "
+                         f"{s['margin_fit'][i]:.0f} | {s['adjacency'][i]:.0f} | {rev} | {c.rationale.replace('|', '/')} |")
+    caveats = [
+        f"FitScore = {WEIGHTS[0]}×GrowthFit + {WEIGHTS[1]}×MarginFit + {WEIGHTS[2]}×Adjacency (0–100), computed "
+        "deterministically from the bands above.",
+        f"GrowthFit / MarginFit are 100 inside the target band and fall linearly to 0 at "
+        f"{GROWTH_TOLERANCE:.0%} / {MARGIN_TOLERANCE:.0%} outside it; unknown metrics score {NEUTRAL_FIT:.0f}.",
+        source_note or "Acquirer revenue, growth, margin and Adjacency are model estimates without web search; "
+                       "verify before use.",
+    ]
+    if below:
+        caveats.append(f"{below} strategic candidate(s) are below the acquirer revenue band and may struggle to absorb the target.")
+    parts += ["", "## Assumptions & Caveats", *(f"- {c}" for c in caveats)]
+    return "\n".join(parts) + "\n"
+
+
+# ========================= FALLBACK (assumptions không hợp lệ) =========================
+def _buyerlist_prompt(company: str, financial_model_md: str, assumptions_json: str, feedback: Optional[str]=None) -> str:
+    # Python < 3.12 không cho "\n" trong biểu thức f-string -> dựng trước
+    fb_txt = f"Reviewer feedback:\n{feedback}" if feedback else ""
+    return f"""
+You are a BuyerList agent.
 
 TASK:
 1) Parse ASSUMPTIONS_JSON to get base_year_revenue (if any), CAGR for base/bull/bear, and EBIT margins.
@@ -24,6 +324,63 @@ TASK:
 3) Propose 8–12 buyers grouped by Strategic vs Financial that *fit those bands*.
 4) Compute FitScore = 0.5*GrowthFit + 0.3*MarginFit + 0.2*Adjacency (0–100). Show the three sub-scores.
 5) Add "Assumptions & Caveats". No web search. No citations. Return Markdown only.
+
+Inputs:
+- Company: {company}
+- ASSUMPTIONS_JSON:
+{assumptions_json}
+- FINANCIAL_MODEL_MD:
+{financial_model_md}
+{fb_txt}
 """
-    return _llm().invoke(prompt).content
 
+def _budgeted_prompt(company: str, financial_model_md: str, assumptions_json: str, feedback: Optional[str]) -> str:
+    # assumptions là input chính (không cắt); bảng model dài nhất -> bị cắt trước feedback
+    f = trim_fields("buyerlist",
+                    {"assumptions_json": assumptions_json, "feedback": feedback or "",
+                     "financial_model_md": financial_model_md},
+                    priority={"feedback": 1, "financial_model_md": 2}, keep=("assumptions_json",),
+                    template=_buyerlist_prompt(company, "", "", None))
+    return _buyerlist_prompt(company, f["financial_model_md"], f["assumptions_json"], f["feedback"] or None)
+
+
+_FALLBACK_NOTE = ("\n\n### Sanity notes\n- Assumptions failed validation; bands and FitScores were produced by the "
+                  "LLM and not arithmetic-checked.")
+
+
+# ========================= PUBLIC API =========================
+def run_buyerlist(company: str, financial_model_md: str, assumptions_json: str, feedback: Optional[str]=None,
+                  *, assumptions: Optional[Dict[str, Any]] = None, entity: str = "") -> str:
+    """`assumptions`: Assumptions.to_dict() đã validate (kb); None -> LLM parse `assumptions_json` như trước.
+
+    `company` là tên (tra universe); `entity` (khối RESOLVED ENTITY) chỉ đưa vào prompt.
+    """
+    if assumptions is None:
+        subject = prompt_subject(company, entity)
+        return _llm().invoke(_budgeted_prompt(subject, financial_model_md, assumptions_json, feedback)).content + _FALLBACK_NOTE
+    a = Assumptions.from_dict(assumptions)
+    bands_md = _bands_md(a, derive_bands(a))
+    short = shortlist(company, a)
+    subject = prompt_subject(company, entity, indent="    ")
+    if len(short) >= MIN_SHORTLIST:
+        content = _llm().invoke(_budgeted_annotate_prompt(subject, bands_md, short, feedback)).content
+        return render_buyerlist(a, annotate(short, content), source_note=_UNIVERSE_NOTE)
+    prompt = _budgeted_candidates_prompt(subject, bands_md, feedback)
+    return render_buyerlist(a, parse_candidates(_llm().invoke(prompt).content))
+
+
+async def arun_buyerlist(company: str, financial_model_md: str, assumptions_json: str, feedback: Optional[str]=None,
+                         *, assumptions: Optional[Dict[str, Any]] = None, entity: str = "") -> str:
+    if assumptions is None:
+        subject = prompt_subject(company, entity)
+        msg = await _llm().ainvoke(_budgeted_prompt(subject, financial_model_md, assumptions_json, feedback))
+        return msg.content + _FALLBACK_NOTE
+    a = Assumptions.from_dict(assumptions)
+    bands_md = _bands_md(a, derive_bands(a))
+    short = shortlist(company, a)
+    subject = prompt_subject(company, entity, indent="    ")
+    if len(short) >= MIN_SHORTLIST:
+        msg = await _llm().ainvoke(_budgeted_annotate_prompt(subject, bands_md, short, feedback))
+        return render_buyerlist(a, annotate(short, msg.content), source_note=_UNIVERSE_NOTE)
+    prompt = _budgeted_candidates_prompt(subject, bands_md, feedback)
+    return render_buyerlist(a, parse_candidates((await _llm().ainvoke(prompt)).content))
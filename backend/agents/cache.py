@@ -0,0 +1,178 @@
+# agents/cache.py
+"""On-disk result cache (SQLite) cho các node nặng của supervisor graph.
+
+Key = node + company đã chuẩn hoá + feedback + model config, có TTL,
+giới hạn số entry theo LRU và cờ force-refresh.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Awaitable, Callable, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key         TEXT PRIMARY KEY,
+    node        TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_last_access ON results(last_access);
+"""
+
+_DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "results.sqlite")
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def normalize_company(query: str) -> str:
+    """'  NVIDIA  Corp. ' -> 'nvidia corp' (bỏ dấu câu, gộp khoảng trắng, lowercase)."""
+    s = unicodedata.normalize("NFKC", query or "").casefold()
+    s = re.sub(r"[^\w\s&-]", " ", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def cache_key(node: str, company: str, feedback: str = "", model: str = "") -> str:
+    raw = json.dumps(
+        [node, normalize_company(company), (feedback or "").strip(), model or ""],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed key/value cache with TTL and LRU eviction.
+
+    Values must be JSON-serializable. Safe to share across threads.
+    """
+
+    def __init__(self, path: Optional[str] = None, *, ttl_s: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        self.path = path or os.getenv("RESULT_CACHE_PATH", _DEFAULT_PATH)
+        self.ttl_s = float(ttl_s if ttl_s is not None else os.getenv("RESULT_CACHE_TTL_S", 3 * 24 * 3600))
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv("RESULT_CACHE_MAX_ENTRIES", 500))
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT value, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_s > 0 and now - created_at > self.ttl_s:
+                db.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            db.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def peek(self, key: str) -> Optional[tuple[Any, float]]:
+        """(value, created_at) kể cả khi đã quá TTL; không xoá, không cập nhật LRU (vd. để refresh report cũ)."""
+        with self._lock:
+            row = self._db().execute("SELECT value, created_at FROM results WHERE key = ?", (key,)).fetchone()
+        return (json.loads(row[0]), float(row[1])) if row else None
+
+    def put(self, key: str, value: Any, *, node: str = "") -> None:
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO results(key, node, value, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, node, payload, now, now),
+            )
+            if self.max_entries > 0:
+                # LRU: giữ lại max_entries entry được truy cập gần nhất
+                db.execute(
+                    "DELETE FROM results WHERE key NOT IN "
+                    "(SELECT key FROM results ORDER BY last_access DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM results")
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResultCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+
+def is_cacheable(value: Any) -> bool:
+    # không cache lỗi upstream để lần sau còn retry
+    blob = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return bool(blob) and "[tool_error]" not in blob
+
+
+def cached_call(node: str, company: str, feedback: str, fn: Callable[[], Any], *,
+                model: str = "", force_refresh: bool = False) -> Any:
+    """Return the cached result for (node, company, feedback, model) or compute it with `fn`.
+
+    Disabled entirely with RESULT_CACHE_DISABLED=true; `force_refresh` (or
+    RESULT_CACHE_FORCE_REFRESH=true) skips the lookup but still stores the fresh result.
+    """
+    if env_flag("RESULT_CACHE_DISABLED"):
+        return fn()
+
+    key = cache_key(node, company, feedback, model)
+    cache = get_cache()
+    if not (force_refresh or env_flag("RESULT_CACHE_FORCE_REFRESH")):
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+
+    value = fn()
+    if is_cacheable(value):
+        cache.put(key, value, node=node)
+    return value
+
+
+async def acached_call(node: str, company: str, feedback: str, afn: Callable[[], Awaitable[Any]], *,
+                       model: str = "", force_refresh: bool = False) -> Any:
+    """Async variant of `cached_call`; `afn` returns an awaitable (SQLite I/O stays inline, it is ms-level)."""
+    if env_flag("RESULT_CACHE_DISABLED"):
+        return await afn()
+
+    key = cache_key(node, company, feedback, model)
+    cache = get_cache()
+    if not (force_refresh or env_flag("RESULT_CACHE_FORCE_REFRESH")):
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+
+    value = await afn()
+    if is_cacheable(value):
+        cache.put(key, value, node=node)
+    return value
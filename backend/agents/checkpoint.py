@@ -0,0 +1,429 @@
+# agents/checkpoint.py
+"""Checkpoint gọn cho supervisor graph: string lớn lưu 1 lần, theo nội dung, nén zlib.
+
+Mỗi superstep LangGraph serialize lại channel đổi version; channel `messages` (add_messages)
+mang theo toàn bộ ToolMessage/AIMessage chứa report, nên cùng 1 report bị ghi lại mỗi bước.
+
+- `BlobSerializer`: bọc JsonPlusSerializer; string >= CHECKPOINT_BLOB_MIN_CHARS (1024) — trong
+  dict/list/tuple hay `content` của message — được thay bằng ref `\\x00blob:<sha256>` và lưu
+  vào `BlobStore` (in-memory hoặc SQLite). Checkpoint chỉ giữ ref; report giống nhau giữa các
+  bước/thread chỉ lưu 1 bản.
+- `SQLiteSaver`: checkpointer trên SQLite (1 file, WAL), cùng layout với InMemorySaver
+  (checkpoint / channel value theo version / pending writes) + bảng blob dùng chung, nên ghi
+  checkpoint và load thread state tỉ lệ với phần thay đổi chứ không với tổng số report.
+
+    make_checkpointer()          # CHECKPOINT_DB=path -> SQLiteSaver, ngược lại InMemorySaver + BlobSerializer
+
+Phạm vi: chỉ áp dụng khi graph được compile với checkpointer này (main.py, CHECKPOINT_DB đặt, chạy
+ngoài server). LangGraph API server (langgraph dev / platform) bỏ qua checkpointer của graph và dùng
+persistence + serializer riêng, nên `.langgraph_api/` KHÔNG nhỏ đi nhờ module này; phía server,
+checkpoint chỉ gọn nhờ state giữ 1 bản mỗi report (field section; ToolMessage / AIMessage / kb giữ ref).
+"""
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+_REF = "\x00blob:"
+_MIN_CHARS = int(os.getenv("CHECKPOINT_BLOB_MIN_CHARS", "1024"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    key   TEXT PRIMARY KEY,
+    data  BLOB NOT NULL,
+    size  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id     TEXT,
+    type          TEXT NOT NULL,
+    checkpoint    BLOB NOT NULL,
+    meta_type     TEXT NOT NULL,
+    metadata      BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS channel_values (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel       TEXT NOT NULL,
+    version       TEXT NOT NULL,
+    type          TEXT NOT NULL,
+    value         BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id       TEXT NOT NULL,
+    idx           INTEGER NOT NULL,
+    channel       TEXT NOT NULL,
+    type          TEXT NOT NULL,
+    value         BLOB NOT NULL,
+    task_path     TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+# ========================= BLOB STORE =========================
+class BlobStore:
+    """Content-addressed, zlib-compressed string store (in-memory; `SQLiteBlobStore` để bền)."""
+
+    def __init__(self, cache_size: int = 256):
+        self._lock = threading.Lock()
+        self._data: Dict[str, bytes] = {}
+        self._hot: "OrderedDict[str, str]" = OrderedDict()   # key -> text đã giải nén
+        self._cache_size = cache_size
+
+    def _has(self, key: str) -> bool:
+        return key in self._data
+
+    def _stored(self, key: str) -> bool:
+        # in-memory: text trong cache nóng chắc chắn đã nằm trong _data
+        return key in self._hot or self._has(key)
+
+    def _write(self, key: str, data: bytes, size: int) -> None:
+        self._data[key] = data
+
+    def _read(self, key: str) -> Optional[bytes]:
+        return self._data.get(key)
+
+    def _remember(self, key: str, text: str) -> None:
+        self._hot[key] = text
+        self._hot.move_to_end(key)
+        while len(self._hot) > self._cache_size:
+            self._hot.popitem(last=False)
+
+    def put(self, text: str) -> str:
+        raw = text.encode("utf-8")
+        key = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            if not self._stored(key):
+                self._write(key, zlib.compress(raw, 6), len(raw))
+            self._remember(key, text)
+        return key
+
+    def forget(self, keys: Iterable[str]) -> None:
+        """Bỏ `keys` khỏi cache nóng (blob đã bị xoá khỏi store)."""
+        with self._lock:
+            for key in keys:
+                self._hot.pop(key, None)
+
+    def get(self, key: str) -> str:
+        with self._lock:
+            text = self._hot.get(key)
+            if text is not None:
+                self._hot.move_to_end(key)
+                return text
+            data = self._read(key)
+            if data is None:
+                raise KeyError(f"checkpoint blob {key} missing")
+            text = zlib.decompress(data).decode("utf-8")
+            self._remember(key, text)
+            return text
+
+
+class SQLiteBlobStore(BlobStore):
+    def __init__(self, conn: sqlite3.Connection, cache_size: int = 256):
+        super().__init__(cache_size)
+        self._conn = conn
+
+    def _has(self, key: str) -> bool:
+        return self._conn.execute("SELECT 1 FROM blobs WHERE key = ?", (key,)).fetchone() is not None
+
+    def _stored(self, key: str) -> bool:
+        # luôn hỏi DB: row có thể đã mất dù text còn trong cache nóng (vacuum_blobs, transaction rollback)
+        return self._has(key)
+
+    def _write(self, key: str, data: bytes, size: int) -> None:
+        self._conn.execute("INSERT OR IGNORE INTO blobs(key, data, size) VALUES (?, ?, ?)", (key, data, size))
+
+    def _read(self, key: str) -> Optional[bytes]:
+        row = self._conn.execute("SELECT data FROM blobs WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+
+# ========================= SERIALIZER =========================
+class BlobSerializer:
+    """SerializerProtocol: thay string lớn bằng ref vào `store` rồi serialize bằng `inner`."""
+
+    def __init__(self, store: Optional[BlobStore] = None, inner: Any = None, min_chars: int = _MIN_CHARS):
+        self.store = store or BlobStore()
+        self.inner = inner or JsonPlusSerializer()
+        self.min_chars = min_chars
+
+    def _out(self, v: Any) -> Any:
+        if isinstance(v, str):
+            return _REF + self.store.put(v) if len(v) >= self.min_chars else v
+        if isinstance(v, BaseMessage):
+            content = self._out(v.content)
+            return v if content is v.content else v.model_copy(update={"content": content})
+        if isinstance(v, dict):
+            return {k: self._out(x) for k, x in v.items()}
+        if isinstance(v, list):
+            return [self._out(x) for x in v]
+        if isinstance(v, tuple) and not hasattr(v, "_fields"):
+            return tuple(self._out(x) for x in v)
+        return v
+
+    def _in(self, v: Any) -> Any:
+        if isinstance(v, str):
+            return self.store.get(v[len(_REF):]) if v.startswith(_REF) else v
+        if isinstance(v, BaseMessage):
+            content = self._in(v.content)
+            return v if content is v.content else v.model_copy(update={"content": content})
+        if isinstance(v, dict):
+            return {k: self._in(x) for k, x in v.items()}
+        if isinstance(v, list):
+            return [self._in(x) for x in v]
+        if isinstance(v, tuple) and not hasattr(v, "_fields"):
+            return tuple(self._in(x) for x in v)
+        return v
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return self.inner.dumps_typed(self._out(obj))
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return self._in(self.inner.loads_typed(data))
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.inner.dumps(self._out(obj))
+
+    def loads(self, data: bytes) -> Any:
+        return self._in(self.inner.loads(data))
+
+
+# ========================= SQLITE CHECKPOINTER =========================
+def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                             "checkpoint_id": checkpoint_id}}
+
+
+class SQLiteSaver(BaseCheckpointSaver[str]):
+    """Checkpointer SQLite; string lớn đi qua BlobSerializer vào bảng `blobs` của cùng file."""
+
+    def __init__(self, path: Optional[str] = None, *, min_chars: int = _MIN_CHARS):
+        self.path = path or os.getenv("CHECKPOINT_DB", ":memory:")
+        self._conn = _connect(self.path)
+        self._lock = threading.RLock()
+        super().__init__(serde=BlobSerializer(SQLiteBlobStore(self._conn), min_chars=min_chars))
+
+    def _load(self, thread_id: str, checkpoint_ns: str, row: Tuple[Any, ...]) -> CheckpointTuple:
+        checkpoint_id, parent_id, typ, blob, meta_type, meta = row
+        checkpoint: Checkpoint = self.serde.loads_typed((typ, blob))
+        values: Dict[str, Any] = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            r = self._conn.execute(
+                "SELECT type, value FROM channel_values WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND channel = ? AND version = ?", (thread_id, checkpoint_ns, channel, str(version))).fetchone()
+            if r and r[0] != "empty":
+                values[channel] = self.serde.loads_typed((r[0], r[1]))
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+            "AND checkpoint_id = ? ORDER BY task_id, idx", (thread_id, checkpoint_ns, checkpoint_id)).fetchall()
+        return CheckpointTuple(
+            config=_config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self.serde.loads_typed((meta_type, meta)),
+            parent_config=_config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+            pending_writes=[(t, c, self.serde.loads_typed((ty, v))) for t, c, ty, v in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        sql = ("SELECT checkpoint_id, parent_id, type, checkpoint, meta_type, metadata FROM checkpoints "
+               "WHERE thread_id = ? AND checkpoint_ns = ?")
+        args: Tuple[Any, ...] = (thread_id, checkpoint_ns)
+        if checkpoint_id := get_checkpoint_id(config):
+            sql, args = sql + " AND checkpoint_id = ?", args + (checkpoint_id,)
+        else:
+            sql += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(sql, args).fetchone()
+            return self._load(thread_id, checkpoint_ns, row) if row else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        sql = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, meta_type, metadata "
+               "FROM checkpoints WHERE 1 = 1")
+        args: list = []
+        if config:
+            sql += " AND thread_id = ?"
+            args.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                sql += " AND checkpoint_ns = ?"
+                args.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                sql += " AND checkpoint_id = ?"
+                args.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            sql += " AND checkpoint_id < ?"
+            args.append(before_id)
+        sql += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            with self._lock:
+                metadata = self.serde.loads_typed((row[4], row[5]))
+                if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                item = self._load(thread_id, checkpoint_ns, tuple(row))
+            if limit is not None:
+                limit -= 1
+            yield item
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        c = checkpoint.copy()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        values: Dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+        with self._lock:
+            # serialize trong transaction: blob mới ghi cùng commit/rollback với checkpoint
+            self._conn.execute("BEGIN")
+            try:
+                rows = [(thread_id, checkpoint_ns, k, str(v),
+                         *(self.serde.dumps_typed(values[k]) if k in values else ("empty", b"")))
+                        for k, v in new_versions.items()]
+                typ, blob = self.serde.dumps_typed(c)
+                meta_type, meta = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+                self._conn.executemany("INSERT OR REPLACE INTO channel_values VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                     typ, blob, meta_type, meta))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return _config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                rows = []
+                for idx, (channel, value) in enumerate(writes):
+                    idx = WRITES_IDX_MAP.get(channel, idx)
+                    # write đặc biệt (idx < 0, vd. error/interrupt) thì ghi đè; write thường giữ bản đầu
+                    rows.append((idx >= 0, (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel,
+                                            *self.serde.dumps_typed(value), task_path)))
+                for keep_first, row in rows:
+                    verb = "INSERT OR IGNORE" if keep_first else "INSERT OR REPLACE"
+                    self._conn.execute(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete_thread(self, thread_id: str) -> None:
+        # blob không bị xoá: có thể đang được thread khác tham chiếu (xem `vacuum_blobs`)
+        with self._lock:
+            for table in ("checkpoints", "channel_values", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def vacuum_blobs(self) -> int:
+        """Xoá blob không còn checkpoint/channel value/write nào tham chiếu; trả về số blob đã xoá."""
+        with self._lock:
+            live = set()
+            for table, cols in (("checkpoints", ("type", "checkpoint")), ("checkpoints", ("meta_type", "metadata")),
+                                ("channel_values", ("type", "value")), ("writes", ("type", "value"))):
+                for typ, blob in self._conn.execute(f"SELECT {cols[0]}, {cols[1]} FROM {table}"):
+                    if typ != "empty":
+                        _collect_refs(self.serde.inner.loads_typed((typ, blob)), live)
+            dead = [k for (k,) in self._conn.execute("SELECT key FROM blobs") if k not in live]
+            self._conn.executemany("DELETE FROM blobs WHERE key = ?", [(k,) for k in dead])
+            self.serde.store.forget(dead)
+            return len(dead)
+
+    # async: SQLite I/O ở mức ms, chạy inline như agents/cache.py
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # cùng format với InMemorySaver: "<số thứ tự 32 chữ số>.<random>" (so sánh được dạng chuỗi)
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+def _collect_refs(v: Any, out: set) -> None:
+    if isinstance(v, str):
+        if v.startswith(_REF):
+            out.add(v[len(_REF):])
+    elif isinstance(v, BaseMessage):
+        _collect_refs(v.content, out)
+    elif isinstance(v, dict):
+        for x in v.values():
+            _collect_refs(x, out)
+    elif isinstance(v, (list, tuple)):
+        for x in v:
+            _collect_refs(x, out)
+
+
+def make_checkpointer() -> BaseCheckpointSaver:
+    """CHECKPOINT_DB=path -> SQLiteSaver; ngược lại InMemorySaver với BlobSerializer (dedup trong RAM)."""
+    path = os.getenv("CHECKPOINT_DB")
+    if path:
+        return SQLiteSaver(path)
+    return InMemorySaver(serde=BlobSerializer())
@@ -1,37 +1,5 @@
-import os
-from typing import Literal
-from tavily import TavilyClient
-from deepagents import create_deep_agent
-from langchain.chat_models import init_chat_model
-from dotenv import load_dotenv
-
-load_dotenv()
-
-tavily_client = TavilyClient() 
-
-def internet_search(
-    query: str,
-    max_results: int = 3,
-    topic: Literal["general", "news", "finance"] = "general",
-    include_raw_content: bool = False,
-):
-    """Run a web search via Tavily.
-
-    Args:
-        query: search query string.
-        max_results: number of results to return.
-        topic: 'general' | 'news' | 'finance'.
-        include_raw_content: whether to include raw page content.
-
-    Returns:
-        Tavily response (dict/list) with search results.
-    """
-    return tavily_client.search(
-        query=query,
-        max_results=max_results,
-        include_raw_content=include_raw_content,
-        topic=topic,
-    )
+from agents.llm import routed_model
+from agents.search import search_tool
 
 sub_research_prompt = """You are a dedicated COMPANY researcher.
 
@@ -42,6 +10,7 @@ Step 1 — Disambiguate the entity:
 - Identify the official/canonical company name, country, primary website (domain),
   investor relations page (if public), and stock ticker + exchange (if applicable).
 - Cross-check at least two reputable sources. Prefer official/primary sources.
+- If the task already gives a RESOLVED ENTITY block, use it as-is and skip this step.
 
 Step 2 — Research deeply:
 - Use `internet_search` to discover, verify, and gather facts.
@@ -80,6 +49,7 @@ OPERATING RULES
 
 WORKFLOW
 0) Disambiguate the company (official name, website/domain, IR page, ticker+exchange if public).
+   If the message contains a RESOLVED ENTITY block, use it as-is and skip this step.
 1) Plan queries and use `internet_search` to discover and verify facts.
 2) Extract key facts and synthesize.
 3) Write the final report (Markdown). Do NOT include your process.
@@ -125,20 +95,29 @@ TOOLS
 - `internet_search(query, max_results=..., topic=..., include_raw_content=...)` for discovery/verification.
 """
 
-model = init_chat_model(
-    "openai:gpt-4o-mini",
-   
-    temperature=0.2,
-    max_tokens=1200,      
-    request_timeout=45,    
-    timeout=30_000,
-    max_retries=1
-)
-
-deep_research_agent = create_deep_agent(
-    [internet_search],                
-    research_instructions,
-    subagents=[research_sub_agent],  
-    model=model
-).with_config({"recursion_limit": 24})
-
+def build_agent():
+    """Dựng deep agent (gọi qua agents.registry.get_agent, chỉ 1 lần / process)."""
+    from deepagents import create_deep_agent
+
+    # model + max_tokens theo route "company" (agents/routing.py), fallback khi vi phạm SLO
+    model = routed_model(
+        "company",
+        temperature=0.2,
+        request_timeout=45,
+        timeout=30_000,
+        max_attempts=2,       # fail nhanh; limiter + Retry-After ở agents/llm.py
+    )
+    return create_deep_agent(
+        [search_tool()],
+        research_instructions,
+        subagents=[research_sub_agent],
+        model=model
+    ).with_config({"recursion_limit": 24})
+
+
+def __getattr__(name: str):
+    # tương thích ngược: `from agents.company_agent import deep_research_agent` vẫn chạy, nhưng dựng lười
+    if name == "deep_research_agent":
+        from agents.registry import get_agent
+        return get_agent("company")
+    raise AttributeError(name)
@@ -0,0 +1,85 @@
+# agents/dag.py
+"""Tiện ích DAG cho pipeline của supervisor graph: thứ tự topo + critical path.
+
+`deps` là map node -> danh sách node phải xong trước (xem `PIPELINE` trong main.py).
+
+    python -m agents.dag            # critical path theo ước lượng mặc định
+"""
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+
+
+def topo_order(deps: Mapping[str, Sequence[str]]) -> List[str]:
+    """Kahn's algorithm; raises ValueError on cycles."""
+    nodes = set(deps)
+    for ds in deps.values():
+        nodes.update(ds)
+    indeg = {n: 0 for n in nodes}
+    children: Dict[str, List[str]] = {n: [] for n in nodes}
+    for node, ds in deps.items():
+        for d in ds:
+            indeg[node] += 1
+            children[d].append(node)
+
+    ready = sorted(n for n, k in indeg.items() if k == 0)
+    order: List[str] = []
+    while ready:
+        n = ready.pop(0)
+        order.append(n)
+        for c in children[n]:
+            indeg[c] -= 1
+            if indeg[c] == 0:
+                ready.append(c)
+    if len(order) != len(nodes):
+        raise ValueError("pipeline has a cycle")
+    return order
+
+
+def descendants(deps: Mapping[str, Sequence[str]], roots: Iterable[str]) -> List[str]:
+    """Các node phụ thuộc (trực tiếp/gián tiếp) vào `roots`, theo thứ tự topo."""
+    roots = set(roots)
+    order = topo_order(deps)
+    marked = set(roots)
+    for n in order:
+        if any(d in marked for d in deps.get(n, ())):
+            marked.add(n)
+    return [n for n in order if n in marked and n not in roots]
+
+
+def critical_path(deps: Mapping[str, Sequence[str]],
+                  durations_ms: Mapping[str, float]) -> Tuple[float, List[str]]:
+    """Longest (duration-weighted) path through the DAG.
+
+    End-to-end latency của pipeline song song ≈ tổng thời gian trên path này,
+    nên đây là chỗ cần tối ưu trước. Node không có trong `durations_ms` tính = 0.
+    """
+    order = topo_order(deps)
+    finish: Dict[str, float] = {}
+    prev: Dict[str, str] = {}
+    for n in order:
+        start = 0.0
+        for d in deps.get(n, ()):
+            if finish[d] >= start:
+                start, prev[n] = finish[d], d
+        finish[n] = start + float(durations_ms.get(n, 0.0))
+
+    # hoà thì lấy node cuối theo topo (sink/join)
+    end = max(reversed(order), key=finish.get)
+    path = [end]
+    while path[-1] in prev:
+        path.append(prev[path[-1]])
+    return finish[end], path[::-1]
+
+
+def format_critical_path(deps: Mapping[str, Sequence[str]], durations_ms: Mapping[str, float]) -> str:
+    total, path = critical_path(deps, durations_ms)
+    serial = sum(float(durations_ms.get(n, 0.0)) for n in topo_order(deps))
+    lines = [f"critical path: {total / 1000:.1f} s (sequential sum would be {serial / 1000:.1f} s)"]
+    for n in path:
+        lines.append(f"  {n:<18} {float(durations_ms.get(n, 0.0)) / 1000:>7.1f} s")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from main import NODE_COST_HINT_MS, PIPELINE
+
+    print(format_critical_path(PIPELINE, NODE_COST_HINT_MS))
@@ -0,0 +1,107 @@
+# agents/deadline.py
+"""Deadline (ngân sách latency) của cả run, truyền xuống mọi node / LLM call / search call.
+
+n_parse_input đặt state["deadline"] = lúc bắt đầu + RUN_DEADLINE_S (payload `deadline_s` để
+đổi cho 1 run); main._node đặt contextvar bằng `use_deadline`, nên mọi code chạy trong node
+(kể cả thread của swarm, vì dùng contextvars.copy_context) thấy cùng deadline:
+
+- `check()` trước mỗi attempt; `sleep/asleep` (backoff, rate limiter) không ngủ quá deadline;
+- `clamp(timeout)` cho timeout của request HTTP (LLM, Tavily);
+- `wait_for(aw)` huỷ hẳn coroutine (graph.ainvoke) khi hết giờ.
+
+Hết giờ -> `DeadlineExceeded`; node bị cắt ghi marker `MISSING` cho section của nó và
+n_finalize ráp các section đã xong.
+"""
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Iterator, Optional
+
+RUN_DEADLINE_S = float(os.getenv("RUN_DEADLINE_S", "300"))
+
+# marker cho section không kịp xong (render thẳng vào report)
+MISSING = "[deadline_exceeded]"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("run_deadline", default=None)
+
+
+class DeadlineExceeded(BaseException):
+    """Run hết ngân sách thời gian.
+
+    Kế thừa BaseException (như asyncio.CancelledError) để các `except Exception` retry / degrade
+    trong agent không nuốt mất, lỗi đi thẳng lên main._node.
+    """
+
+
+def deadline_at(budget_s: Optional[float] = None, start: Optional[float] = None) -> Optional[float]:
+    """Epoch deadline cho run bắt đầu lúc `start`; budget <= 0 -> không giới hạn (None)."""
+    budget = RUN_DEADLINE_S if budget_s is None else float(budget_s)
+    return (start or time.time()) + budget if budget > 0 else None
+
+
+@contextmanager
+def use_deadline(at: Optional[float]) -> Iterator[None]:
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Số giây còn lại; None nếu không có deadline."""
+    at = _deadline.get()
+    return None if at is None else at - time.time()
+
+
+def expired(at: Optional[float]) -> bool:
+    return at is not None and time.time() >= at
+
+
+def check(what: str = "") -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"run deadline exceeded{f' before {what}' if what else ''}")
+
+
+def clamp(timeout: Optional[float]) -> Optional[float]:
+    """min(timeout, thời gian còn lại); raise nếu đã hết."""
+    check()
+    left = remaining()
+    if left is None:
+        return timeout
+    return left if timeout is None else min(timeout, left)
+
+
+def sleep(delay: float) -> None:
+    """time.sleep, nhưng raise ngay nếu ngủ xong thì đã quá deadline (không chờ vô ích)."""
+    left = remaining()
+    if left is not None and delay >= left:
+        raise DeadlineExceeded(f"run deadline exceeded (needed to wait {delay:.1f}s, {max(left, 0):.1f}s left)")
+    time.sleep(delay)
+
+
+async def asleep(delay: float) -> None:
+    left = remaining()
+    if left is not None and delay >= left:
+        raise DeadlineExceeded(f"run deadline exceeded (needed to wait {delay:.1f}s, {max(left, 0):.1f}s left)")
+    await asyncio.sleep(delay)
+
+
+async def wait_for(aw: Awaitable[Any]) -> Any:
+    """Await `aw`, cancelling it when the run deadline passes."""
+    left = remaining()
+    if left is None:
+        return await aw
+    if left <= 0:
+        if asyncio.iscoroutine(aw):
+            aw.close()
+        raise DeadlineExceeded("run deadline exceeded")
+    try:
+        return await asyncio.wait_for(aw, left)
+    except asyncio.TimeoutError:
+        if (remaining() or 0) > 0:
+            raise  # timeout của chính call bên trong, không phải deadline
+        raise DeadlineExceeded("run deadline exceeded") from None
@@ -0,0 +1,303 @@
+# agents/entity.py
+"""Entity resolution: query thô của user -> 1 entity card chuẩn (tên chính thức, ticker, domain).
+
+Chạy 1 lần / run ở node `resolve_entity` (ngay sau parse_input); mọi nhánh dùng chung card
+thay vì mỗi deep agent tự tốn tool call để disambiguate, và result cache / LLM memo key theo
+`card.id` nên "nvidia", "NVIDIA Corp", "NVDA" dùng chung entry.
+
+Alias index cục bộ, tra theo thứ tự:
+- seed `agents/data/entities.json` (chỉ đọc; ENTITY_SEED_PATH để thay),
+- SQLite `.cache/entities.sqlite` (ENTITY_INDEX_PATH): mỗi entity resolve bằng LLM được ghi
+  lại cùng mọi biến thể (query gốc, tên, alias, ticker, domain) -> index lớn dần theo run.
+Miss -> 1 LLM call nhỏ (JSON); model không chắc / lỗi / ENTITY_LLM_DISABLED=true thì
+dùng card tối thiểu dựng từ query (không ghi vào index).
+"""
+import json
+import os
+import re
+import sqlite3
+import textwrap
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+from agents.cache import env_flag, normalize_company
+
+_DIR = os.path.dirname(__file__)
+_SEED_PATH = os.path.join(_DIR, "data", "entities.json")
+_INDEX_PATH = os.path.join(os.path.dirname(_DIR), ".cache", "entities.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    id         TEXT PRIMARY KEY,
+    card       TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias      TEXT PRIMARY KEY,
+    entity_id  TEXT NOT NULL
+);
+"""
+
+# hậu tố pháp nhân bỏ đi khi so tên ("nvidia corp" == "nvidia")
+_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "llc", "plc",
+    "ag", "sa", "se", "nv", "bv", "gmbh", "holdings", "holding", "group", "jsc", "joint", "stock",
+}
+_TICKER = re.compile(r"^\$?(?:[A-Za-z]+:)?([A-Za-z][A-Za-z0-9.\-]{0,5})$")
+_DOMAIN = re.compile(r"^(?:https?://)?(?:www\.)?([a-z0-9\-]+(?:\.[a-z0-9\-]+)+)(?:/.*)?$", re.I)
+
+
+@dataclass
+class EntityCard:
+    id: str
+    name: str
+    ticker: Optional[str] = None
+    exchange: Optional[str] = None
+    domain: Optional[str] = None
+    country: Optional[str] = None
+    aliases: List[str] = field(default_factory=list)
+    # seed | index | llm | query (query = chưa resolve được, chỉ có tên user gõ)
+    resolved_by: str = "query"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EntityCard":
+        return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+
+    @classmethod
+    def from_query(cls, query: str) -> "EntityCard":
+        name = " ".join((query or "").split()) or "Unknown Company"
+        return cls(id=entity_id(name), name=name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @property
+    def resolved(self) -> bool:
+        return self.resolved_by != "query"
+
+    @property
+    def label(self) -> str:
+        """'NVIDIA Corporation (NASDAQ: NVDA; nvidia.com)' — hiển thị / log; search và prompt dùng `name`."""
+        ticker = f"{self.exchange}: {self.ticker}" if self.ticker and self.exchange else self.ticker
+        extra = "; ".join(x for x in (ticker, self.domain) if x)
+        return f"{self.name} ({extra})" if extra else self.name
+
+    def brief(self) -> str:
+        """Khối RESOLVED ENTITY chèn vào prompt của deep agent."""
+        rows = [("Official name", self.name), ("Ticker", self.ticker), ("Exchange", self.exchange),
+                ("Primary website", self.domain), ("Country", self.country),
+                ("Also known as", ", ".join(self.aliases))]
+        return "RESOLVED ENTITY (already verified; do not re-disambiguate):\n" + "\n".join(
+            f"- {k}: {v}" for k, v in rows if v)
+
+
+def prompt_subject(name: str, entity: str = "", indent: str = "") -> str:
+    """Tên công ty trong prompt: `name`, khối RESOLVED ENTITY (`EntityCard.brief()`) ở các dòng sau.
+
+    Search query chỉ dùng `name`: label kèm ticker/domain làm lệch kết quả và tách key cache search.
+    `indent`: thụt lề các dòng sau cho prompt dựng bằng textwrap.dedent.
+    """
+    return f"{name}\n{textwrap.indent(entity, indent)}" if entity else name
+
+
+def _strip_suffixes(name: str) -> str:
+    words = name.split()
+    while len(words) > 1 and words[-1] in _SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def entity_id(name: str) -> str:
+    return _strip_suffixes(normalize_company(name)) or normalize_company(name)
+
+
+def _domain(text: str) -> Optional[str]:
+    m = _DOMAIN.match(text.strip())
+    if not m or " " in text.strip():
+        return None
+    return m.group(1).lower()
+
+
+def alias_keys(text: str) -> List[str]:
+    """Các khoá tra cứu của 1 biến thể tên, theo thứ tự ưu tiên (domain, tên, tên bỏ hậu tố, ticker)."""
+    raw = (text or "").strip()
+    if not raw:
+        return []
+    keys: List[str] = []
+    dom = _domain(raw)
+    if dom:
+        keys.append(f"domain:{dom}")
+    name = normalize_company(raw)
+    if name:
+        keys.append(f"name:{name}")
+        stripped = _strip_suffixes(name)
+        if stripped != name:
+            keys.append(f"name:{stripped}")
+    m = _TICKER.match(raw)
+    if m:
+        keys.append(f"ticker:{m.group(1).upper()}")
+    return list(dict.fromkeys(keys))
+
+
+def _card_keys(card: EntityCard, extra: Iterable[str] = ()) -> List[str]:
+    keys: List[str] = []
+    for text in (card.name, *card.aliases, *extra):
+        # tên thường ("Apple") không thành khoá ticker; alias viết hoa ("GOOG", "AMD") thì có
+        keys += [k for k in alias_keys(text) if not k.startswith("ticker:") or text.isupper()]
+    if card.domain:
+        keys += alias_keys(card.domain)
+    if card.ticker:
+        keys.append(f"ticker:{card.ticker.upper()}")
+    return list(dict.fromkeys(keys))
+
+
+class AliasIndex:
+    """Seed (JSON, chỉ đọc) + index học được (SQLite). Safe to share across threads."""
+
+    def __init__(self, path: Optional[str] = None, seed_path: Optional[str] = None):
+        self.path = path or os.getenv("ENTITY_INDEX_PATH", _INDEX_PATH)
+        self.seed_path = seed_path or os.getenv("ENTITY_SEED_PATH", _SEED_PATH)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._seed: Optional[Dict[str, EntityCard]] = None
+
+    def _seeded(self) -> Dict[str, EntityCard]:
+        if self._seed is None:
+            seed: Dict[str, EntityCard] = {}
+            try:
+                with open(self.seed_path, encoding="utf-8") as f:
+                    rows = json.load(f)
+            except FileNotFoundError:
+                rows = []
+            for row in rows:
+                card = EntityCard.from_dict({"id": entity_id(row["name"]), **row, "resolved_by": "seed"})
+                for key in _card_keys(card):
+                    seed.setdefault(key, card)
+            self._seed = seed
+        return self._seed
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def lookup(self, query: str) -> Optional[EntityCard]:
+        keys = alias_keys(query)
+        with self._lock:
+            seed = self._seeded()
+            for key in keys:
+                if key in seed:
+                    return seed[key]
+            db = self._db()
+            for key in keys:
+                row = db.execute("SELECT e.card FROM aliases a JOIN entities e ON e.id = a.entity_id "
+                                 "WHERE a.alias = ?", (key,)).fetchone()
+                if row:
+                    return EntityCard.from_dict({**json.loads(row[0]), "resolved_by": "index"})
+        return None
+
+    def add(self, card: EntityCard, extra: Iterable[str] = ()) -> None:
+        """Ghi card + mọi biến thể (`extra`: vd. query gốc của user) vào index."""
+        keys = _card_keys(card, extra)
+        with self._lock:
+            seed = self._seeded()
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO entities(id, card, updated_at) VALUES (?, ?, ?)",
+                       (card.id, json.dumps(card.to_dict(), ensure_ascii=False), time.time()))
+            # alias của seed không bị ghi đè
+            db.executemany("INSERT OR REPLACE INTO aliases(alias, entity_id) VALUES (?, ?)",
+                           [(k, card.id) for k in keys if k not in seed])
+
+
+_index: Optional[AliasIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> AliasIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = AliasIndex()
+        return _index
+
+
+# ========================= LLM FALLBACK =========================
+_PROMPT = """You resolve a user's query to ONE real-world company.
+Return ONLY a JSON object:
+{{"known": true, "name": "<official/legal name>", "ticker": "<primary ticker or null>",
+  "exchange": "<exchange or null>", "domain": "<primary website domain or null>",
+  "country": "<HQ country code or null>", "aliases": ["<common short names, brands, former names>"]}}
+Set "known": false if you are not confident which company is meant. Never guess a ticker or
+domain: use null when unsure.
+
+Query: {query}"""
+
+
+def _llm():
+    from agents.llm import routed_model
+    from agents.memo import memoized
+    return memoized(routed_model("entity", temperature=0.0))
+
+
+def _parse(content: Any) -> Optional[EntityCard]:
+    m = re.search(r"\{.*\}", content if isinstance(content, str) else str(content), re.S)
+    if not m:
+        return None
+    try:
+        data = json.loads(m.group(0))
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not data.get("known") or not str(data.get("name") or "").strip():
+        return None
+    name = " ".join(str(data["name"]).split())
+    aliases = [a.strip() for a in data.get("aliases") or [] if isinstance(a, str) and a.strip()]
+
+    def opt(k: str) -> Optional[str]:
+        return (str(data[k]).strip() or None) if data.get(k) else None
+
+    domain = opt("domain")
+    return EntityCard(id=entity_id(name), name=name, ticker=(opt("ticker") or "").upper() or None,
+                      exchange=opt("exchange"), domain=_domain(domain) if domain else None,
+                      country=opt("country"), aliases=aliases, resolved_by="llm")
+
+
+def _learned(query: str, card: Optional[EntityCard]) -> EntityCard:
+    if card is None:
+        return EntityCard.from_query(query)
+    get_index().add(card, extra=[query])
+    return card
+
+
+def resolve(query: str) -> EntityCard:
+    """Entity card cho `query`: alias index trước, miss thì hỏi LLM rồi ghi vào index."""
+    hit = get_index().lookup(query)
+    if hit is not None:
+        return hit
+    if env_flag("ENTITY_LLM_DISABLED"):
+        return EntityCard.from_query(query)
+    try:
+        content = _llm().invoke(_PROMPT.format(query=query.strip())).content
+    except Exception:
+        return EntityCard.from_query(query)
+    return _learned(query, _parse(content))
+
+
+async def aresolve(query: str) -> EntityCard:
+    """Async variant of `resolve` (SQLite lookup stays inline, it is ms-level)."""
+    hit = get_index().lookup(query)
+    if hit is not None:
+        return hit
+    if env_flag("ENTITY_LLM_DISABLED"):
+        return EntityCard.from_query(query)
+    try:
+        content = (await _llm().ainvoke(_PROMPT.format(query=query.strip()))).content
+    except Exception:
+        return EntityCard.from_query(query)
+    return _learned(query, _parse(content))
@@ -1,77 +1,67 @@
-import os
 import textwrap
-from typing import Dict, Any, Literal, Optional
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from typing import Dict, Any, Optional, Union
 
-# Tavily (tùy chọn)
-try:
-    from tavily import TavilyClient  # type: ignore
-    _TAVILY_OK = True
-except Exception:
-    TavilyClient = None  # type: ignore
-    _TAVILY_OK = False
-
-load_dotenv()
+from agents.budget import trim_fields
+from agents.entity import prompt_subject
+from agents.projections import (Assumptions, AssumptionsError, build_projection_md, parse_assumptions, project,
+                                render_table)
+from agents.llm import routed_model
+from agents.memo import MemoChat, memoized
+from agents.search import ainternet_search, internet_search
+from agents.sources import current_registry, pack
+from agents.tracing import traced_step
 
 
 # ---------- Helpers ----------
-def _llm() -> ChatOpenAI:
-    # có thể đổi OPENAI_MODEL trong .env nếu muốn
-    return ChatOpenAI(model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"), temperature=0.2)
+def _llm(route: str) -> MemoChat:
+    # model theo route "financial.<step>" (agents/routing.py); prompt giống hệt -> dùng lại response (agents/memo.py)
+    return memoized(routed_model(f"financial.{route}", temperature=0.2))
 
 
-def internet_search(
-    query: str,
-    max_results: int = 3,
-    topic: Literal["general", "news", "finance"] = "general",
-    include_raw_content: bool = False,
-) -> Dict[str, Any]:
-    """
-    Web search helper. Nếu Tavily lỗi/quota, trả về rỗng để pipeline vẫn chạy.
-    """
-    if not _TAVILY_OK or not os.getenv("TAVILY_API_KEY"):
-        return {"results": [], "note": "tavily_disabled"}
+# ---------- Micro-agents ----------
+# Mỗi micro-agent = 1 hàm dựng prompt + bản sync/async gọi LLM.
+def _fetch_query(company: str) -> str:
+    return f"{company} revenue growth segments data center gaming IR site"
 
-    from tavily import TavilyClient
-    tavily = TavilyClient()
-    try:
-        return tavily.search(
-            query=query,
-            max_results=max_results,
-            include_raw_content=include_raw_content,
-            topic=topic,
-        )
-    except Exception as e:
-        # degrade gracefully
-        return {"results": [], "error": f"{type(e).__name__}: {e}"}
 
-# ---------- Micro-agents ----------
+def _fetched(company: str, docs: Dict[str, Any]) -> Dict[str, Any]:
+    # đăng ký vào source registry của run -> số [n] dùng chung với các section khác
+    cited = current_registry().add(docs, query=_fetch_query(company))
+    return {"sources": cited, "pack": pack(cited, indent="    ")}
+
+
+@traced_step("analyst_fetch")
 def _analyst_fetch(company: str) -> Dict[str, Any]:
     """Thu thập mẩu thông tin nền (company profile/IR/news)."""
-    q = f"{company} revenue growth segments data center gaming IR site"
-    docs = internet_search(q, max_results=5, topic="finance", include_raw_content=False)
-    return {"sources": docs}
+    docs = internet_search(_fetch_query(company), max_results=5, topic="finance", include_raw_content=False)
+    return _fetched(company, docs)
 
 
-def _assumption_builder(company: str, sources: Dict[str, Any], feedback: Optional[str]) -> Dict[str, Any]:
-    """
-    Suy diễn Assumptions base/bull/bear 3 năm.
-    Có thể dùng feedback (nếu QC yêu cầu sửa).
-    """
-    llm = _llm()
-    fb_txt = f"\nReviewer feedback to incorporate:\n{feedback}\n" if feedback else ""
-    prompt = textwrap.dedent(f"""
+@traced_step("analyst_fetch")
+async def _a_analyst_fetch(company: str) -> Dict[str, Any]:
+    docs = await ainternet_search(_fetch_query(company), max_results=5, topic="finance", include_raw_content=False)
+    return _fetched(company, docs)
+
+
+def _assumption_prompt(company: str, fetch: Dict[str, Any], feedback: Optional[str]) -> str:
+    # pack nguồn đã vừa ngân sách riêng (agents.sources); feedback dài thì bị cắt trước
+    f = trim_fields("assumption_builder", {"pack": fetch["pack"], "feedback": feedback or ""},
+                    priority={"feedback": 1}, template=_render_assumption(company, "", ""))
+    fb_txt = f"\nReviewer feedback to incorporate:\n{f['feedback']}\n" if f["feedback"] else ""
+    return _render_assumption(company, f["pack"], fb_txt)
+
+
+# Prompt xếp phần tĩnh (vai trò, task, schema) lên đầu, dữ liệu theo run ở cuối:
+# prefix giống nhau giữa các call -> provider-side prompt caching áp dụng được.
+def _render_assumption(company: str, sources_pack: str, fb_txt: str) -> str:
+    return textwrap.dedent(f"""
     You are a financial assumptions builder.
-    Company: {company}
-    You have noisy web snippets (structured JSON-ish) from a finance search:
-    === SOURCES (truncated) ===
-    {str(sources)[:6000]}
-    {fb_txt}
+    You get numbered web snippets from a finance search about one company (below).
 
     TASK:
     - Infer approximate base-year revenue (if unknown, state "unknown" but keep modeling).
     - Propose 3-year CAGR for Base/Bull/Bear, and EBIT margin range per scenario.
+    - cagr and ebit_margin are decimal fractions (0.12 = 12%), not percentages.
     - Output JSON ONLY with:
       {{
         "base_year_revenue": "<USD or 'unknown'>",
@@ -80,62 +70,142 @@ def _assumption_builder(company: str, sources: Dict[str, Any], feedback: Optiona
           "bull": {{"cagr": <float>, "ebit_margin": <float>}},
           "bear": {{"cagr": <float>, "ebit_margin": <float>}}
         }},
-        "notes": ["short bullet", ...]
+        "notes": ["short bullet citing sources as [n]", ...]
       }}
-    }}
+
+    Company: {company}
+    === SOURCES ===
+    {sources_pack}
+    {fb_txt}
     """)
-    return {"assumptions_json": llm.invoke(prompt).content}
 
 
-def _modeler(company: str, assumptions_json: str) -> str:
-    """Dựng bảng dự phóng 3 năm (Base/Bull/Bear) ở Markdown."""
-    llm = _llm()
-    prompt = textwrap.dedent(f"""
+@traced_step("assumption_builder")
+def _assumption_builder(company: str, fetch: Dict[str, Any], feedback: Optional[str]) -> Dict[str, Any]:
+    """
+    Suy diễn Assumptions base/bull/bear 3 năm.
+    Có thể dùng feedback (nếu QC yêu cầu sửa).
+    """
+    return {"assumptions_json": _llm("assumptions").invoke(_assumption_prompt(company, fetch, feedback)).content}
+
+
+@traced_step("assumption_builder")
+async def _a_assumption_builder(company: str, fetch: Dict[str, Any], feedback: Optional[str]) -> Dict[str, Any]:
+    msg = await _llm("assumptions").ainvoke(_assumption_prompt(company, fetch, feedback))
+    return {"assumptions_json": msg.content}
+
+
+def _narrative_prompt(company: str, assumptions_json: str, table_md: str) -> str:
+    # bảng đã tính cục bộ là dữ liệu chính (không cắt); JSON thô dài (notes, ...) bị cắt
+    f = trim_fields("narrative", {"assumptions_json": assumptions_json, "table_md": table_md},
+                    priority={"assumptions_json": 1}, keep=("table_md",),
+                    template=_render_narrative(company, "", ""))
+    return _render_narrative(company, f["assumptions_json"], f["table_md"])
+
+
+def _render_narrative(company: str, assumptions_json: str, table_md: str) -> str:
+    return textwrap.dedent(f"""
     You are a financial modeler.
+    Write ONE short paragraph explaining the growth and margin drivers behind the Base/Bull/Bear scenarios
+    of the company below. Do not restate the table and do not introduce new numbers.
+    Return the paragraph only (Markdown, no headings).
+
     Company: {company}
     ASSUMPTIONS (JSON):
     {assumptions_json}
+    PROJECTION TABLE (computed, final):
+    {table_md}
+    """)
+
 
-    Build a compact 3-year projection table in Markdown:
+def _fallback_modeler_prompt(company: str, assumptions_json: str) -> str:
+    # assumptions không parse được -> để LLM dựng bảng như trước; JSON (có thể lẫn text thừa) giữ phần đầu
+    f = trim_fields("fallback_modeler", {"assumptions_json": assumptions_json},
+                    template=_render_fallback_modeler(company, ""))
+    return _render_fallback_modeler(company, f["assumptions_json"])
+
+
+def _render_fallback_modeler(company: str, assumptions_json: str) -> str:
+    return textwrap.dedent(f"""
+    You are a financial modeler.
+    Build a compact 3-year projection table in Markdown from the assumptions below:
     - Columns: Year0 (base), Year1, Year2, Year3
     - For each scenario (Base/Bull/Bear): Revenue, EBIT, EBIT Margin
     - If base-year revenue unknown, create a symbolic placeholder (e.g., "~USD X") and proceed.
 
     After the table, add a short paragraph explaining drivers.
     Return FINAL MARKDOWN (no JSON, no extra commentary).
+
+    Company: {company}
+    ASSUMPTIONS (JSON):
+    {assumptions_json}
     """)
-    return llm.invoke(prompt).content
 
 
-def _sanity_checker(company: str, model_md: str) -> str:
-    """Kiểm tra hợp lý (nhẹ) và chỉnh wording nếu cần."""
-    llm = _llm()
-    prompt = textwrap.dedent(f"""
-    You are a sanity checker & editor.
-    Company: {company}
-    MODEL MARKDOWN:
-    {model_md}
+def _fallback_note(err: AssumptionsError) -> str:
+    return f"\n\n### Sanity notes\n- Assumptions failed validation ({err}); table generated by the LLM and not arithmetic-checked."
 
-    - Lightly check plausibility of growth & margins (qualitative).
-    - Improve clarity only; do not change the numbers unless there is a clear arithmetic inconsistency.
-    - Append a short 'Sanity notes' list at the end.
 
-    Return FINAL MARKDOWN only.
-    """)
-    return llm.invoke(prompt).content
+def _validate(assumptions_json: str) -> Union[Assumptions, AssumptionsError]:
+    """Validate assumptions 1 lần / run; kết quả dùng cho modeler và lưu (typed) vào kb cho buyerlist."""
+    try:
+        return parse_assumptions(assumptions_json)
+    except AssumptionsError as e:
+        return e
+
+
+@traced_step("modeler")
+def _modeler(company: str, assumptions_json: str, a: Union[Assumptions, AssumptionsError]) -> str:
+    """Bảng dự phóng 3 năm (Base/Bull/Bear) tính cục bộ; LLM chỉ viết đoạn giải thích."""
+    if isinstance(a, AssumptionsError):
+        return _llm("fallback_modeler").invoke(_fallback_modeler_prompt(company, assumptions_json)).content + _fallback_note(a)
+    table = render_table(a, project(a))
+    narrative = _llm("narrative").invoke(_narrative_prompt(company, assumptions_json, table)).content
+    return build_projection_md(a, narrative)
+
+
+@traced_step("modeler")
+async def _a_modeler(company: str, assumptions_json: str, a: Union[Assumptions, AssumptionsError]) -> str:
+    if isinstance(a, AssumptionsError):
+        msg = await _llm("fallback_modeler").ainvoke(_fallback_modeler_prompt(company, assumptions_json))
+        return msg.content + _fallback_note(a)
+    table = render_table(a, project(a))
+    narrative = (await _llm("narrative").ainvoke(_narrative_prompt(company, assumptions_json, table))).content
+    return build_projection_md(a, narrative)
 
 
 # ---------- Public API (được main.py gọi) ----------
+def _result(final_md: str, assumptions_json: str, a: Union[Assumptions, AssumptionsError]) -> dict:
+    return {
+        "markdown": f"# Financial Model \n\n{final_md}",
+        "assumptions_json": assumptions_json,
+        # assumptions đã validate (Assumptions.to_dict), None nếu không hợp lệ
+        "assumptions": a.to_dict() if isinstance(a, Assumptions) else None,
+    }
+
+
 # đổi chữ ký trả về: dict
-def run_financial_swarm(company: str, feedback: Optional[str] = None) -> dict:
+# company: tên (dùng cho search); entity: khối RESOLVED ENTITY chỉ đưa vào prompt
+def run_financial_swarm(company: str, feedback: Optional[str] = None, *, entity: str = "") -> dict:
     company = (company or "").strip() or "Unknown Company"
+    subject = prompt_subject(company, entity, indent="    ")
     blackboard: Dict[str, Any] = {}
     blackboard["fetch"] = _analyst_fetch(company)
-    blackboard["assumptions"] = _assumption_builder(company, blackboard["fetch"], feedback)
-    model_md = _modeler(company, blackboard["assumptions"]["assumptions_json"])
-    final_md = _sanity_checker(company, model_md)
-    return {
-        "markdown": f"# Financial Model \n\n{final_md}",
-        "assumptions_json": blackboard["assumptions"]["assumptions_json"],
-    }
+    blackboard["assumptions"] = _assumption_builder(subject, blackboard["fetch"], feedback)
+    assumptions_json = blackboard["assumptions"]["assumptions_json"]
+    a = _validate(assumptions_json)
+    final_md = _modeler(subject, assumptions_json, a)
+    return _result(final_md, assumptions_json, a)
 
+
+async def arun_financial_swarm(company: str, feedback: Optional[str] = None, *, entity: str = "") -> dict:
+    """Async twin of `run_financial_swarm` (ainvoke + async search)."""
+    company = (company or "").strip() or "Unknown Company"
+    subject = prompt_subject(company, entity, indent="    ")
+    blackboard: Dict[str, Any] = {}
+    blackboard["fetch"] = await _a_analyst_fetch(company)
+    blackboard["assumptions"] = await _a_assumption_builder(subject, blackboard["fetch"], feedback)
+    assumptions_json = blackboard["assumptions"]["assumptions_json"]
+    a = _validate(assumptions_json)
+    final_md = await _a_modeler(subject, assumptions_json, a)
+    return _result(final_md, assumptions_json, a)
@@ -1,37 +1,5 @@
-import os
-from typing import Literal
-from tavily import TavilyClient
-from deepagents import create_deep_agent
-from langchain.chat_models import init_chat_model
-from dotenv import load_dotenv
-
-load_dotenv()
-
-tavily_client = TavilyClient()
-
-def internet_search(
-    query: str,
-    max_results: int = 3,
-    topic: Literal["general", "news", "finance"] = "general",
-    include_raw_content: bool = False,
-):
-    """Run a web search via Tavily.
-
-    Args:
-        query: search query string.
-        max_results: number of results to return.
-        topic: 'general' | 'news' | 'finance'.
-        include_raw_content: whether to include raw page content.
-
-    Returns:
-        Tavily response (dict/list) with search results.
-    """
-    return tavily_client.search(
-        query=query,
-        max_results=max_results,
-        include_raw_content=include_raw_content,
-        topic=topic,
-    )
+from agents.llm import routed_model
+from agents.search import search_tool
 
 sub_industry_prompt = """You are a dedicated INDUSTRY researcher.
 
@@ -94,7 +62,8 @@ OPERATING RULES
 - Always reply in the user's language.
 
 WORKFLOW
-1) Disambiguate company & confirm primary industry.
+1) Disambiguate company & confirm primary industry (a RESOLVED ENTITY block in the message is
+   already verified: use it as-is and only confirm the industry).
 2) Plan queries and use `internet_search` to collect and verify industry information.
 3) Synthesize and write the final report (Markdown). Do NOT include your process.
 4) Cite sources inline with numbered markers and end with a Sources list.
@@ -124,20 +93,29 @@ OUTPUT FORMAT (Markdown)
 - [2] Title: URL
 """
 
-model = init_chat_model(
-    "openai:gpt-4o-mini",
-   
-    temperature=0.2,
-    max_tokens=1200,       # giới hạn output
-    request_timeout=45,    # fail nhanh nếu mạng chậm
-    timeout=30_000,
-    max_retries=1
-)
-
-industry_research_agent = create_deep_agent(
-    [internet_search],                     
-    industry_instructions,
-    subagents=[industry_sub_agent],  
-    model=model
-).with_config({"recursion_limit": 24})
-
+def build_agent():
+    """Dựng deep agent (gọi qua agents.registry.get_agent, chỉ 1 lần / process)."""
+    from deepagents import create_deep_agent
+
+    # model + max_tokens theo route "industry" (agents/routing.py), fallback khi vi phạm SLO
+    model = routed_model(
+        "industry",
+        temperature=0.2,
+        request_timeout=45,    # fail nhanh nếu mạng chậm
+        timeout=30_000,
+        max_attempts=2,       # fail nhanh; limiter + Retry-After ở agents/llm.py
+    )
+    return create_deep_agent(
+        [search_tool()],
+        industry_instructions,
+        subagents=[industry_sub_agent],
+        model=model
+    ).with_config({"recursion_limit": 24})
+
+
+def __getattr__(name: str):
+    # tương thích ngược: `from agents.industry_agent import industry_research_agent` vẫn chạy, nhưng dựng lười
+    if name == "industry_research_agent":
+        from agents.registry import get_agent
+        return get_agent("industry")
+    raise AttributeError(name)
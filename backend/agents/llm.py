@@ -0,0 +1,237 @@
+# agents/llm.py
+"""Chat model dùng chung: mọi LLM call đi qua rate limiter của process (agents/ratelimit.py).
+
+`chat_model(...)` thay cho `ChatOpenAI(...)` / `init_chat_model(...)` ở các agent.
+Retry do model tự làm (SDK retry tắt): 429 đọc `Retry-After` và tạm dừng mọi caller
+cùng model, lỗi tạm thời khác thì exponential backoff + jitter.
+Mỗi call ghi 1 span "llm" (latency, token, cost, số lần retry) — xem agents/tracing.py.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+
+from agents import deadline, routing
+from agents.ratelimit import ProviderLimiter, is_rate_limited, is_retryable, limiter_for, on_retryable_error
+from agents.tracing import Span, llm_cost_usd, span
+
+# output ước lượng khi không đặt max_tokens (chỉ để đặt chỗ TPM, sẽ settle theo usage thật)
+_EST_COMPLETION_TOKENS = 512
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    chars = sum(len(m.content) if isinstance(m.content, str) else len(str(m.content)) for m in messages)
+    return chars // 4 + 4 * len(messages)
+
+
+def _usage(result: ChatResult) -> Dict[str, int]:
+    """{"prompt_tokens", "completion_tokens"} từ llm_output hoặc usage_metadata ({} nếu không có)."""
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    if usage.get("total_tokens") is not None:
+        return {"prompt_tokens": int(usage.get("prompt_tokens") or 0),
+                "completion_tokens": int(usage.get("completion_tokens") or 0)}
+    out: Dict[str, int] = {}
+    for gen in result.generations:
+        _add_usage(out, getattr(getattr(gen, "message", None), "usage_metadata", None))
+    return out
+
+
+def _add_usage(acc: Dict[str, int], meta: Optional[Dict[str, Any]]) -> None:
+    if meta:
+        acc["prompt_tokens"] = acc.get("prompt_tokens", 0) + int(meta.get("input_tokens", 0))
+        acc["completion_tokens"] = acc.get("completion_tokens", 0) + int(meta.get("output_tokens", 0))
+
+
+def _total(usage: Dict[str, int]) -> Optional[int]:
+    return sum(usage.values()) if usage else None
+
+
+class LimitedChatOpenAI(ChatOpenAI):
+    """ChatOpenAI behind the shared (provider, model) limiter, with Retry-After aware retries.
+
+    `route` (agents/routing.py): model của từng call theo route (fallback khi vi phạm SLO),
+    latency / lỗi của call được báo lại cho route.
+    """
+
+    max_attempts: int = 4
+    route: Optional[str] = None
+
+    @property
+    def active_model(self) -> str:
+        return routing.active_model(self.route, self.model_name)
+
+    def _limiter(self, model: Optional[str] = None) -> Optional[ProviderLimiter]:
+        return limiter_for("openai", model or self.model_name)
+
+    def _reserve_estimate(self, messages: List[BaseMessage]) -> int:
+        return estimate_tokens(messages) + (self.max_tokens or _EST_COMPLETION_TOKENS)
+
+    def _retry_delay(self, lim: Optional[ProviderLimiter], attempt: int, exc: Exception,
+                     est: int, streamed: bool = False) -> Optional[float]:
+        """Seconds to sleep before the next attempt; None when `exc` is final."""
+        if lim and is_rate_limited(exc):
+            lim.settle(est, 0)  # request bị từ chối không tốn TPM
+        if streamed or attempt >= self.max_attempts - 1 or not is_retryable(exc):
+            return None
+        return on_retryable_error(lim, attempt, exc)
+
+    def _call_kwargs(self, kwargs: Dict[str, Any], model: str) -> Dict[str, Any]:
+        """Model của route + deadline: raise nếu run đã hết giờ, timeout = min(request_timeout, phần còn lại)."""
+        deadline.check("llm call")
+        if model != self.model_name:
+            kwargs = {**kwargs, "model": model}
+        if deadline.remaining() is None:
+            return kwargs
+        own = self.request_timeout if isinstance(self.request_timeout, (int, float)) else None
+        return {**kwargs, "timeout": deadline.clamp(own)}
+
+    @contextmanager
+    def _call(self, streaming: bool) -> Iterator[Tuple[str, Span]]:
+        """Span "llm" của call + báo latency / lỗi cho route."""
+        model = self.active_model
+        attrs: Dict[str, Any] = {"streaming": streaming}
+        if self.route:
+            attrs["route"] = self.route
+            if model != self.model_name:
+                attrs["fallback"] = True
+        t0 = time.monotonic()
+        try:
+            with span("llm", model, **attrs) as sp:
+                yield model, sp
+        except Exception:
+            routing.observe(self.route, model, (time.monotonic() - t0) * 1000, False)
+            raise
+        routing.observe(self.route, model, (time.monotonic() - t0) * 1000, True)
+
+    def _finish(self, sp: Span, lim: Optional[ProviderLimiter], est: int, usage: Dict[str, int]) -> None:
+        if lim:
+            lim.settle(est, _total(usage))
+        if usage:
+            sp.attrs.update(usage)
+            cost = llm_cost_usd(sp.name, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+            if cost is not None:
+                sp.attrs["cost_usd"] = round(cost, 6)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        est = self._reserve_estimate(messages)
+        with self._call(streaming=False) as (model, sp):
+            lim = self._limiter(model)
+            for attempt in range(self.max_attempts):
+                sp.attrs["retries"] = attempt
+                call_kwargs = self._call_kwargs(kwargs, model)
+                if lim:
+                    lim.wait(est)
+                try:
+                    result = super()._generate(messages, stop=stop, run_manager=run_manager, **call_kwargs)
+                except Exception as e:
+                    delay = self._retry_delay(lim, attempt, e, est)
+                    if delay is None:
+                        raise
+                    if delay:
+                        deadline.sleep(delay)
+                    continue
+                self._finish(sp, lim, est, _usage(result))
+                return result
+        raise RuntimeError("unreachable")
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        est = self._reserve_estimate(messages)
+        with self._call(streaming=False) as (model, sp):
+            lim = self._limiter(model)
+            for attempt in range(self.max_attempts):
+                sp.attrs["retries"] = attempt
+                call_kwargs = self._call_kwargs(kwargs, model)
+                if lim:
+                    await lim.await_(est)
+                try:
+                    result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **call_kwargs)
+                except Exception as e:
+                    delay = self._retry_delay(lim, attempt, e, est)
+                    if delay is None:
+                        raise
+                    if delay:
+                        await deadline.asleep(delay)
+                    continue
+                self._finish(sp, lim, est, _usage(result))
+                return result
+        raise RuntimeError("unreachable")
+
+    # stream: chỉ retry khi chưa có chunk nào ra FE
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        est = self._reserve_estimate(messages)
+        with self._call(streaming=True) as (model, sp):
+            lim = self._limiter(model)
+            for attempt in range(self.max_attempts):
+                sp.attrs["retries"] = attempt
+                call_kwargs = self._call_kwargs(kwargs, model)
+                if lim:
+                    lim.wait(est)
+                streamed, usage = False, {}
+                try:
+                    for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **call_kwargs):
+                        streamed = True
+                        _add_usage(usage, getattr(chunk.message, "usage_metadata", None))
+                        yield chunk
+                except Exception as e:
+                    delay = self._retry_delay(lim, attempt, e, est, streamed)
+                    if delay is None:
+                        raise
+                    if delay:
+                        deadline.sleep(delay)
+                    continue
+                self._finish(sp, lim, est, usage)
+                return
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        est = self._reserve_estimate(messages)
+        with self._call(streaming=True) as (model, sp):
+            lim = self._limiter(model)
+            for attempt in range(self.max_attempts):
+                sp.attrs["retries"] = attempt
+                call_kwargs = self._call_kwargs(kwargs, model)
+                if lim:
+                    await lim.await_(est)
+                streamed, usage = False, {}
+                try:
+                    async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **call_kwargs):
+                        streamed = True
+                        _add_usage(usage, getattr(chunk.message, "usage_metadata", None))
+                        yield chunk
+                except Exception as e:
+                    delay = self._retry_delay(lim, attempt, e, est, streamed)
+                    if delay is None:
+                        raise
+                    if delay:
+                        await deadline.asleep(delay)
+                    continue
+                self._finish(sp, lim, est, usage)
+                return
+
+
+def default_model() -> str:
+    return os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+
+def chat_model(model: Optional[str] = None, *, temperature: float = 0.2, **kwargs: Any) -> LimitedChatOpenAI:
+    """Build a rate-limited OpenAI chat model; `model` accepts the "openai:<name>" form too."""
+    name = (model or default_model()).split(":", 1)[-1]
+    kwargs.setdefault("max_retries", 0)  # retry ở trên, để 429 dùng chung cooldown
+    kwargs.setdefault("max_attempts", int(os.getenv("LLM_MAX_ATTEMPTS", "4")))
+    kwargs.setdefault("stream_usage", True)
+    return LimitedChatOpenAI(model=name, temperature=temperature, **kwargs)
+
+
+def routed_model(route: str, *, temperature: float = 0.2, **kwargs: Any) -> LimitedChatOpenAI:
+    """Chat model cho route `route` (agents/routing.py): model + max_tokens theo cấu hình, fallback theo SLO."""
+    r = routing.route(route)
+    if r.max_tokens is not None:
+        kwargs.setdefault("max_tokens", r.max_tokens)
+    return chat_model(r.model, temperature=temperature, route=route, **kwargs)
@@ -0,0 +1,25 @@
+# agents/markdown.py
+"""Helper Markdown thuần (không phụ thuộc LLM / search): tách và ghép report theo heading.
+
+Dùng chung cho QC cục bộ (agents/qc.py) và incremental refresh (agents/refresh.py).
+"""
+import re
+from typing import List, Tuple
+
+_HEADING = re.compile(r"^#{1,3}\s+\S")
+
+
+def split_sections(md: str) -> List[Tuple[str, str]]:
+    """[(heading line, body)] theo heading #..###; phần trước heading đầu có heading ""."""
+    out: List[Tuple[str, str]] = [("", "")]
+    for line in (md or "").splitlines(keepends=True):
+        if _HEADING.match(line):
+            out.append((line.rstrip("\n"), ""))
+        else:
+            head, body = out[-1]
+            out[-1] = (head, body + line)
+    return out if out[0][1].strip() else out[1:]
+
+
+def join_sections(sections: List[Tuple[str, str]]) -> str:
+    return "".join((f"{h}\n" if h else "") + b for h, b in sections)
@@ -0,0 +1,143 @@
+# agents/memo.py
+"""Memo cho LLM call của swarm/supervisor: prompt giống hệt -> dùng lại response, không gọi lại API.
+
+Key = sha256(model, temperature, max_tokens, prompt). 2 tầng:
+- in-memory LRU (LLM_MEMO_MAX, 256 entry): lặp lại trong process (vòng rework feedback rỗng, ...).
+- SQLite `.cache/llm.sqlite` (LLM_MEMO_PATH, TTL LLM_MEMO_TTL_S = 3 ngày): giữa các run / batch.
+
+    llm = memoized(routed_model("buyers.aggregate", temperature=0.2))
+    llm.invoke(prompt).content              # như chat model thường
+    llm.invoke(prompt, memo=False)          # opt-out cho 1 call
+
+LLM_MEMO_DISABLED=true tắt hẳn; trong `refreshing()` (force_refresh của run) thì bỏ qua lookup
+nhưng vẫn ghi response mới. Hit được ghi thành span "llm" với attr `memo` = memory | disk.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from langchain_core.messages import AIMessage
+
+from agents.cache import ResultCache, env_flag
+from agents.tracing import span
+
+_MAX = int(os.getenv("LLM_MEMO_MAX", "256"))
+_DISK_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "llm.sqlite")
+
+_refresh: ContextVar[bool] = ContextVar("llm_memo_refresh", default=False)
+
+_lock = threading.Lock()
+_mem: "OrderedDict[str, str]" = OrderedDict()
+_disk: Optional[ResultCache] = None
+
+
+@contextmanager
+def refreshing(on: bool = True) -> Iterator[None]:
+    """Trong scope này bỏ qua memo khi đọc (vẫn ghi), như force_refresh của result cache."""
+    token = _refresh.set(on)
+    try:
+        yield
+    finally:
+        _refresh.reset(token)
+
+
+def _get_disk() -> ResultCache:
+    global _disk
+    with _lock:
+        if _disk is None:
+            _disk = ResultCache(os.getenv("LLM_MEMO_PATH", _DISK_PATH),
+                                ttl_s=float(os.getenv("LLM_MEMO_TTL_S", 3 * 24 * 3600)),
+                                max_entries=int(os.getenv("LLM_MEMO_MAX_ENTRIES", "5000")))
+        return _disk
+
+
+def memo_key(model: str, temperature: Optional[float], max_tokens: Optional[int], prompt: Any) -> str:
+    raw = json.dumps([model, temperature, max_tokens, prompt if isinstance(prompt, str) else str(prompt)],
+                     ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _lookup(key: str) -> Optional[tuple[str, str]]:
+    """(content, tier) nếu có."""
+    with _lock:
+        if key in _mem:
+            _mem.move_to_end(key)
+            return _mem[key], "memory"
+    hit = _get_disk().get(key)
+    if isinstance(hit, str):
+        _remember(key, hit)
+        return hit, "disk"
+    return None
+
+
+def _remember(key: str, content: str) -> None:
+    with _lock:
+        _mem[key] = content
+        _mem.move_to_end(key)
+        while len(_mem) > _MAX:
+            _mem.popitem(last=False)
+
+
+def _store(key: str, content: Any) -> None:
+    # chỉ memo text hợp lệ; response rỗng / lỗi để lần sau gọi lại
+    if isinstance(content, str) and content.strip() and "[tool_error]" not in content:
+        _remember(key, content)
+        _get_disk().put(key, content, node="llm")
+
+
+def clear_memo() -> None:
+    with _lock:
+        _mem.clear()
+
+
+class MemoChat:
+    """Bọc 1 chat model: `invoke`/`ainvoke(prompt, memo=True)` trả AIMessage, memo theo prompt."""
+
+    def __init__(self, llm: Any):
+        self.llm = llm
+        self.model_name = getattr(llm, "model_name", "")
+
+    def _key(self, prompt: Any) -> str:
+        # model thực sự dùng cho call này (route có thể đang ở fallback, xem agents/routing.py)
+        model = getattr(self.llm, "active_model", self.model_name)
+        return memo_key(model, getattr(self.llm, "temperature", None),
+                        getattr(self.llm, "max_tokens", None), prompt)
+
+    def _cached(self, prompt: Any, memo: bool) -> tuple[Optional[str], Optional[AIMessage]]:
+        if not memo or env_flag("LLM_MEMO_DISABLED"):
+            return None, None
+        key = self._key(prompt)
+        if _refresh.get():
+            return key, None
+        hit = _lookup(key)
+        if hit is None:
+            return key, None
+        with span("llm", getattr(self.llm, "active_model", self.model_name), memo=hit[1]):
+            return key, AIMessage(content=hit[0], response_metadata={"memo": hit[1]})
+
+    def invoke(self, prompt: Any, *, memo: bool = True, **kwargs: Any) -> AIMessage:
+        key, hit = self._cached(prompt, memo)
+        if hit is not None:
+            return hit
+        msg = self.llm.invoke(prompt, **kwargs)
+        if key:
+            _store(key, msg.content)
+        return msg
+
+    async def ainvoke(self, prompt: Any, *, memo: bool = True, **kwargs: Any) -> AIMessage:
+        key, hit = self._cached(prompt, memo)
+        if hit is not None:
+            return hit
+        msg = await self.llm.ainvoke(prompt, **kwargs)
+        if key:
+            _store(key, msg.content)
+        return msg
+
+
+def memoized(llm: Any) -> MemoChat:
+    return MemoChat(llm)
@@ -1,131 +1,172 @@
+import asyncio
+import contextvars
 import os
 import textwrap
-from typing import Dict, Any, Literal, Optional
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-
-# Tavily (tùy chọn)
-try:
-    from tavily import TavilyClient  # type: ignore
-    _TAVILY_OK = True
-except Exception:
-    TavilyClient = None  # type: ignore
-    _TAVILY_OK = False
-
-load_dotenv()
-
-
-def _llm() -> ChatOpenAI:
-    return ChatOpenAI(model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"), temperature=0.1)
-
-
-def internet_search(
-    query: str,
-    max_results: int = 3,
-    topic: Literal["general", "news", "finance"] = "general",
-    include_raw_content: bool = False,
-) -> Dict[str, Any]:
-    
-    """Plain search helper; nếu thiếu Tavily key thì trả rỗng để không vỡ pipeline."""
-    if not _TAVILY_OK or not os.getenv("TAVILY_API_KEY"):
-        return {"results": []}
-    
-    from tavily import TavilyClient
-    tavily = TavilyClient()
-    try:
-        return tavily.search(
-            query=query,
-            max_results=max_results,
-            include_raw_content=include_raw_content,
-            topic=topic,
-        )
-    except Exception as e:
-        # degrade gracefully
-        return {"results": [], "error": f"{type(e).__name__}: {e}"}
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+from agents.budget import trim_fields
+from agents.entity import prompt_subject
+from agents.llm import routed_model
+from agents.memo import MemoChat, memoized
+from agents.search import ainternet_search, internet_search
+from agents.sources import current_registry, pack, source_list_md
+from agents.tracing import traced_step
+from agents.universe import get_universe
+
+
+def _llm(route: str) -> MemoChat:
+    # mỗi vi mô-agent 1 route "buyers.<step>" (agents/routing.py): model nhỏ cho draft, lớn hơn cho aggregate
+    return memoized(routed_model(f"buyers.{route}", temperature=0.1))
+
 
 # ---------- Swarm các vi mô-agent ----------
-def _gather_context(company: str) -> Dict[str, Any]:
-    docs = internet_search(f"{company} competitors partners acquisitions strategy", max_results=5, topic="general")
+# Mỗi micro-agent = 1 hàm dựng prompt + bản sync/async gọi LLM.
+def _context_query(company: str) -> str:
+    return f"{company} competitors partners acquisitions strategy"
+
+
+def _universe_hint(company: str) -> str:
+    # acquirer cùng sector, lớn hơn target, từ universe cục bộ (agents/universe.py); "" nếu target không có trong đó
+    u = get_universe()
+    rows = [u.row(i) for i in u.peers(company)]
+    return "\n    ".join(f"- {r['name']} ({', '.join(r['sectors'])}; {r['geography']})" for r in rows)
+
+
+def _context_from(company: str, docs: Dict[str, Any]) -> Dict[str, Any]:
     empty = not docs or not docs.get("results")
-    return {"sources": docs, "no_sources": empty}
+    # đăng ký vào source registry của run; 3 micro-agent dùng chung 1 pack đã đánh số
+    cited = current_registry().add(docs, query=_context_query(company))
+    return {"sources": cited, "pack": pack(cited, indent="    "), "no_sources": empty,
+            "universe": _universe_hint(company)}
 
 
-def _strategy_fit(company: str, sources: Dict[str, Any]) -> str:
-    llm = _llm()
-    prompt = textwrap.dedent(f"""
-    ROLE: StrategyFit agent.
-    Company: {company}
-    Context sources (truncated JSON-ish):
-    {str(sources)[:5000]}
+@traced_step("gather_context")
+def _gather_context(company: str) -> Dict[str, Any]:
+    return _context_from(company, internet_search(_context_query(company), max_results=5, topic="general"))
+
+
+@traced_step("gather_context")
+async def _a_gather_context(company: str) -> Dict[str, Any]:
+    return _context_from(company, await ainternet_search(_context_query(company), max_results=5, topic="general"))
 
-    Task: Propose strategic acquirer profiles (3–6) that would gain product/customer/geographic synergies if acquiring {company}.
+
+def _strategy_fit_prompt(company: str, ctx: Dict[str, Any]) -> str:
+    return textwrap.dedent(f"""
+    ROLE: StrategyFit agent.
+    Task: Propose strategic acquirer profiles (3–6) that would gain product/customer/geographic synergies
+    if acquiring the company below.
     Output bullet list: Buyer Name (or Archetype) — Why it fits (1–2 lines).
+    Prefer acquirers from the local universe list below (same sectors, larger than the company) when they fit.
+
+    Company: {company}
+    Local acquirer universe (pre-ranked by sector overlap and size):
+    {ctx.get("universe") or "(none)"}
+    Context sources (cite as [n]):
+    {ctx["pack"]}
     """)
-    return llm.invoke(prompt).content
 
 
-def _capability_match(company: str, sources: Dict[str, Any]) -> str:
-    llm = _llm()
-    prompt = textwrap.dedent(f"""
-    ROLE: CapabilityMatch agent.
-    Company: {company}
-    Context sources (truncated):
-    {str(sources)[:5000]}
+@traced_step("strategy_fit")
+def _strategy_fit(company: str, ctx: Dict[str, Any]) -> str:
+    return _llm("strategy_fit").invoke(_strategy_fit_prompt(company, ctx)).content
+
 
-    Task: Suggest PE/financial buyers and adjacent-tech strategics who could scale {company}'s capabilities.
+@traced_step("strategy_fit")
+async def _a_strategy_fit(company: str, ctx: Dict[str, Any]) -> str:
+    return (await _llm("strategy_fit").ainvoke(_strategy_fit_prompt(company, ctx))).content
+
+
+def _capability_match_prompt(company: str, ctx: Dict[str, Any]) -> str:
+    return textwrap.dedent(f"""
+    ROLE: CapabilityMatch agent.
+    Task: Suggest PE/financial buyers and adjacent-tech strategics who could scale the capabilities of the company below.
     Output bullet list with brief capability rationale & potential value-creation levers.
+
+    Company: {company}
+    Context sources (cite as [n]):
+    {ctx["pack"]}
     """)
-    return llm.invoke(prompt).content
 
 
-def _deal_precedent(company: str, sources: Dict[str, Any]) -> str:
-    llm = _llm()
-    prompt = textwrap.dedent(f"""
-    ROLE: DealPrecedent agent.
-    Company: {company}
-    Context (truncated):
-    {str(sources)[:5000]}
+@traced_step("capability_match")
+def _capability_match(company: str, ctx: Dict[str, Any]) -> str:
+    return _llm("capability_match").invoke(_capability_match_prompt(company, ctx)).content
+
+
+@traced_step("capability_match")
+async def _a_capability_match(company: str, ctx: Dict[str, Any]) -> str:
+    return (await _llm("capability_match").ainvoke(_capability_match_prompt(company, ctx))).content
 
-    Task: List 3–5 recent M&A precedents in this industry (last ~3y), each with buyer—target—rationale.
+
+def _deal_precedent_prompt(company: str, ctx: Dict[str, Any]) -> str:
+    return textwrap.dedent(f"""
+    ROLE: DealPrecedent agent.
+    Task: List 3–5 recent M&A precedents in the industry of the company below (last ~3y), each with buyer—target—rationale.
     If uncertain, provide plausible archetypes + reasoning.
+
+    Company: {company}
+    Context sources (cite as [n]):
+    {ctx["pack"]}
     """)
-    return llm.invoke(prompt).content
 
-def _aggregate(company, fit, cap, deals, feedback, *, no_sources=False, sources=None) -> str:
-    llm = _llm()
+
+@traced_step("deal_precedent")
+def _deal_precedent(company: str, ctx: Dict[str, Any]) -> str:
+    return _llm("deal_precedent").invoke(_deal_precedent_prompt(company, ctx)).content
+
+
+@traced_step("deal_precedent")
+async def _a_deal_precedent(company: str, ctx: Dict[str, Any]) -> str:
+    return (await _llm("deal_precedent").ainvoke(_deal_precedent_prompt(company, ctx))).content
+
+
+_NO_SOURCES_NOTE = (
+    "No external sources available (quota/disabled). "
+    "Skipping market-validated buyers. Refer to the model-driven Buyer List section.\n\n"
+    "Without access to external sources, I cannot provide a validated list."
+)
+
+
+def _aggregate_prompt(company, fit, cap, deals, feedback, *, no_sources=False, sources=None) -> Optional[str]:
+    """Prompt cho aggregator; None nếu không có nguồn và đang bật strict mode."""
     fb_txt = f"\nReviewer feedback to incorporate:\n{feedback}\n" if feedback else ""
 
     # bật/tắt chế độ yêu cầu nguồn
     require_sources = os.getenv("PB_REQUIRE_SOURCES", "true").lower() == "true"
 
-    # (giữ phần build sources_snip nếu có)
-    source_lines = []
-    if isinstance(sources, dict):
-        try:
-            for i, item in enumerate(sources.get("results", [])[:8], 1):
-                title = (item.get("title") or item.get("url") or "")[:120]
-                url = item.get("url") or ""
-                source_lines.append(f"[{i}] {title}: {url}")
-        except Exception:
-            pass
-    sources_snip = "\n".join(source_lines)
+    # nguồn đã đánh số trong registry của run (cùng số với các draft ở trên)
+    sources_snip = source_list_md((sources or [])[:8])
 
     mode = "NO-SOURCE" if no_sources else "WITH-SOURCES"
 
     # nếu không có nguồn và đang bật strict mode -> in NOTE
     if no_sources and require_sources:
-        return (
-            "No external sources available (quota/disabled). "
-            "Skipping market-validated buyers. Refer to the model-driven Buyer List section.\n\n"
-            "Without access to external sources, I cannot provide a validated list."
-        )
+        return None
+
+    # 3 draft cùng mức ưu tiên -> cắt đều; nguồn + feedback giữ nguyên
+    drafts = trim_fields("aggregate", {"fit": fit, "cap": cap, "deals": deals},
+                         template=_render_aggregate(company, mode, "", "", "", fb_txt, sources_snip))
 
     # còn lại: sinh danh sách như bình thường (có/không có sources đều cho phép)
-    prompt = f"""
+    return _render_aggregate(company, mode, drafts["fit"], drafts["cap"], drafts["deals"], fb_txt, sources_snip)
+
+
+def _render_aggregate(company, mode, fit, cap, deals, fb_txt, sources_snip) -> str:
+    return f"""
 You are the aggregator.
+Merge the three drafts below into a single ranked list of 6–10 potential buyers for the company.
+
+Requirements:
+- Group by Strategic vs Financial (PE).
+- Each item: Buyer name (or archetype), 1–2 line rationale, and a Fit Score 0–100.
+- Attach citation markers [n] when derived from SOURCES below (if any).
+- End with 'Assumptions & Caveats'.
+Return FINAL MARKDOWN list only.
+
 Mode: {mode}
+Company: {company}
 
-Merge the three drafts below into a single ranked list of 6–10 potential buyers for {company}:
 1) StrategyFit:
 {fit}
 
@@ -136,30 +177,79 @@ Merge the three drafts below into a single ranked list of 6–10 potential buyer
 {deals}
 {fb_txt}
 
-Requirements:
-- Group by Strategic vs Financial (PE).
-- Each item: Buyer name (or archetype), 1–2 line rationale, and a Fit Score 0–100.
-- Attach citation markers [n] when derived from SOURCES below (if any).
-- End with 'Assumptions & Caveats'.
-Return FINAL MARKDOWN list only.
-
 SOURCES
 {sources_snip}
 """
-    return llm.invoke(prompt).content
+
+
+@traced_step("aggregate")
+def _aggregate(company, fit, cap, deals, feedback, *, no_sources=False, sources=None) -> str:
+    prompt = _aggregate_prompt(company, fit, cap, deals, feedback, no_sources=no_sources, sources=sources)
+    if prompt is None:
+        return _NO_SOURCES_NOTE
+    return _llm("aggregate").invoke(prompt).content
+
+
+@traced_step("aggregate")
+async def _a_aggregate(company, fit, cap, deals, feedback, *, no_sources=False, sources=None) -> str:
+    prompt = _aggregate_prompt(company, fit, cap, deals, feedback, no_sources=no_sources, sources=sources)
+    if prompt is None:
+        return _NO_SOURCES_NOTE
+    return (await _llm("aggregate").ainvoke(prompt)).content
+
+
+# 3 micro-agent chỉ phụ thuộc vào ctx -> chạy song song
+_FANOUT = (_strategy_fit, _capability_match, _deal_precedent)
+_A_FANOUT = (_a_strategy_fit, _a_capability_match, _a_deal_precedent)
+
+
+def _max_concurrency(value: Optional[int]) -> int:
+    n = value if value is not None else int(os.getenv("PB_MAX_CONCURRENCY", str(len(_FANOUT))))
+    return max(1, n)
 
 
 # ---------- Public API (được main.py gọi) ----------
-def run_potential_buyers_swarm(company: str, feedback: Optional[str] = None) -> str:
+# company: tên (search, universe); entity: khối RESOLVED ENTITY chỉ đưa vào prompt
+def run_potential_buyers_swarm(company: str, feedback: Optional[str] = None, *, entity: str = "",
+                               max_concurrency: Optional[int] = None) -> str:
     company = (company or "").strip() or "Unknown Company"
+    subject = prompt_subject(company, entity, indent="    ")
 
     ctx = _gather_context(company)
-    fit = _strategy_fit(company, ctx)
-    cap = _capability_match(company, ctx)
-    deals = _deal_precedent(company, ctx)
+    with ThreadPoolExecutor(max_workers=_max_concurrency(max_concurrency)) as pool:
+        # copy_context: giữ callbacks/config của LangChain trong worker thread
+        futures = [pool.submit(contextvars.copy_context().run, fn, subject, ctx) for fn in _FANOUT]
+        fit, cap, deals = [f.result() for f in futures]
 
     md = _aggregate(
-        company,
+        prompt_subject(company, entity),
+        fit,
+        cap,
+        deals,
+        feedback,
+        no_sources=bool(ctx.get("no_sources")),
+        sources=ctx.get("sources"),
+    )
+    return f"# Potential Buyers \n\n{md}"
+
+
+async def arun_potential_buyers_swarm(company: str, feedback: Optional[str] = None, *, entity: str = "",
+                                      max_concurrency: Optional[int] = None) -> str:
+    """Async twin of `run_potential_buyers_swarm`."""
+    company = (company or "").strip() or "Unknown Company"
+    subject = prompt_subject(company, entity, indent="    ")
+
+    ctx = await _a_gather_context(company)
+    sem = asyncio.Semaphore(_max_concurrency(max_concurrency))
+
+    async def bounded(fn):
+        async with sem:
+            return await fn(subject, ctx)
+
+    fit, cap, deals = await asyncio.gather(*(bounded(fn) for fn in _A_FANOUT))
+
+    md = await _a_aggregate(
+        prompt_subject(company, entity),
         fit,
         cap,
         deals,
@@ -0,0 +1,221 @@
+# agents/projections.py
+"""Projection engine cục bộ (NumPy) cho financial swarm.
+
+Parse + validate assumptions JSON do `_assumption_builder` sinh ra, rồi tính
+bảng Revenue/EBIT 3 năm cho Base/Bull/Bear chính xác, không cần LLM.
+"""
+import json
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SCENARIOS = ("base", "bull", "bear")
+YEARS = 3
+# base-year revenue unknown -> dùng chỉ số (Year0 = 100)
+INDEX_BASE = 100.0
+# khoảng hợp lệ (lo, hi] của tỉ lệ dạng thập phân; ngoài khoảng -> AssumptionsError
+CAGR_RANGE = (-0.9, 3.0)
+MARGIN_RANGE = (-1.0, 1.0)
+
+_UNITS = {
+    "t": 1e12, "tn": 1e12, "trillion": 1e12,
+    "b": 1e9, "bn": 1e9, "billion": 1e9,
+    "m": 1e6, "mm": 1e6, "mn": 1e6, "million": 1e6,
+    "k": 1e3, "thousand": 1e3,
+}
+
+
+class AssumptionsError(ValueError):
+    """Assumptions JSON is missing, malformed or out of range."""
+
+
+@dataclass(frozen=True)
+class Scenario:
+    cagr: float
+    ebit_margin: float
+
+
+@dataclass(frozen=True)
+class Assumptions:
+    base_year_revenue: Optional[float]       # USD, None nếu unknown
+    base_year_revenue_raw: str
+    scenarios: Dict[str, Scenario]
+    notes: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dạng JSON-serializable (lưu vào kb / state / result cache)."""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Assumptions":
+        """Inverse of `to_dict` (dữ liệu đã validate, không parse lại)."""
+        return cls(
+            base_year_revenue=data.get("base_year_revenue"),
+            base_year_revenue_raw=str(data.get("base_year_revenue_raw", "unknown")),
+            scenarios={k: Scenario(**v) for k, v in data["scenarios"].items()},
+            notes=list(data.get("notes") or []),
+        )
+
+
+_YEAR = re.compile(r"(19|20)\d{2}")
+
+
+def parse_usd(value: Any) -> Optional[float]:
+    """'USD 60.9B' / '$26.97 billion' / 6.09e10 -> float USD; 'unknown' -> None."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    s = str(value).strip().lower().replace(",", "")
+    # ưu tiên số có đơn vị ("FY2024 revenue $60.9B" -> 60.9B, không phải 2024)
+    u = re.search(r"(\d+(?:\.\d+)?)\s*(trillion|billion|million|thousand|tn|bn|mn|mm|t|b|m|k)\b", s)
+    if u:
+        amount = float(u.group(1)) * _UNITS[u.group(2)]
+    else:
+        # số không đơn vị: bỏ các số trông như năm ("FY2024 revenue: 60.9" -> 60.9; chỉ có năm -> None)
+        nums = [m.group(0) for m in re.finditer(r"\d+(?:\.\d+)?", s) if not _YEAR.fullmatch(m.group(0))]
+        if not nums:
+            return None
+        amount = float(nums[0])
+    return amount if amount > 0 else None
+
+
+def parse_rate(value: Any) -> Optional[float]:
+    """Tỉ lệ -> số thập phân; None nếu không phải số.
+
+    Chỉ chuỗi có '%' mới chia 100 ("1%" -> 0.01, "-1%" -> -0.01). Số trần là thập phân
+    theo schema (0.12 -> 0.12, 2.0 -> 2.0); 12 giữ nguyên 12.0 và bị range check bắt.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    percent = isinstance(value, str) and value.strip().endswith("%")
+    try:
+        x = float(str(value).strip().rstrip("%").strip())
+    except ValueError:
+        return None
+    return x / 100.0 if percent else x
+
+
+def in_range(x: Optional[float], bounds: Tuple[float, float]) -> bool:
+    """lo < x <= hi (bounds = CAGR_RANGE / MARGIN_RANGE)."""
+    return x is not None and bounds[0] < x <= bounds[1]
+
+
+def _rate(value: Any, name: str, bounds: Tuple[float, float]) -> float:
+    x = parse_rate(value)
+    if x is None:
+        raise AssumptionsError(f"{name} is not a number: {value!r}")
+    if not in_range(x, bounds):
+        raise AssumptionsError(f"{name} out of range: {x}")
+    return x
+
+
+def _extract_json(text: str) -> Dict[str, Any]:
+    s = (text or "").strip()
+    s = re.sub(r"^```(?:json)?\s*|\s*```$", "", s)
+    start, end = s.find("{"), s.rfind("}")
+    if start < 0 or end <= start:
+        raise AssumptionsError("no JSON object found")
+    try:
+        return json.loads(s[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise AssumptionsError(f"invalid JSON: {e}")
+
+
+def parse_assumptions(text_or_obj: Any) -> Assumptions:
+    """Validate the assumptions schema; raises AssumptionsError."""
+    obj = text_or_obj if isinstance(text_or_obj, dict) else _extract_json(str(text_or_obj))
+    raw_scen = obj.get("scenarios")
+    if not isinstance(raw_scen, dict):
+        raise AssumptionsError("missing 'scenarios'")
+
+    scenarios: Dict[str, Scenario] = {}
+    for name in SCENARIOS:
+        sc = raw_scen.get(name) or raw_scen.get(name.capitalize())
+        if not isinstance(sc, dict):
+            raise AssumptionsError(f"missing scenario '{name}'")
+        cagr = _rate(sc.get("cagr"), f"{name}.cagr", CAGR_RANGE)
+        margin = _rate(sc.get("ebit_margin"), f"{name}.ebit_margin", MARGIN_RANGE)
+        scenarios[name] = Scenario(cagr=cagr, ebit_margin=margin)
+
+    raw_rev = obj.get("base_year_revenue", "unknown")
+    notes = obj.get("notes") or []
+    return Assumptions(
+        base_year_revenue=parse_usd(raw_rev),
+        base_year_revenue_raw=str(raw_rev),
+        scenarios=scenarios,
+        notes=[str(n) for n in notes] if isinstance(notes, list) else [str(notes)],
+    )
+
+
+def project(a: Assumptions, years: int = YEARS) -> Dict[str, np.ndarray]:
+    """Vectorized projection; arrays có shape (len(SCENARIOS), years + 1)."""
+    cagr = np.array([a.scenarios[s].cagr for s in SCENARIOS])
+    margin = np.array([a.scenarios[s].ebit_margin for s in SCENARIOS])
+    base = a.base_year_revenue if a.base_year_revenue else INDEX_BASE
+
+    t = np.arange(years + 1)
+    revenue = base * np.power(1.0 + cagr[:, None], t[None, :])
+    ebit = revenue * margin[:, None]
+    return {"revenue": revenue, "ebit": ebit, "margin": np.broadcast_to(margin[:, None], revenue.shape)}
+
+
+def fmt_usd(x: float) -> str:
+    sign = "-" if x < 0 else ""
+    x = abs(x)
+    for unit, div in (("T", 1e12), ("B", 1e9), ("M", 1e6)):
+        if x >= div:
+            return f"{sign}${x / div:,.2f}{unit}"
+    return f"{sign}${x:,.0f}"
+
+
+def render_table(a: Assumptions, proj: Dict[str, np.ndarray]) -> str:
+    indexed = not a.base_year_revenue
+    fmt = (lambda x: f"{x:,.1f}") if indexed else fmt_usd
+    years = proj["revenue"].shape[1]
+
+    header = "| Scenario | Metric | " + " | ".join(
+        ["Year0 (base)"] + [f"Year{i}" for i in range(1, years)]) + " |"
+    sep = "|" + "---|" * (years + 2)
+    lines = [header, sep]
+    for i, name in enumerate(SCENARIOS):
+        label = name.capitalize()
+        lines.append(f"| {label} | Revenue | " + " | ".join(fmt(v) for v in proj["revenue"][i]) + " |")
+        lines.append(f"| {label} | EBIT | " + " | ".join(fmt(v) for v in proj["ebit"][i]) + " |")
+        lines.append(f"| {label} | EBIT Margin | " + " | ".join(f"{v:.1%}" for v in proj["margin"][i]) + " |")
+
+    if indexed:
+        lines.append("")
+        lines.append(f"_Base-year revenue unknown ({a.base_year_revenue_raw}); figures are indexed to Year0 = {INDEX_BASE:.0f}._")
+    return "\n".join(lines)
+
+
+def sanity_notes(a: Assumptions) -> List[str]:
+    """Kiểm tra hợp lý cục bộ (thay cho LLM sanity checker)."""
+    s = a.scenarios
+    notes = []
+    if not (s["bull"].cagr >= s["base"].cagr >= s["bear"].cagr):
+        notes.append("CAGR is not ordered Bull ≥ Base ≥ Bear.")
+    if not (s["bull"].ebit_margin >= s["base"].ebit_margin >= s["bear"].ebit_margin):
+        notes.append("EBIT margin is not ordered Bull ≥ Base ≥ Bear.")
+    for name in SCENARIOS:
+        if s[name].cagr > 0.6:
+            notes.append(f"{name.capitalize()} CAGR of {s[name].cagr:.0%} is aggressive for a 3-year horizon.")
+        if s[name].ebit_margin > 0.6:
+            notes.append(f"{name.capitalize()} EBIT margin of {s[name].ebit_margin:.0%} is unusually high.")
+        if s[name].ebit_margin < 0:
+            notes.append(f"{name.capitalize()} scenario is loss-making at the EBIT level.")
+    if a.base_year_revenue is None:
+        notes.append("Base-year revenue could not be determined; table is indexed, not in USD.")
+    notes.append("Table computed deterministically from the assumptions (Revenue_t = Revenue_0 × (1 + CAGR)^t, EBIT = Revenue × margin).")
+    return notes
+
+
+def build_projection_md(a: Assumptions, narrative: str = "") -> str:
+    """Markdown: table + narrative (nếu có) + Sanity notes."""
+    table = render_table(a, project(a))
+    notes = "\n".join(f"- {n}" for n in sanity_notes(a))
+    body = f"{table}\n\n{narrative.strip()}" if narrative.strip() else table
+    return f"{body}\n\n### Sanity notes\n{notes}"
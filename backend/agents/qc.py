@@ -0,0 +1,308 @@
+# agents/qc.py
+"""QC cấu trúc cục bộ cho các section (không gọi LLM, vài ms / section).
+
+Thay cho chấm điểm theo độ dài: parse Markdown của section rồi kiểm tra
+- heading bắt buộc theo OUTPUT FORMAT của agent (report dịch sang ngôn ngữ khác thì bỏ qua),
+- citation: marker [n] phải có entry trong Sources của report ("own") hoặc trong source
+  registry của run ("registry"),
+- bảng: đúng format (dòng separator, số cột đều) và đủ cột bắt buộc (vd. bảng M&A),
+- số liệu: EBIT = Revenue × margin trong bảng dự phóng, Date của deal, Fit Score 0–100,
+- marker `[tool_error]`.
+
+Mỗi lỗi (Issue) trừ điểm (score 0..1) và ghi `fixable`: chỉ lỗi mà chạy lại có thể sửa
+(thiếu section, citation treo, bảng hỏng, ...) mới kích hoạt rework. Section bị skip (không
+có search provider) hoặc hết deadline không rework, vì chạy lại cũng ra kết quả như cũ.
+"""
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Collection, Dict, List, Optional, Tuple
+
+from agents.deadline import MISSING
+from agents.markdown import split_sections
+
+_CITE = re.compile(r"\[(\d+(?:\s*,\s*\d+)*)\]")
+# entry của danh sách Sources: "- [3] Title: https://..." / "3. Title — https://..."
+_ENTRY = re.compile(r"^\s*(?:[-*]\s*)?(?:\[(\d+)\]|(\d+)[.)])\s*\S.*$")
+_URL = re.compile(r"https?://")
+_SEPARATOR = re.compile(r"^:?-{2,}:?$")
+_NUMBER = re.compile(r"(-)?\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(%|[TtBbMmKk](?![a-z]))?")
+_YEAR = re.compile(r"(19|20)\d{2}")
+_FIT = re.compile(r"fit\s*score[^0-9\n]{0,12}(\d+(?:\.\d+)?)", re.I)
+_UNIT = {"t": 1e12, "b": 1e9, "m": 1e6, "k": 1e3}
+_SKIPPED = ("Skipped:", "No external sources available")
+
+
+@dataclass(frozen=True)
+class Issue:
+    check: str           # tool_error | length | headings | citations | table | numbers | skipped | deadline
+    message: str
+    penalty: float
+    fixable: bool = True
+
+
+@dataclass
+class QCResult:
+    section: str
+    score: float
+    issues: List[Issue] = field(default_factory=list)
+    ms: float = 0.0
+
+    def needs_rework(self, threshold: float) -> bool:
+        """Chạy lại chỉ khi có lỗi upstream, hoặc điểm dưới ngưỡng VÀ có lỗi chạy lại sửa được."""
+        if any(i.check == "tool_error" for i in self.issues):
+            return True
+        return self.score < threshold and any(i.fixable and i.penalty > 0 for i in self.issues)
+
+    def feedback(self) -> str:
+        """Feedback cụ thể cho vòng rework (đưa vào revision prompt của node)."""
+        if any(i.check == "tool_error" for i in self.issues):
+            return "The previous attempt failed with an upstream error; produce the full section."
+        fixes = [i.message for i in self.issues if i.fixable and i.penalty > 0]
+        if not fixes:
+            return ""
+        return "Fix these issues and keep everything else unchanged:\n" + "\n".join(f"- {m}" for m in fixes)
+
+
+@dataclass(frozen=True)
+class Table:
+    heading: str         # heading của section chứa bảng ("" = trước heading đầu)
+    header: List[str]
+    rows: List[List[str]]
+    well_formed: bool
+
+
+# ========================= PARSE =========================
+def _title(heading: str) -> str:
+    # "## 3) Risks & Legal" -> "risks & legal"
+    return re.sub(r"^\d+[.)]\s*", "", heading.lstrip("#").strip()).lower()
+
+
+def _cells(line: str) -> List[str]:
+    return [c.strip() for c in line.strip().strip("|").split("|")]
+
+
+def parse_tables(md: str) -> List[Table]:
+    """Mọi bảng Markdown (khối dòng liên tiếp bắt đầu bằng '|'), kèm heading chứa nó."""
+    tables: List[Table] = []
+    for heading, body in split_sections(md):
+        block: List[str] = []
+        for line in body.splitlines() + [""]:
+            if line.strip().startswith("|"):
+                block.append(line)
+                continue
+            if len(block) >= 2 or (block and len(_cells(block[0])) > 1):
+                header = _cells(block[0])
+                has_sep = len(block) > 1 and all(_SEPARATOR.match(c.replace(" ", "")) for c in _cells(block[1]))
+                rows = [_cells(r) for r in block[2 if has_sep else 1:]]
+                ok = has_sep and all(len(r) == len(header) for r in rows)
+                tables.append(Table(heading=_title(heading), header=header, rows=rows, well_formed=ok))
+            block = []
+    return tables
+
+
+def parse_number(cell: str) -> Optional[float]:
+    """'$1.25B' -> 1.25e9, '12.5%' -> 0.125, '1,234.5' -> 1234.5; None nếu không có số."""
+    m = _NUMBER.search(cell or "")
+    if not m:
+        return None
+    x = float(m.group(2).replace(",", ""))
+    unit = (m.group(3) or "").lower()
+    if unit == "%":
+        x /= 100
+    elif unit:
+        x *= _UNIT[unit]
+    return -x if m.group(1) else x
+
+
+def _citations(md: str) -> Tuple[List[int], List[int]]:
+    """(marker [n] trong nội dung, số của các entry trong Sources)."""
+    markers: List[int] = []
+    entries: List[int] = []
+    for heading, body in split_sections(md):
+        in_sources = _title(heading).startswith(("sources", "references", "nguồn"))
+        for line in body.splitlines():
+            m = _ENTRY.match(line)
+            if m and (in_sources or _URL.search(line)):
+                entries.append(int(m.group(1) or m.group(2)))
+                continue
+            markers += [int(x) for c in _CITE.finditer(line) for x in c.group(1).split(",")]
+    return markers, entries
+
+
+# ========================= CHECKS =========================
+def _check_headings(md: str, required: Tuple[str, ...]) -> List[Issue]:
+    titles = [_title(h) for h, _ in split_sections(md) if h]
+    missing = [name for name in required if not any(t.startswith(name.lower()) for t in titles)]
+    if len(required) >= 3 and len(missing) == len(required) and len(titles) >= len(required) - 1:
+        return []  # report viết bằng ngôn ngữ khác (heading đã dịch): không so tên
+    if not missing:
+        return []
+    return [Issue("headings", f"Add the missing sections: {', '.join(missing)}.", min(0.4, 0.08 * len(missing)))]
+
+
+def _check_citations(md: str, mode: str, known: Optional[Collection[int]]) -> List[Issue]:
+    markers, entries = _citations(md)
+    if mode == "registry":
+        if not known:
+            return []  # run không có nguồn nào (search tắt): không đòi citation
+        valid = set(known)
+    else:
+        valid = set(entries)
+        if not entries:
+            return [Issue("citations", "End the report with a Sources list ([n] Title: URL) matching the inline markers.", 0.3)]
+    if not markers:
+        return [Issue("citations", "Cite facts inline with numbered markers [n] that match the Sources list.", 0.3)]
+    issues: List[Issue] = []
+    dangling = sorted(set(markers) - valid)
+    if dangling:
+        shown = ", ".join(f"[{n}]" for n in dangling[:6])
+        issues.append(Issue("citations", f"Citation markers {shown} have no matching source; fix or remove them.",
+                            min(0.3, 0.1 * len(dangling))))
+    unused = sorted(set(entries) - set(markers))
+    if unused:
+        issues.append(Issue("citations", f"{len(unused)} source(s) in the list are never cited.", 0.0, fixable=False))
+    return issues
+
+
+def _check_tables(md: str, required: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> List[Issue]:
+    tables = parse_tables(md)
+    issues: List[Issue] = []
+    broken = [t for t in tables if not t.well_formed]
+    if broken:
+        issues.append(Issue("table", "Fix malformed Markdown tables (header separator row and the same number of "
+                                     "cells in every row).", min(0.3, 0.15 * len(broken))))
+    for where, columns in required:
+        candidates = [t for t in tables if t.heading.startswith(where.lower())]
+        if not candidates:
+            issues.append(Issue("table", f"Add the required table ({' | '.join(columns)})"
+                                         f"{f' under {where}' if where else ''}.", 0.3))
+            continue
+        header = " ".join(candidates[0].header).lower().replace(" ", "")
+        missing = [c for c in columns if c.lower().replace(" ", "") not in header]
+        if missing:
+            issues.append(Issue("table", f"Table{f' under {where}' if where else ''} is missing columns: "
+                                         f"{', '.join(missing)}.", min(0.3, 0.1 * len(missing))))
+    return issues
+
+
+def _check_projection(md: str) -> List[Issue]:
+    """Bảng dự phóng: EBIT ≈ Revenue × EBIT Margin ở mọi năm của mỗi scenario."""
+    rows: Dict[Tuple[str, str], List[float]] = {}
+    for t in parse_tables(md):
+        for r in t.rows:
+            label = " ".join(c for c in r if parse_number(c) is None).lower()
+            scenario = next((s for s in ("base", "bull", "bear") if s in label), None)
+            metric = "margin" if "margin" in label else "ebit" if "ebit" in label else \
+                "revenue" if "revenue" in label else None
+            values = [v for v in (parse_number(c) for c in r) if v is not None]
+            if scenario and metric and values:
+                rows.setdefault((scenario, metric), values)
+    bad = []
+    for s in ("base", "bull", "bear"):
+        rev, ebit, margin = rows.get((s, "revenue")), rows.get((s, "ebit")), rows.get((s, "margin"))
+        if not (rev and ebit and margin) or not (len(rev) == len(ebit) == len(margin)):
+            continue
+        if any(abs(e - r * m) > 0.02 * abs(r) + 1e-9 for r, e, m in zip(rev, ebit, margin)):
+            bad.append(s.capitalize())
+    if not bad:
+        return []
+    return [Issue("numbers", f"EBIT does not equal Revenue × EBIT Margin in the {', '.join(bad)} scenario(s); "
+                             "recompute the table.", min(0.5, 0.25 * len(bad)))]
+
+
+def _check_deals(md: str) -> List[Issue]:
+    """Bảng M&A: Date phải có năm."""
+    bad = 0
+    for t in parse_tables(md):
+        cols = [c.lower() for c in t.header]
+        if not t.heading.startswith("industry m&a") or "date" not in cols:
+            continue
+        i = cols.index("date")
+        bad += sum(1 for r in t.rows if i < len(r) and not _YEAR.search(r[i]))
+    if not bad:
+        return []
+    return [Issue("numbers", f"{bad} M&A row(s) have no parseable Date (use YYYY or YYYY-MM).", min(0.2, 0.05 * bad))]
+
+
+def _check_buyers(md: str) -> List[Issue]:
+    text = md.lower()
+    issues: List[Issue] = []
+    groups = [g for g, words in (("Strategic", ("strategic",)), ("Financial (PE)", ("financial", "private equity", "pe ")))
+              if not any(w in text for w in words)]
+    if groups:
+        issues.append(Issue("headings", f"Group buyers by Strategic vs Financial (PE); missing: {', '.join(groups)}.",
+                            0.1 * len(groups)))
+    if "assumptions & caveats" not in text and "assumptions and caveats" not in text:
+        issues.append(Issue("headings", "End with an 'Assumptions & Caveats' section.", 0.08))
+    scores = [float(x) for x in _FIT.findall(md)]
+    if not scores:
+        issues.append(Issue("numbers", "Give every buyer a Fit Score (0–100).", 0.15))
+    elif any(not 0 <= x <= 100 for x in scores):
+        issues.append(Issue("numbers", "Fit Scores must be between 0 and 100.", 0.15))
+    return issues
+
+
+# ========================= SPECS =========================
+@dataclass(frozen=True)
+class SectionSpec:
+    headings: Tuple[str, ...] = ()
+    # (heading chứa bảng, "" = bất kỳ; các cột bắt buộc)
+    tables: Tuple[Tuple[str, Tuple[str, ...]], ...] = ()
+    citations: Optional[str] = None          # "own" | "registry" | None
+    min_words: int = 0
+    checks: Tuple[Callable[[str], List[Issue]], ...] = ()
+
+
+# theo OUTPUT FORMAT trong prompt của từng agent
+SPECS: Dict[str, SectionSpec] = {
+    "company": SectionSpec(
+        headings=("Company Card", "Products/Services", "Financials", "Technology", "Market & Competition",
+                  "Risks", "Leadership", "Notable Updates", "Conclusion", "Sources"),
+        citations="own", min_words=250),
+    "industry": SectionSpec(
+        headings=("Company & Industry Identification", "Recent Trends", "Industry M&A History", "Risks",
+                  "Outlook", "Sources"),
+        tables=(("Industry M&A History", ("Date", "Acquirer", "Target", "Value", "Status", "Rationale", "Source")),),
+        citations="own", min_words=250, checks=(_check_deals,)),
+    "financial": SectionSpec(
+        headings=("Sanity notes",),
+        tables=(("", ("Year0", "Year1", "Year2", "Year3")),),
+        min_words=40, checks=(_check_projection,)),
+    "buyers": SectionSpec(citations="registry", min_words=80, checks=(_check_buyers,)),
+}
+
+
+def check_section(section: str, text: str, known: Optional[Collection[int]] = None) -> QCResult:
+    """Chấm 1 section. `known`: số [n] có trong source registry của run (cho citation "registry")."""
+    t0 = time.perf_counter()
+    text = text or ""
+    issues = _issues(section, text, known)
+    score = max(0.0, 1.0 - sum(i.penalty for i in issues))
+    return QCResult(section=section, score=round(score, 3), issues=issues,
+                    ms=(time.perf_counter() - t0) * 1000)
+
+
+def _issues(section: str, text: str, known: Optional[Collection[int]]) -> List[Issue]:
+    stripped = text.strip()
+    if "[tool_error]" in text:
+        return [Issue("tool_error", "The previous attempt failed with an upstream error.", 1.0)]
+    if stripped.startswith(MISSING):
+        return [Issue("deadline", "Section not completed within the run's latency budget.", 1.0, fixable=False)]
+    if stripped.startswith(_SKIPPED) or _SKIPPED[1] in stripped[:200]:
+        return [Issue("skipped", "Section skipped: no web sources available.", 0.0, fixable=False)]
+    if not stripped:
+        return [Issue("length", "The section is empty; produce the full section.", 1.0)]
+    spec = SPECS.get(section, SectionSpec())
+    issues: List[Issue] = []
+    words = len(stripped.split())
+    if words < spec.min_words:
+        issues.append(Issue("length", f"The section is too short ({words} words); cover every required part.", 0.3))
+    if spec.headings:
+        issues += _check_headings(stripped, spec.headings)
+    if spec.citations:
+        issues += _check_citations(stripped, spec.citations, known)
+    issues += _check_tables(stripped, spec.tables)
+    for check in spec.checks:
+        issues += check(stripped)
+    return issues
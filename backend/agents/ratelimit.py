@@ -0,0 +1,209 @@
+# agents/ratelimit.py
+"""Rate limiter dùng chung toàn process cho OpenAI + Tavily.
+
+Mỗi (provider, model) có 1 `ProviderLimiter` gồm 2 token bucket: requests/min và
+tokens/min. Mọi nhánh song song, thread pool và event loop đi qua cùng limiter,
+nên tổng throughput bám sát quota của provider thay vì mỗi call tự retry -> bão 429.
+
+- Bucket kiểu reservation: `reserve(n)` trừ ngay (có thể âm) và trả về thời gian phải chờ,
+  nên các caller được phục vụ theo thứ tự, không ai bị bỏ đói.
+- Token được trừ trước theo ước lượng prompt, rồi `settle()` bù/hoàn theo usage thực tế.
+- 429 có `Retry-After` -> `penalize()`: toàn bộ caller của limiter đó dừng tới hạn.
+
+Cấu hình (per-minute), ưu tiên từ cụ thể tới chung:
+    OPENAI_GPT_4O_MINI_RPM / OPENAI_RPM (500)      OPENAI_GPT_4O_MINI_TPM / OPENAI_TPM (200000)
+    TAVILY_RPM (100)                               RATE_LIMIT_BURST_S (10) — kích thước burst
+    RATE_LIMIT_DISABLED=true                       tắt hẳn
+"""
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from agents import deadline
+from agents.cache import env_flag
+
+_DEFAULTS: Dict[Tuple[str, str], float] = {
+    ("openai", "RPM"): 500,
+    ("openai", "TPM"): 200_000,
+    ("tavily", "RPM"): 100,
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket, refill liên tục `rate_per_min`/phút, burst `capacity`."""
+
+    def __init__(self, rate_per_min: float, capacity: Optional[float] = None):
+        self.rate = rate_per_min / 60.0
+        burst_s = float(os.getenv("RATE_LIMIT_BURST_S", "10"))
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate * burst_s)
+        self._level = self.capacity
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._level = min(self.capacity, self._level + (now - self._ts) * self.rate)
+        self._ts = now
+
+    def reserve(self, n: float = 1.0) -> float:
+        """Take `n` now (may go into debt); return seconds to wait before using them."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level -= n
+            return max(0.0, -self._level / self.rate) if self._level < 0 else 0.0
+
+    def adjust(self, delta: float) -> None:
+        """Debit (delta > 0) or refund (delta < 0) after the fact."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level - delta)
+
+
+class ProviderLimiter(BaseRateLimiter):
+    """RPM + TPM buckets + cooldown chung của 1 (provider, model).
+
+    Là một `BaseRateLimiter` nên cũng truyền được thẳng vào `rate_limiter=` của chat model
+    (khi đó chỉ giới hạn requests/min).
+    """
+
+    def __init__(self, name: str, rpm: Optional[float], tpm: Optional[float] = None):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    # ---- reservation ----
+    def _reserve(self, tokens: float) -> float:
+        wait = self.requests.reserve(1) if self.requests else 0.0
+        if self.tokens and tokens > 0:
+            wait = max(wait, self.tokens.reserve(tokens))
+        with self._lock:
+            cooldown = self._blocked_until - time.monotonic()
+        return max(wait, cooldown, 0.0)
+
+    def wait(self, tokens: float = 0) -> None:
+        delay = self._reserve(tokens)
+        if delay > 0:
+            deadline.sleep(delay)
+
+    async def await_(self, tokens: float = 0) -> None:
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await deadline.asleep(delay)
+
+    def settle(self, estimated: float, actual: Optional[float]) -> None:
+        """Correct the TPM bucket once real usage is known."""
+        if self.tokens and actual is not None:
+            self.tokens.adjust(actual - estimated)
+
+    def penalize(self, seconds: float) -> None:
+        """Provider said slow down: every caller of this limiter pauses for `seconds`."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    # ---- BaseRateLimiter ----
+    def acquire(self, *, blocking: bool = True) -> bool:
+        if not blocking:
+            return self._reserve(0) == 0.0
+        self.wait()
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        if not blocking:
+            return self._reserve(0) == 0.0
+        await self.await_()
+        return True
+
+
+_limiters: Dict[Tuple[str, str], Optional[ProviderLimiter]] = {}
+_registry_lock = threading.Lock()
+
+
+def _limit(provider: str, model: str, kind: str) -> Optional[float]:
+    model_key = re.sub(r"[^A-Z0-9]+", "_", model.split(":")[-1].upper()).strip("_")
+    for env in (f"{provider.upper()}_{model_key}_{kind}", f"{provider.upper()}_{kind}"):
+        if os.getenv(env):
+            return float(os.environ[env])
+    return _DEFAULTS.get((provider, kind))
+
+
+def limiter_for(provider: str, model: str = "") -> Optional[ProviderLimiter]:
+    """Process-wide limiter for (provider, model); None when rate limiting is disabled."""
+    if env_flag("RATE_LIMIT_DISABLED"):
+        return None
+    key = (provider, model)
+    with _registry_lock:
+        if key not in _limiters:
+            rpm, tpm = _limit(provider, model, "RPM"), _limit(provider, model, "TPM")
+            _limiters[key] = ProviderLimiter(f"{provider}:{model}", rpm, tpm) if (rpm or tpm) else None
+        return _limiters[key]
+
+
+# ========================= BACKOFF =========================
+def retry_after_from_headers(headers: Any) -> Optional[float]:
+    """Seconds from `retry-after-ms` / `retry-after`; None if absent (or in HTTP-date form)."""
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms:
+            return float(ms) / 1000.0
+        s = headers.get("retry-after")
+        if s:
+            return float(s)
+    except (AttributeError, TypeError, ValueError):
+        pass
+    return None
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Retry-After của lỗi: `exc.retry_after` nếu có, không thì đọc header của response."""
+    explicit = getattr(exc, "retry_after", None)
+    if explicit is not None:
+        return float(explicit)
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    return retry_after_from_headers(headers) if headers is not None else None
+
+
+def _status(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    return _status(exc) == 429 or type(exc).__name__ in ("RateLimitError", "UsageLimitExceededError")
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """429 (trừ hết quota), 408/409/5xx, timeout, lỗi kết nối."""
+    if is_rate_limited(exc):
+        # hết quota/billing: retry cũng vô ích
+        return "insufficient_quota" not in str(getattr(exc, "body", "") or exc)
+    code = _status(exc)
+    if code is not None:
+        return code in (408, 409) or code >= 500
+    name = type(exc).__name__
+    return any(k in name for k in ("Timeout", "Connection", "RemoteProtocol"))
+
+
+def backoff_delay(attempt: int, exc: Optional[BaseException] = None,
+                  base: float = 0.8, cap: float = 30.0) -> float:
+    """Retry-After nếu provider gửi, ngược lại exponential backoff + full jitter."""
+    hinted = retry_after(exc) if exc is not None else None
+    if hinted is not None:
+        return min(hinted, 120.0)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def on_retryable_error(limiter: Optional[ProviderLimiter], attempt: int, exc: BaseException) -> float:
+    """Pick the delay for `exc`; a 429 pauses every caller of `limiter`, not just this one."""
+    delay = backoff_delay(attempt, exc)
+    if limiter is not None and is_rate_limited(exc):
+        limiter.penalize(delay)
+        return 0.0  # the next wait()/await_() already sleeps through the cooldown
+    return delay
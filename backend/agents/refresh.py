@@ -0,0 +1,245 @@
+# agents/refresh.py
+"""Incremental refresh cho report của company / industry agent.
+
+Report cũ (trong result cache, kể cả đã quá TTL) còn trẻ hơn REPORT_REFRESH_MAX_AGE_S (30 ngày)
+thì không chạy lại deep agent từ đầu: chỉ search tin `topic="news"` kể từ lúc report được tạo,
+rồi 1 LLM call viết lại các section bị ảnh hưởng (REFRESH_SECTIONS), phần còn lại giữ nguyên.
+Không có tin mới -> dùng lại report cũ, 0 LLM call.
+
+    refreshable_call(node, company, feedback, fn, refresh_fn, model=..., refresh=...)
+
+- cache hit còn hạn: trả luôn (như cached_call), trừ khi `refresh=True` (payload `refresh`).
+- hit đã quá TTL (hoặc `refresh=True`): incremental refresh; lỗi / LLM trả sai format -> chạy đầy đủ.
+- `force_refresh` hoặc REPORT_REFRESH_DISABLED=true: luôn chạy đầy đủ như trước.
+"""
+import logging
+import math
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from agents.budget import trim_fields
+from agents.cache import cache_key, env_flag, get_cache, is_cacheable
+from agents.llm import routed_model
+from agents.markdown import join_sections, split_sections
+from agents.memo import memoized
+from agents.search import ainternet_search, internet_search
+from agents.sources import Source, normalize_url, pack
+
+log = logging.getLogger(__name__)
+
+MAX_AGE_S = float(os.getenv("REPORT_REFRESH_MAX_AGE_S", 30 * 24 * 3600))
+NEWS_RESULTS = int(os.getenv("REPORT_REFRESH_NEWS_RESULTS", "6"))
+
+# node -> (heading của các section được viết lại, query tin tức)
+REFRESH_SECTIONS: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    "company":  (("Notable Updates",), "{company} latest news"),
+    "industry": (("Recent Trends", "Industry M&A History"), "{company} industry acquisitions deals trends"),
+}
+
+_CITE_N = re.compile(r"\[(\d+)\]")
+
+
+class RefreshError(ValueError):
+    """LLM không trả về section nào dùng được."""
+
+
+# ========================= MARKDOWN =========================
+def _title(heading: str) -> str:
+    return heading.lstrip("#").strip().lower()
+
+
+def _matches(heading: str, names: Tuple[str, ...]) -> bool:
+    return any(_title(heading).startswith(n.lower()) for n in names)
+
+
+# ========================= NEWS =========================
+def _news_query(node: str, company: str) -> str:
+    return REFRESH_SECTIONS[node][1].format(company=company)
+
+
+def _news_days(since: float) -> int:
+    return max(1, math.ceil((time.time() - since) / 86400))
+
+
+def _fresh_news(response: Any, since: float, start: int) -> List[Source]:
+    """Kết quả đăng sau `since` (không có ngày thì giữ, Tavily đã lọc theo `days`), đánh số từ `start`."""
+    results = response.get("results") if isinstance(response, dict) else response
+    cutoff = time.strftime("%Y-%m-%d", time.gmtime(since))
+    out: List[Source] = []
+    seen = set()
+    for r in results or []:
+        if not isinstance(r, dict) or not r.get("url"):
+            continue
+        date = str(r.get("published_date") or "")
+        if date and _iso_date(date) < cutoff:
+            continue
+        key = normalize_url(r["url"])
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(Source(n=start + len(out), url=r["url"], title=r.get("title") or "",
+                          snippet=r.get("content") or "", published_date=date or None))
+    return out
+
+
+def _iso_date(date: str) -> str:
+    # Tavily news trả RFC 2822 ("Sun, 01 Jun 2025 10:00:00 GMT") hoặc ISO ("2025-06-01")
+    try:
+        return time.strftime("%Y-%m-%d", time.strptime(date, "%a, %d %b %Y %H:%M:%S %Z"))
+    except ValueError:
+        return date[:10]
+
+
+# ========================= PROMPT =========================
+def _llm():
+    return memoized(routed_model("refresh", temperature=0.2))
+
+
+def _refresh_prompt(since: float, targets: List[Tuple[str, str]], news: List[Source]) -> str:
+    # section cũ được ghép lại nguyên văn từ output -> không cắt; pack tin dài thì cắt phần đuôi
+    sections = "\n".join(f"{h}\n{b.strip()}\n" for h, b in targets)
+    f = trim_fields("refresh", {"sections": sections, "news": pack(news)}, priority={"news": 1},
+                    keep=("sections",), template=_render_refresh(since, "", ""))
+    return _render_refresh(since, f["sections"], f["news"])
+
+
+def _render_refresh(since: float, sections: str, news_pack: str) -> str:
+    day = time.strftime("%Y-%m-%d", time.gmtime(since))
+    return f"""You update selected sections of an existing report with news published since {day}.
+
+Rules:
+- Return ONLY the sections below, each starting with its original heading line, unchanged.
+- Keep content that is still valid and its existing [n] markers; add or revise items only where the
+  NEWS supports it, citing them with the given [n] markers. Do not fabricate.
+- Markdown tables keep their exact columns; add new rows newest first.
+- If the news does not affect a section, return it unchanged.
+
+SECTIONS TO UPDATE
+{sections}
+NEWS SINCE {day} (cite as [n])
+{news_pack}
+"""
+
+
+def _splice(node: str, prior: str, updated: str, news: List[Source]) -> str:
+    names = REFRESH_SECTIONS[node][0]
+    updated = re.sub(r"^```\w*\n|\n```$", "", (updated or "").strip())
+    new = {_title(h): b for h, b in split_sections(updated) if h and _matches(h, names)}
+    if not new:
+        raise RefreshError(f"{node}: refresh returned no target section")
+    # nguồn mới nối vào cuối danh sách Sources của report (cùng format)
+    cited = "".join(f"- [{s.n}] {s.title or s.url}: {s.url}\n" for s in news)
+    out: List[Tuple[str, str]] = []
+    for h, b in split_sections(prior):
+        if h and _title(h) in new:
+            b = new[_title(h)].strip("\n") + "\n\n"
+        elif h and _title(h).startswith("sources") and cited:
+            b, cited = b.rstrip("\n") + "\n" + cited + "\n", ""
+        out.append((h, b))
+    if cited:
+        out.append(("### Sources", cited))
+    return join_sections(out).rstrip("\n") + "\n"
+
+
+def _plan(node: str, prior: str, since: float, response: Any) -> Optional[Tuple[str, List[Source]]]:
+    """(prompt, news), hoặc None nếu không có tin mới."""
+    if not isinstance(response, dict) or response.get("error") or response.get("note"):
+        # search lỗi / tắt: không biết có tin mới hay không -> không coi report cũ là đã refresh
+        raise RefreshError(f"{node}: news search unavailable ({(response or {}).get('error') or (response or {}).get('note')})")
+    names = REFRESH_SECTIONS[node][0]
+    targets = [(h, b) for h, b in split_sections(prior) if h and _matches(h, names)]
+    if not targets:
+        raise RefreshError(f"{node}: prior report has no {', '.join(names)} section")
+    start = max((int(n) for n in _CITE_N.findall(prior)), default=0) + 1
+    news = _fresh_news(response, since, start)
+    if not news:
+        return None
+    return _refresh_prompt(since, targets, news), news
+
+
+def refresh_report(node: str, company: str, prior: str, since: float) -> str:
+    """Report `prior` (tạo lúc `since`) cập nhật theo tin từ `since`; chỉ viết lại REFRESH_SECTIONS[node]."""
+    response = internet_search(_news_query(node, company), max_results=NEWS_RESULTS, topic="news",
+                               days=_news_days(since))
+    plan = _plan(node, prior, since, response)
+    if plan is None:
+        return prior
+    prompt, news = plan
+    return _splice(node, prior, _llm().invoke(prompt).content, news)
+
+
+async def arefresh_report(node: str, company: str, prior: str, since: float) -> str:
+    response = await ainternet_search(_news_query(node, company), max_results=NEWS_RESULTS, topic="news",
+                                      days=_news_days(since))
+    plan = _plan(node, prior, since, response)
+    if plan is None:
+        return prior
+    prompt, news = plan
+    return _splice(node, prior, (await _llm().ainvoke(prompt)).content, news)
+
+
+# ========================= CACHE =========================
+def _prior(key: str, force_refresh: bool, refresh: bool) -> Tuple[Optional[Any], Optional[Tuple[str, float]]]:
+    """(cache hit còn hạn, (report cũ, created_at) cần refresh)."""
+    if force_refresh or env_flag("RESULT_CACHE_FORCE_REFRESH"):
+        return None, None
+    entry = get_cache().peek(key)
+    if entry is None:
+        return None, None
+    value, created_at = entry
+    age = time.time() - created_at
+    ttl = get_cache().ttl_s
+    if not refresh and (ttl <= 0 or age <= ttl):
+        get_cache().get(key)  # cập nhật LRU
+        return value, None
+    if isinstance(value, str) and is_cacheable(value) and age <= MAX_AGE_S and not env_flag("REPORT_REFRESH_DISABLED"):
+        return None, (value, created_at)
+    return None, None
+
+
+def refreshable_call(node: str, company: str, feedback: str, fn: Callable[[], Any],
+                     refresh_fn: Callable[[str, float], str], *, model: str = "",
+                     force_refresh: bool = False, refresh: bool = False) -> Any:
+    """`cached_call` + incremental refresh: report cũ được `refresh_fn(prior, created_at)` cập nhật."""
+    if env_flag("RESULT_CACHE_DISABLED"):
+        return fn()
+    key = cache_key(node, company, feedback, model)
+    hit, prior = _prior(key, force_refresh, refresh)
+    if hit is not None:
+        return hit
+    value = None
+    if prior is not None:
+        try:
+            value = refresh_fn(*prior)
+        except Exception as e:
+            log.warning("incremental refresh of %s failed (%s: %s); running in full", node, type(e).__name__, e)
+    if value is None:
+        value = fn()
+    if is_cacheable(value):
+        get_cache().put(key, value, node=node)
+    return value
+
+
+async def arefreshable_call(node: str, company: str, feedback: str, afn: Callable[[], Awaitable[Any]],
+                            arefresh_fn: Callable[[str, float], Awaitable[str]], *, model: str = "",
+                            force_refresh: bool = False, refresh: bool = False) -> Any:
+    """Async variant of `refreshable_call`."""
+    if env_flag("RESULT_CACHE_DISABLED"):
+        return await afn()
+    key = cache_key(node, company, feedback, model)
+    hit, prior = _prior(key, force_refresh, refresh)
+    if hit is not None:
+        return hit
+    value = None
+    if prior is not None:
+        try:
+            value = await arefresh_fn(*prior)
+        except Exception as e:
+            log.warning("incremental refresh of %s failed (%s: %s); running in full", node, type(e).__name__, e)
+    if value is None:
+        value = await afn()
+    if is_cacheable(value):
+        get_cache().put(key, value, node=node)
+    return value
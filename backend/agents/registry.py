@@ -0,0 +1,59 @@
+# agents/registry.py
+"""Registry các deep agent, dựng lười (lazy) ở lần dùng đầu rồi cache cho cả process.
+
+Import `main` không còn kéo theo deepagents (+ langchain_anthropic, ...) hay dựng 2 graph
+`create_deep_agent`; thiếu OPENAI_API_KEY / TAVILY_API_KEY cũng không chặn server khởi động,
+lỗi chỉ xuất hiện ở node dùng tới agent đó (và được ghi thành [tool_error]).
+
+    get_agent("company")      # agents.company_agent.build_agent(), dựng 1 lần
+    register("x", factory)    # thêm / thay agent (vd. trong benchmark, test)
+"""
+import importlib
+import threading
+from typing import Any, Callable, Dict, Union
+
+# name -> "module:function" (import khi cần) hoặc callable
+_FACTORIES: Dict[str, Union[str, Callable[[], Any]]] = {
+    "company": "agents.company_agent:build_agent",
+    "industry": "agents.industry_agent:build_agent",
+}
+
+_agents: Dict[str, Any] = {}
+_locks: Dict[str, threading.Lock] = {}
+_lock = threading.Lock()
+
+
+def register(name: str, factory: Union[str, Callable[[], Any]]) -> None:
+    with _lock:
+        _FACTORIES[name] = factory
+        _agents.pop(name, None)
+
+
+def _resolve(factory: Union[str, Callable[[], Any]]) -> Callable[[], Any]:
+    if callable(factory):
+        return factory
+    module, _, attr = factory.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def get_agent(name: str) -> Any:
+    """Agent `name`, built on first use; concurrent first callers wait for a single build."""
+    agent = _agents.get(name)
+    if agent is not None:
+        return agent
+    with _lock:
+        if name not in _FACTORIES:
+            raise KeyError(f"unknown agent {name!r}")
+        lock = _locks.setdefault(name, threading.Lock())
+    with lock:
+        agent = _agents.get(name)
+        if agent is None:
+            agent = _resolve(_FACTORIES[name])()
+            _agents[name] = agent
+    return agent
+
+
+def reset() -> None:
+    """Bỏ các agent đã dựng (vd. sau khi đổi env/model)."""
+    with _lock:
+        _agents.clear()
@@ -0,0 +1,163 @@
+# agents/routing.py
+"""Model routing theo node / micro-agent, kèm fallback tự động khi vi phạm SLO.
+
+Mỗi route (vd. "buyers.strategy_fit", "buyers.aggregate", "company") có model, max_tokens và
+SLO (p95 latency của 1 LLM call, tỉ lệ lỗi). Cấu hình = `_ROUTES` bên dưới, ghi đè theo từng
+route bằng file JSON ở MODEL_ROUTES_PATH (không cần sửa code):
+
+    {"buyers.strategy_fit": {"model": "gpt-4.1-nano"},
+     "buyers.aggregate":    {"model": "gpt-4.1", "max_tokens": 1500, "slo_p95_ms": 40000},
+     "default":             {"fallback": "gpt-4o-mini"}}
+
+Route thiếu field nào lấy từ "default"; model mặc định = OPENAI_MODEL.
+
+`agents.llm.routed_model(route, ...)` dựng chat model cho route. Mỗi LLM call (agents/llm.py) báo latency /
+lỗi về `observe`; khi model chính của route có đủ ROUTE_MIN_SAMPLES mẫu và p95 > slo_p95_ms
+hoặc tỉ lệ lỗi > slo_error_rate, route chuyển sang `fallback` trong ROUTE_COOLDOWN_S rồi thử
+lại model chính (circuit breaker). Chuyển model diễn ra ở từng call, không cần dựng lại agent.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Deque, Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+_WINDOW = int(os.getenv("ROUTE_WINDOW", "50"))
+_MIN_SAMPLES = int(os.getenv("ROUTE_MIN_SAMPLES", "10"))
+_COOLDOWN_S = float(os.getenv("ROUTE_COOLDOWN_S", "300"))
+
+# model = None -> OPENAI_MODEL; max_tokens giữ như trước khi có routing
+_ROUTES: Dict[str, Dict[str, Any]] = {
+    "default": {"fallback": os.getenv("ROUTE_FALLBACK_MODEL", "gpt-4.1-nano"),
+                "slo_p95_ms": 60_000, "slo_error_rate": 0.25},
+    # deep agents: SLO tính theo từng LLM call bên trong agent
+    "company": {"model": "gpt-4o-mini", "max_tokens": 1200, "slo_p95_ms": 30_000},
+    "industry": {"model": "gpt-4o-mini", "max_tokens": 1200, "slo_p95_ms": 30_000},
+    "entity": {"max_tokens": 300, "slo_p95_ms": 10_000},
+    "refresh": {"max_tokens": 1500},
+    "financial.assumptions": {},
+    "financial.narrative": {},
+    "financial.fallback_modeler": {},
+    "buyers.strategy_fit": {},
+    "buyers.capability_match": {},
+    "buyers.deal_precedent": {},
+    "buyers.aggregate": {},
+    "buyerlist": {},
+    "supervisor.combine": {"model": "gpt-4o-mini"},
+}
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str
+    model: str
+    max_tokens: Optional[int] = None
+    fallback: Optional[str] = None
+    slo_p95_ms: Optional[float] = None
+    slo_error_rate: Optional[float] = None
+
+
+_lock = threading.Lock()
+_overrides: Optional[Dict[str, Dict[str, Any]]] = None
+_samples: Dict[str, Deque[Tuple[float, bool]]] = {}
+_fallback_until: Dict[str, float] = {}
+
+
+def _load_overrides() -> Dict[str, Dict[str, Any]]:
+    global _overrides
+    with _lock:
+        if _overrides is None:
+            path = os.getenv("MODEL_ROUTES_PATH")
+            data: Dict[str, Dict[str, Any]] = {}
+            if path:
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        data = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    log.warning("cannot read MODEL_ROUTES_PATH=%s (%s); using built-in routes", path, e)
+            _overrides = data
+        return _overrides
+
+
+def route(name: str) -> Route:
+    """Cấu hình (tĩnh) của route: built-in < "default" trong file < route trong file."""
+    over = _load_overrides()
+    cfg: Dict[str, Any] = {"model": None}
+    for layer in (_ROUTES["default"], over.get("default", {}), _ROUTES.get(name, {}), over.get(name, {})):
+        cfg.update({k: v for k, v in layer.items() if k in Route.__dataclass_fields__ and k != "name"})
+    model = (cfg.pop("model") or os.getenv("OPENAI_MODEL", "gpt-4o-mini")).split(":", 1)[-1]
+    r = Route(name=name, model=model, **cfg)
+    return r if r.fallback != r.model else replace(r, fallback=None)
+
+
+def active_model(name: Optional[str], default: str = "") -> str:
+    """Model cho call kế tiếp của route: model chính, hoặc fallback khi đang vi phạm SLO."""
+    if not name:
+        return default
+    r = route(name)
+    with _lock:
+        until = _fallback_until.get(name, 0.0)
+    if r.fallback and time.monotonic() < until:
+        return r.fallback
+    return r.model
+
+
+def _p95(values: list) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+
+def observe(name: Optional[str], model: str, ms: float, ok: bool) -> None:
+    """Ghi 1 LLM call của route; chỉ model chính được chấm SLO."""
+    if not name:
+        return
+    r = route(name)
+    if not r.fallback or model != r.model:
+        return
+    with _lock:
+        window = _samples.setdefault(name, deque(maxlen=_WINDOW))
+        window.append((ms, ok))
+        if len(window) < _MIN_SAMPLES:
+            return
+        p95 = _p95([m for m, _ in window])
+        err = sum(1 for _, good in window if not good) / len(window)
+        breached = (r.slo_p95_ms is not None and p95 > r.slo_p95_ms) or \
+                   (r.slo_error_rate is not None and err > r.slo_error_rate)
+        if not breached:
+            return
+        _fallback_until[name] = time.monotonic() + _COOLDOWN_S
+        window.clear()
+    log.warning("route %s: %s breached SLO (p95 %.0f ms, errors %.0f%%); falling back to %s for %.0fs",
+                name, r.model, p95, err * 100, r.fallback, _COOLDOWN_S)
+
+
+def key_for(*names: str) -> str:
+    """Model đang dùng của các route (cho key result cache của node gồm nhiều micro-agent)."""
+    models = list(dict.fromkeys(active_model(n) for n in names))
+    return models[0] if len(models) == 1 else "|".join(models)
+
+
+def status() -> Dict[str, Dict[str, Any]]:
+    """Cấu hình + trạng thái hiện tại của mọi route (debug / metrics)."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for name in sorted(set(_ROUTES) | set(_load_overrides())):
+        if name == "default":
+            continue
+        with _lock:
+            samples = list(_samples.get(name, ()))
+        out[name] = {**asdict(route(name)), "active": active_model(name), "samples": len(samples)}
+    return out
+
+
+def reset() -> None:
+    """Xoá số đo / trạng thái fallback và đọc lại MODEL_ROUTES_PATH."""
+    global _overrides
+    with _lock:
+        _overrides = None
+        _samples.clear()
+        _fallback_until.clear()
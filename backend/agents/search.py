@@ -0,0 +1,395 @@
+# agents/search.py
+"""Shared `internet_search` service cho mọi agent.
+
+- Một HTTP session dùng chung (keep-alive, connection pool) tới Tavily.
+- Memo 2 tầng cho các call giống hệt nhau (query, topic, max_results, include_raw_content):
+  in-memory (trong process: lặp lại trong 1 run, giữa các nhánh song song) và SQLite (giữa các run).
+- Single-flight: các call trùng nhau chạy đồng thời chỉ gửi 1 request.
+- `ainternet_search`: bản async (httpx.AsyncClient dùng chung theo event loop).
+- Mỗi call ghi 1 span "search" (query, latency, số kết quả, tier phục vụ).
+- Request thật đi qua rate limiter "tavily" dùng chung (agents/ratelimit.py); 429 tôn trọng `Retry-After`.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Dict, Literal, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from agents import deadline
+from agents.cache import ResultCache, env_flag
+from agents.ratelimit import is_retryable, limiter_for, on_retryable_error, retry_after_from_headers
+from agents.tracing import span
+
+_POOL_SIZE = int(os.getenv("SEARCH_POOL_SIZE", "16"))
+_MEMO_TTL_S = float(os.getenv("SEARCH_MEMO_TTL_S", "3600"))
+_MEMO_MAX = int(os.getenv("SEARCH_MEMO_MAX", "512"))
+_DISK_TTL_S = float(os.getenv("SEARCH_CACHE_TTL_S", str(24 * 3600)))
+_ATTEMPTS = int(os.getenv("SEARCH_MAX_ATTEMPTS", "3"))
+_DISK_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "search.sqlite")
+
+_lock = threading.Lock()
+_session = None
+_headers: Optional[Dict[str, str]] = None
+_base_url = "https://api.tavily.com"
+_proxies = None
+
+_memo: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_inflight: Dict[str, Future] = {}
+# leader bị hủy / hết deadline của chính nó: follower không nhận kết quả này mà tự gọi lại
+_ABORTED: Dict[str, Any] = {"results": [], "error": "search aborted"}
+_disk: Optional[ResultCache] = None
+
+# async: client + single-flight theo từng event loop
+_aclients: "WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = WeakKeyDictionary()
+_ainflight: "WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]" = WeakKeyDictionary()
+
+
+def _search_enabled() -> bool:
+    return bool(os.getenv("TAVILY_API_KEY"))
+
+
+def _http():
+    """Lazily build the pooled session; headers/base_url come from TavilyClient."""
+    global _session, _headers, _base_url, _proxies
+    with _lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from tavily import TavilyClient
+
+            client = TavilyClient()
+            _headers, _base_url, _proxies = client.headers, client.base_url, client.proxies
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_POOL_SIZE)
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            _session = sess
+        return _session
+
+
+def _ahttp():
+    """Shared httpx.AsyncClient for the running loop (an AsyncClient can't hop loops)."""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _aclients.get(loop)
+    if client is None:
+        _http()  # resolve key/headers/proxies once
+        proxy = (_proxies or {}).get("https")
+        client = httpx.AsyncClient(
+            headers=_headers,
+            limits=httpx.Limits(max_connections=_POOL_SIZE, max_keepalive_connections=_POOL_SIZE),
+            proxy=proxy,
+        )
+        _aclients[loop] = client
+    return client
+
+
+def _raise_for_status(status_code: int, body: Any, headers: Any = None) -> None:
+    """Error mapping of TavilyClient._search."""
+    from tavily.errors import BadRequestError, ForbiddenError, InvalidAPIKeyError, UsageLimitExceededError
+
+    detail = ""
+    try:
+        detail = body.get("detail", {}).get("error", None)
+    except Exception:
+        pass
+    if status_code == 429:
+        err = UsageLimitExceededError(detail)
+        err.retry_after = retry_after_from_headers(headers or {})
+        raise err
+    if status_code in (403, 432, 433):
+        raise ForbiddenError(detail)
+    if status_code == 401:
+        raise InvalidAPIKeyError(detail)
+    if status_code == 400:
+        raise BadRequestError(detail)
+    raise RuntimeError(f"Tavily search failed with HTTP {status_code}")
+
+
+def _json_or_none(resp) -> Any:
+    try:
+        return resp.json()
+    except Exception:
+        return None
+
+
+def _post_search_once(payload: Dict[str, Any], timeout: float = 60) -> Dict[str, Any]:
+    """Same request/error mapping as TavilyClient._search, over the shared session."""
+    import requests
+    from tavily.errors import TimeoutError as TavilyTimeout
+
+    sess = _http()
+    timeout = min(timeout, 120)
+    try:
+        resp = sess.post(_base_url + "/search", data=json.dumps(payload), headers=_headers,
+                         timeout=timeout, proxies=_proxies)
+    except requests.exceptions.Timeout:
+        raise TavilyTimeout(timeout)
+
+    if resp.status_code == 200:
+        return resp.json()
+    _raise_for_status(resp.status_code, _json_or_none(resp), resp.headers)
+    return {}
+
+
+async def _apost_search_once(payload: Dict[str, Any], timeout: float = 60) -> Dict[str, Any]:
+    import httpx
+    from tavily.errors import TimeoutError as TavilyTimeout
+
+    client = _ahttp()
+    timeout = min(timeout, 120)
+    try:
+        resp = await client.post(_base_url + "/search", content=json.dumps(payload), timeout=timeout)
+    except httpx.TimeoutException:
+        raise TavilyTimeout(timeout)
+
+    if resp.status_code == 200:
+        return resp.json()
+    _raise_for_status(resp.status_code, _json_or_none(resp), resp.headers)
+    return {}
+
+
+def _post_search(payload: Dict[str, Any], timeout: float = 60) -> Dict[str, Any]:
+    """`_post_search_once` behind the shared Tavily limiter, retrying transient errors."""
+    lim = limiter_for("tavily", "search")
+    for attempt in range(_ATTEMPTS):
+        if lim:
+            lim.wait()
+        try:
+            return _post_search_once(payload, deadline.clamp(timeout))
+        except Exception as e:
+            if attempt >= _ATTEMPTS - 1 or not is_retryable(e):
+                raise
+            delay = on_retryable_error(lim, attempt, e)
+            if delay:
+                deadline.sleep(delay)
+    raise RuntimeError("unreachable")
+
+
+async def _apost_search(payload: Dict[str, Any], timeout: float = 60) -> Dict[str, Any]:
+    lim = limiter_for("tavily", "search")
+    for attempt in range(_ATTEMPTS):
+        if lim:
+            await lim.await_()
+        try:
+            return await _apost_search_once(payload, deadline.clamp(timeout))
+        except Exception as e:
+            if attempt >= _ATTEMPTS - 1 or not is_retryable(e):
+                raise
+            delay = on_retryable_error(lim, attempt, e)
+            if delay:
+                await deadline.asleep(delay)
+    raise RuntimeError("unreachable")
+
+
+def _memo_key(query: str, topic: str, max_results: int, include_raw_content: bool,
+              days: Optional[int] = None) -> str:
+    parts = [" ".join((query or "").split()), topic, int(max_results), bool(include_raw_content)]
+    if days is not None:
+        parts.append(int(days))
+    return json.dumps(parts, ensure_ascii=False)
+
+
+def _payload(query: str, max_results: int, topic: str, include_raw_content: bool,
+             days: Optional[int]) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
+        "query": query,
+        "topic": topic,
+        "max_results": max_results,
+        "include_raw_content": include_raw_content,
+    }
+    if days is not None:
+        payload["days"] = int(days)
+    return payload
+
+
+def _disk_cache() -> Optional[ResultCache]:
+    global _disk
+    if env_flag("SEARCH_CACHE_DISABLED"):
+        return None
+    with _lock:
+        if _disk is None:
+            _disk = ResultCache(os.getenv("SEARCH_CACHE_PATH", _DISK_PATH), ttl_s=_DISK_TTL_S,
+                                max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000")))
+        return _disk
+
+
+def _memo_get(key: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        hit = _memo.get(key)
+        if hit is None:
+            return None
+        ts, value = hit
+        if time.time() - ts > _MEMO_TTL_S:
+            _memo.pop(key, None)
+            return None
+        _memo.move_to_end(key)
+        return value
+
+
+def _memo_put(key: str, value: Dict[str, Any]) -> None:
+    with _lock:
+        _memo[key] = (time.time(), value)
+        _memo.move_to_end(key)
+        while len(_memo) > _MEMO_MAX:
+            _memo.popitem(last=False)
+
+
+def _lookup(key: str) -> Optional[Dict[str, Any]]:
+    hit = _memo_get(key)
+    if hit is not None:
+        return hit
+    disk = _disk_cache()
+    if disk is not None:
+        hit = disk.get(key)
+        if hit is not None:
+            _memo_put(key, hit)
+            return hit
+    return None
+
+
+def _store(key: str, value: Dict[str, Any]) -> None:
+    _memo_put(key, value)
+    disk = _disk_cache()
+    if disk is not None:
+        disk.put(key, value, node="internet_search")
+
+
+def clear_memo() -> None:
+    """Drop the in-memory tier (the SQLite tier is left alone)."""
+    with _lock:
+        _memo.clear()
+
+
+def internet_search(
+    query: str,
+    max_results: int = 3,
+    topic: Literal["general", "news", "finance"] = "general",
+    include_raw_content: bool = False,
+    days: Optional[int] = None,
+):
+    """Run a web search via Tavily.
+
+    Args:
+        query: search query string.
+        max_results: number of results to return.
+        topic: 'general' | 'news' | 'finance'.
+        include_raw_content: whether to include raw page content.
+        days: with topic='news', only results published in the last N days.
+
+    Returns:
+        Tavily response (dict/list) with search results.
+    """
+    with span("search", "tavily", query=query, topic=topic) as sp:
+        result, sp.attrs["source"] = _search(query, max_results, topic, include_raw_content, days)
+        _annotate(sp, result)
+        return result
+
+
+def _search(query: str, max_results: int, topic: str, include_raw_content: bool,
+            days: Optional[int] = None) -> Tuple[Dict[str, Any], str]:
+    """(result, tier đã phục vụ: disabled | cache | inflight | http)."""
+    if not _search_enabled():
+        return {"results": [], "note": "tavily_disabled"}, "disabled"
+
+    key = _memo_key(query, topic, max_results, include_raw_content, days)
+    hit = _lookup(key)
+    if hit is not None:
+        return hit, "cache"
+
+    # single-flight: call trùng đang chạy thì chờ kết quả của nó
+    with _lock:
+        fut = _inflight.get(key)
+        leader = fut is None
+        if leader:
+            fut = Future()
+            _inflight[key] = fut
+    if not leader:
+        try:
+            result = fut.result(timeout=deadline.clamp(None))
+        except FutureTimeout:
+            raise deadline.DeadlineExceeded("run deadline exceeded waiting for in-flight search") from None
+        if result is _ABORTED:
+            return _search(query, max_results, topic, include_raw_content, days)
+        return result, "inflight"
+
+    result = _ABORTED
+    try:
+        result = _post_search(_payload(query, max_results, topic, include_raw_content, days))
+        _store(key, result)
+    except Exception as e:
+        # degrade gracefully, không memo lỗi
+        result = {"results": [], "error": f"{type(e).__name__}: {e}"}
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        fut.set_result(result)
+    return result, "http"
+
+
+def _annotate(sp, result: Any) -> None:
+    results = result.get("results") if isinstance(result, dict) else None
+    sp.attrs["results"] = len(results) if isinstance(results, list) else 0
+    if isinstance(result, dict) and result.get("error"):
+        sp.error = result["error"]
+
+
+async def ainternet_search(
+    query: str,
+    max_results: int = 3,
+    topic: Literal["general", "news", "finance"] = "general",
+    include_raw_content: bool = False,
+    days: Optional[int] = None,
+):
+    """Async `internet_search`: same memo tiers, single-flight per event loop."""
+    with span("search", "tavily", query=query, topic=topic) as sp:
+        result, sp.attrs["source"] = await _asearch(query, max_results, topic, include_raw_content, days)
+        _annotate(sp, result)
+        return result
+
+
+async def _asearch(query: str, max_results: int, topic: str, include_raw_content: bool,
+                   days: Optional[int] = None) -> Tuple[Dict[str, Any], str]:
+    if not _search_enabled():
+        return {"results": [], "note": "tavily_disabled"}, "disabled"
+
+    key = _memo_key(query, topic, max_results, include_raw_content, days)
+    hit = _lookup(key)
+    if hit is not None:
+        return hit, "cache"
+
+    loop = asyncio.get_running_loop()
+    inflight = _ainflight.setdefault(loop, {})
+    fut = inflight.get(key)
+    if fut is not None:
+        # shield: follower hết deadline chỉ hủy phần chờ của nó, không hủy request của leader
+        result = await deadline.wait_for(asyncio.shield(fut))
+        if result is _ABORTED:
+            return await _asearch(query, max_results, topic, include_raw_content, days)
+        return result, "inflight"
+    fut = loop.create_future()
+    inflight[key] = fut
+
+    result = _ABORTED
+    try:
+        result = await _apost_search(_payload(query, max_results, topic, include_raw_content, days))
+        _store(key, result)
+    except Exception as e:
+        result = {"results": [], "error": f"{type(e).__name__}: {e}"}
+    finally:
+        inflight.pop(key, None)
+        fut.set_result(result)
+    return result, "http"
+
+
+def search_tool():
+    """`internet_search` as a LangChain tool with both sync and async implementations (for deep agents)."""
+    from langchain_core.tools import StructuredTool
+
+    return StructuredTool.from_function(func=internet_search, coroutine=ainternet_search)
@@ -0,0 +1,248 @@
+# agents/sources.py
+"""Source registry theo run: chuẩn hoá kết quả Tavily, dedup theo URL, đánh số trích dẫn ổn định.
+
+Thay cho `str(sources)[:N]` trong prompt: `pack(...)` render các nguồn thành khối gọn
+`[n] Title (domain, date)` + snippet cắt theo câu, vừa ngân sách token. Mọi agent trong
+cùng run dùng chung 1 registry (main._node đặt qua `use_registry`), nên [n] giống nhau
+giữa các section; registry được lưu vào state["sources"] để dựng lại khi resume.
+
+Section lấy từ result cache mang theo danh sách nguồn nó trích (`with_citations`), khi
+dùng lại thì đăng ký vào registry hiện tại và đánh số lại marker (`unwrap_citations`).
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from agents.budget import count_tokens
+
+# snippet tối đa / nguồn trong pack, và ngân sách token mặc định (đếm bằng agents.budget)
+SNIPPET_CHARS = 400
+PACK_TOKENS = int(os.getenv("SOURCE_PACK_TOKENS", "1000"))
+
+_TRACKING = re.compile(r"^(utm_|fbclid$|gclid$|mc_|ref$|ref_src$)")
+_CITE = re.compile(r"\[(\d+(?:\s*,\s*\d+)*)\]")
+_ENVELOPE = "__cited_sources__"
+
+
+def normalize_url(url: str) -> str:
+    """Khoá dedup: bỏ fragment, tham số tracking, 'www.', '/' cuối; host viết thường."""
+    parts = urlsplit((url or "").strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not _TRACKING.match(k)])
+    path = parts.path.rstrip("/") or ""
+    return urlunsplit((parts.scheme.lower() or "https", host, path, query, ""))
+
+
+def _domain(url: str) -> str:
+    host = urlsplit(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _clip(text: str, limit: int) -> str:
+    """Cắt ở ranh giới câu (hoặc từ) gần nhất trước `limit`."""
+    text = " ".join((text or "").split())
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    if end >= limit // 2:
+        return cut[:end + 1]
+    return cut.rsplit(" ", 1)[0] + "…"
+
+
+@dataclass
+class Source:
+    n: int
+    url: str
+    title: str = ""
+    snippet: str = ""
+    published_date: Optional[str] = None
+    score: float = 0.0
+    queries: List[str] = field(default_factory=list)
+
+
+class SourceRegistry:
+    """Thread-safe; số [n] cấp theo thứ tự URL xuất hiện lần đầu trong run."""
+
+    def __init__(self, seed: Optional[Dict[str, Dict[str, Any]]] = None):
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, Source] = {}
+        self._by_n: Dict[int, Source] = {}
+        for item in sorted((seed or {}).values(), key=lambda d: int(d["n"])):
+            s = Source(**{k: v for k, v in item.items() if k in Source.__dataclass_fields__})
+            self._by_key[normalize_url(s.url)] = s
+            self._by_n[s.n] = s
+
+    def __len__(self) -> int:
+        return len(self._by_n)
+
+    def register(self, url: str, title: str = "", snippet: str = "", published_date: Optional[str] = None,
+                 score: float = 0.0, query: Optional[str] = None) -> Source:
+        key = normalize_url(url)
+        with self._lock:
+            s = self._by_key.get(key)
+            if s is None:
+                s = Source(n=len(self._by_n) + 1, url=url.strip())
+                self._by_key[key] = s
+                self._by_n[s.n] = s
+            # gộp: giữ title/snippet đầy đủ nhất, score cao nhất
+            if len(title or "") > len(s.title):
+                s.title = " ".join(title.split())
+            if len(snippet or "") > len(s.snippet):
+                s.snippet = snippet
+            s.published_date = s.published_date or published_date
+            s.score = max(s.score, float(score or 0.0))
+            if query and query not in s.queries:
+                s.queries.append(query)
+            return s
+
+    def add(self, response: Any, query: Optional[str] = None) -> List[Source]:
+        """Register a Tavily response; returns its sources (deduped, in result order)."""
+        results = response.get("results") if isinstance(response, dict) else response
+        query = query or (response.get("query") if isinstance(response, dict) else None)
+        out: List[Source] = []
+        for r in results or []:
+            if not isinstance(r, dict) or not r.get("url"):
+                continue
+            s = self.register(r["url"], r.get("title") or "", r.get("content") or "",
+                              r.get("published_date"), r.get("score") or 0.0, query)
+            if s not in out:
+                out.append(s)
+        return out
+
+    def get(self, n: int) -> Optional[Source]:
+        return self._by_n.get(n)
+
+    def all(self) -> List[Source]:
+        with self._lock:
+            return [self._by_n[n] for n in sorted(self._by_n)]
+
+    def to_state(self) -> Dict[str, Dict[str, Any]]:
+        return {str(s.n): asdict(s) for s in self.all()}
+
+    def cited(self, text: str) -> List[Source]:
+        nums = {int(x) for m in _CITE.finditer(text or "") for x in m.group(1).split(",")}
+        return [s for n in sorted(nums) if (s := self._by_n.get(n))]
+
+
+def pack(sources: Iterable[Source], budget_tokens: int = PACK_TOKENS, snippet_chars: int = SNIPPET_CHARS,
+         indent: str = "") -> str:
+    """Render sources as a compact, citation-numbered block that fits `budget_tokens`.
+
+    `indent` prefixes every line but the first (để chèn vào prompt template đã thụt lề).
+    """
+    lines: List[str] = []
+    used = 0
+    for s in sources:
+        meta = ", ".join(x for x in (_domain(s.url), (s.published_date or "")[:10]) if x)
+        head = f"[{s.n}] {_clip(s.title, 120) or _domain(s.url)} ({meta})"
+        cost = count_tokens(head)
+        if used + cost > budget_tokens:
+            break
+        room = min(snippet_chars, (budget_tokens - used - cost) * 4)
+        snippet = _clip(s.snippet, room) if room >= 80 else ""
+        block = head + (f"\n    {snippet}" if snippet else "")
+        lines.append(block)
+        used += count_tokens(block)
+    return ("\n" + indent).join("\n".join(lines).split("\n")) if lines else "(no sources)"
+
+
+def source_list_md(sources: Iterable[Source]) -> str:
+    return "\n".join(f"- [{s.n}] {s.title or _domain(s.url)} — {s.url}" for s in sources)
+
+
+# ========================= PER-RUN REGISTRY =========================
+_current: ContextVar[Optional[SourceRegistry]] = ContextVar("source_registry", default=None)
+_registries: "OrderedDict[str, SourceRegistry]" = OrderedDict()
+_registries_lock = threading.Lock()
+_MAX_RUNS = 128
+
+
+def registry_for(run_id: Optional[str], seed: Optional[Dict[str, Dict[str, Any]]] = None) -> SourceRegistry:
+    """Registry của run (giữ trong process, LRU); dựng lại từ `seed` (state["sources"]) nếu chưa có."""
+    if not run_id:
+        return SourceRegistry(seed)
+    with _registries_lock:
+        reg = _registries.get(run_id)
+        if reg is None or len(reg) < len(seed or {}):
+            reg = SourceRegistry(seed)
+            _registries[run_id] = reg
+        _registries.move_to_end(run_id)
+        while len(_registries) > _MAX_RUNS:
+            _registries.popitem(last=False)
+        return reg
+
+
+@contextmanager
+def use_registry(reg: SourceRegistry) -> Iterator[SourceRegistry]:
+    token = _current.set(reg)
+    try:
+        yield reg
+    finally:
+        _current.reset(token)
+
+
+def current_registry() -> SourceRegistry:
+    """Registry của run hiện tại; ngoài graph (gọi swarm trực tiếp) thì mỗi lần 1 registry mới."""
+    reg = _current.get()
+    if reg is None:
+        reg = SourceRegistry()
+        _current.set(reg)
+    return reg
+
+
+# ========================= CACHE ENVELOPE =========================
+def _texts(value: Any) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        return [v for v in value.values() if isinstance(v, str)]
+    return []
+
+
+def _map_texts(value: Any, fn) -> Any:
+    if isinstance(value, str):
+        return fn(value)
+    if isinstance(value, dict):
+        return {k: fn(v) if isinstance(v, str) else v for k, v in value.items()}
+    return value
+
+
+def with_citations(value: Any, reg: Optional[SourceRegistry] = None) -> Dict[str, Any]:
+    """Bọc kết quả section kèm các nguồn nó trích, để cache dùng lại ở run khác."""
+    reg = reg or current_registry()
+    cited: Dict[int, Source] = {}
+    for text in _texts(value):
+        for s in reg.cited(text):
+            cited[s.n] = s
+    return {"value": value, _ENVELOPE: [asdict(s) for s in cited.values()]}
+
+
+def unwrap_citations(payload: Any, reg: Optional[SourceRegistry] = None) -> Any:
+    """Inverse of `with_citations`: register cited sources here and renumber [n] markers."""
+    if not (isinstance(payload, dict) and _ENVELOPE in payload):
+        return payload
+    reg = reg or current_registry()
+    mapping: Dict[int, int] = {}
+    for item in payload[_ENVELOPE]:
+        s = reg.register(item["url"], item.get("title") or "", item.get("snippet") or "",
+                          item.get("published_date"), item.get("score") or 0.0)
+        mapping[int(item["n"])] = s.n
+    if all(k == v for k, v in mapping.items()):
+        return payload["value"]
+
+    def renumber(text: str) -> str:
+        def sub(m: "re.Match[str]") -> str:
+            nums = [int(x) for x in m.group(1).split(",")]
+            return "[" + ", ".join(str(mapping.get(n, n)) for n in nums) + "]"
+        return _CITE.sub(sub, text)
+
+    return _map_texts(payload["value"], renumber)
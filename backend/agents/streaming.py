@@ -0,0 +1,31 @@
+# agents/streaming.py
+"""Gắn tool id cho token LLM stream ra FE (LangGraph stream_mode="messages").
+
+Trong `tool_stream(...)`, mọi LLM call (deep agent, swarm, kể cả trong thread pool
+dùng copy_context) kế thừa metadata `ui_tool_call_id` / `ui_tool_name`, để
+`useStream` ở FE ghép token vào đúng ToolCallBox thay vì hiện thành bubble riêng.
+"""
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from langchain_core.runnables.config import merge_configs, var_child_runnable_config
+
+STREAM_TOOL_ID_KEY = "ui_tool_call_id"
+STREAM_TOOL_NAME_KEY = "ui_tool_name"
+
+
+@contextmanager
+def tool_stream(tool_name: Optional[str], tool_call_id: Optional[str]) -> Iterator[None]:
+    if not tool_name or not tool_call_id:
+        yield
+        return
+    parent = var_child_runnable_config.get() or {}
+    cfg = merge_configs(parent, {
+        "metadata": {STREAM_TOOL_ID_KEY: tool_call_id, STREAM_TOOL_NAME_KEY: tool_name},
+        "tags": [f"tool:{tool_name}"],
+    })
+    token = var_child_runnable_config.set(cfg)
+    try:
+        yield
+    finally:
+        var_child_runnable_config.reset(token)
@@ -1,15 +1,18 @@
 from typing import TypedDict, NotRequired, Annotated
 import operator
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import AnyMessage,  HumanMessage
 
 
-# import 2 deep agents có sẵn
-from agents.industry_agent import industry_research_agent
-from agents.company_agent import deep_research_agent  # đổi tên module/biến cho đúng repo của bạn
+# 2 deep agents dựng lười qua registry (agents/registry.py)
+from agents.registry import get_agent
+from agents.budget import trim_fields
+from agents.llm import routed_model
+from agents.memo import memoized
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
+
+def _llm():
+    return memoized(routed_model("supervisor.combine", temperature=0.2))
 
 # ... trong State, thêm trường messages:
 class State(TypedDict, total=False):
@@ -59,19 +62,16 @@ def supervisor(state: State):
 
 def industry_node(state: State):
     q = state["input"]
-    txt = _run_deep(industry_research_agent, q)
+    txt = _run_deep(get_agent("industry"), q)
     return {"industry_notes": [txt]}
 
 def company_node(state: State):
     q = state["input"]
-    txt = _run_deep(deep_research_agent, q)
+    txt = _run_deep(get_agent("company"), q)
     return {"company_notes": [txt]}
 
-def combine(state: State):
-    industry_txt = "\n".join(state.get("industry_notes", []))
-    company_txt = "\n".join(state.get("company_notes", []))
-
-    prompt = f"""Write a polished investor memo using BOTH blocks below.
+def _combine_prompt(industry_txt: str, company_txt: str) -> str:
+    return f"""Write a polished investor memo using BOTH blocks below.
 
 REQUIREMENTS (MUST HAVE):
 - Clear headings.
@@ -88,7 +88,17 @@ REQUIREMENTS (MUST HAVE):
 {company_txt}
 """
 
-    msg = llm.invoke(prompt)
+
+def combine(state: State):
+    industry_txt = "\n".join(state.get("industry_notes", []))
+    company_txt = "\n".join(state.get("company_notes", []))
+
+    # 2 report cùng mức ưu tiên -> cắt đều phần đuôi của report dài hơn
+    blocks = trim_fields("combine", {"industry": industry_txt, "company": company_txt},
+                         template=_combine_prompt("", ""))
+    prompt = _combine_prompt(blocks["industry"], blocks["company"])
+
+    msg = _llm().invoke(prompt)
     return {"report": msg.content, "messages": [msg]}
 
 
@@ -0,0 +1,236 @@
+# agents/tracing.py
+"""Span nhẹ cho graph node, LLM call và internet_search (không cần OTel).
+
+- `node_trace(node)` (main._node bọc mỗi node): mọi span phát ra bên trong node, kể cả trong
+  thread pool (copy_context) hay asyncio.gather, được gom vào 1 list rồi ghi vào state["spans"].
+- `span(kind, name, ...)`: LLM (agents/llm.py) và search (agents/search.py) tự gọi.
+- `traced_step("strategy_fit")`: gắn nhãn cho các call trong 1 micro-agent, để biết call nào
+  trong ~15 LLM call/run chiếm latency/chi phí.
+- Export: `prometheus_text()` (counter cộng dồn cả process, hoặc cho 1 list span) và `spans_json()`.
+
+TRACE_DISABLED=true tắt ghi span. Giá (USD / 1M token) đổi qua LLM_PRICE_<MODEL>="in,out".
+"""
+import asyncio
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from agents.cache import env_flag
+
+# USD / 1M tokens (input, output)
+_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+_spans_var: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("trace_spans", default=None)
+_node_var: ContextVar[Optional[str]] = ContextVar("trace_node", default=None)
+_step_var: ContextVar[Optional[str]] = ContextVar("trace_step", default=None)
+
+
+@dataclass
+class Span:
+    kind: str                      # node | llm | search
+    name: str                      # node name / model / "tavily"
+    node: Optional[str] = None
+    step: Optional[str] = None
+    start: float = 0.0             # epoch seconds
+    duration_ms: float = 0.0
+    error: Optional[str] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+def price_per_mtok(model: str) -> Optional[Tuple[float, float]]:
+    env = os.getenv("LLM_PRICE_" + re.sub(r"[^A-Z0-9]+", "_", model.upper()).strip("_"))
+    if env:
+        inp, out = (float(x) for x in env.split(","))
+        return inp, out
+    # "gpt-4o-mini-2024-07-18" -> "gpt-4o-mini"
+    for name in sorted(_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return _PRICES[name]
+    return None
+
+
+def llm_cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    price = price_per_mtok(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1e6
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs: Any) -> Iterator[Span]:
+    sp = Span(kind=kind, name=name, node=_node_var.get(), step=_step_var.get(), start=time.time(), attrs=attrs)
+    if env_flag("TRACE_DISABLED"):
+        yield sp
+        return
+    t0 = time.perf_counter()
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        sp.duration_ms = round((time.perf_counter() - t0) * 1000, 1)
+        record = asdict(sp)
+        buf = _spans_var.get()
+        if buf is not None:
+            buf.append(record)   # list.append: an toàn giữa các thread
+        METRICS.observe(record)
+
+
+@contextmanager
+def node_trace(node: str) -> Iterator[List[Dict[str, Any]]]:
+    """Collect every span emitted while the node runs; the node span itself is appended last."""
+    buf: List[Dict[str, Any]] = []
+    t_spans, t_node = _spans_var.set(buf), _node_var.set(node)
+    try:
+        with span("node", node):
+            yield buf
+    finally:
+        _node_var.reset(t_node)
+        _spans_var.reset(t_spans)
+
+
+def traced_step(step: str) -> Callable:
+    """Decorator: span LLM/search bên trong hàm mang nhãn `step` (sync hoặc async)."""
+    def deco(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                token = _step_var.set(step)
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    _step_var.reset(token)
+            return awrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _step_var.set(step)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _step_var.reset(token)
+        return wrapper
+    return deco
+
+
+# ========================= METRICS =========================
+def _labels(**kv: Any) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, "" if v is None else str(v)) for k, v in kv.items()))
+
+
+class Metrics:
+    """Counter cộng dồn theo label, render ra Prometheus text exposition format."""
+
+    _HELP = {
+        "research_span_duration_seconds": ("summary", "Wall time of graph nodes, LLM calls and searches."),
+        "research_span_errors_total": ("counter", "Spans that ended with an error."),
+        "research_llm_tokens_total": ("counter", "LLM tokens by type (prompt/completion)."),
+        "research_llm_cost_usd_total": ("counter", "Estimated LLM spend in USD."),
+        "research_llm_retries_total": ("counter", "LLM attempts beyond the first."),
+        "research_llm_memo_hits_total": ("counter", "LLM calls answered from the prompt memo (agents/memo.py)."),
+        "research_llm_fallback_calls_total": ("counter", "LLM calls routed to a fallback model after an SLO breach."),
+        "research_search_calls_total": ("counter", "internet_search calls by serving tier."),
+        "research_search_results_total": ("counter", "Results returned by internet_search."),
+    }
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+    def _add(self, metric: str, labels: Tuple[Tuple[str, str], ...], value: float) -> None:
+        self._values[(metric, labels)] = self._values.get((metric, labels), 0.0) + value
+
+    def observe(self, s: Dict[str, Any]) -> None:
+        kind, name, node, a = s["kind"], s["name"], s.get("node"), s.get("attrs") or {}
+        base = _labels(kind=kind, node=node, name=name, step=s.get("step"))
+        with self._lock:
+            self._add("research_span_duration_seconds_sum", base, s["duration_ms"] / 1000.0)
+            self._add("research_span_duration_seconds_count", base, 1)
+            if s.get("error"):
+                self._add("research_span_errors_total", base, 1)
+            if kind == "llm":
+                lb = dict(model=name, node=node, step=s.get("step"))
+                for typ in ("prompt", "completion"):
+                    if a.get(f"{typ}_tokens"):
+                        self._add("research_llm_tokens_total", _labels(type=typ, **lb), a[f"{typ}_tokens"])
+                if a.get("cost_usd"):
+                    self._add("research_llm_cost_usd_total", _labels(**lb), a["cost_usd"])
+                if a.get("retries"):
+                    self._add("research_llm_retries_total", _labels(**lb), a["retries"])
+                if a.get("memo"):
+                    self._add("research_llm_memo_hits_total", _labels(tier=a["memo"], **lb), 1)
+                if a.get("fallback"):
+                    self._add("research_llm_fallback_calls_total", _labels(route=a.get("route"), **lb), 1)
+            elif kind == "search":
+                self._add("research_search_calls_total", _labels(node=node, source=a.get("source")), 1)
+                self._add("research_search_results_total", _labels(node=node), a.get("results") or 0)
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines: List[str] = []
+        seen = set()
+        for (metric, labels), value in items:
+            family = re.sub(r"_(sum|count)$", "", metric) if metric.startswith("research_span_duration") else metric
+            if family not in seen:
+                seen.add(family)
+                typ, help_ = self._HELP.get(family, ("untyped", ""))
+                lines += [f"# HELP {family} {help_}", f"# TYPE {family} {typ}"]
+            lbl = ",".join(f'{k}="{_escape(v)}"' for k, v in labels if v != "")
+            lines.append(f"{metric}{{{lbl}}} {value:.6g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = Metrics()
+
+
+def prometheus_text(spans: Optional[Iterable[Dict[str, Any]]] = None) -> str:
+    """Prometheus text: process-wide counters, or only the given spans (e.g. one run)."""
+    if spans is None:
+        return METRICS.render()
+    m = Metrics()
+    for s in spans:
+        m.observe(s)
+    return m.render()
+
+
+def summarize(spans: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Gộp theo (kind, node, step, name), sắp theo tổng thời gian giảm dần."""
+    groups: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for s in spans:
+        key = (s["kind"], s.get("node"), s.get("step"), s["name"])
+        g = groups.setdefault(key, {"kind": key[0], "node": key[1], "step": key[2], "name": key[3],
+                                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0,
+                                    "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+        a = s.get("attrs") or {}
+        g["count"] += 1
+        g["total_ms"] += s["duration_ms"]
+        g["max_ms"] = max(g["max_ms"], s["duration_ms"])
+        g["errors"] += 1 if s.get("error") else 0
+        g["prompt_tokens"] += a.get("prompt_tokens") or 0
+        g["completion_tokens"] += a.get("completion_tokens") or 0
+        g["cost_usd"] += a.get("cost_usd") or 0.0
+    return sorted(groups.values(), key=lambda g: g["total_ms"], reverse=True)
+
+
+def spans_json(spans: Iterable[Dict[str, Any]], **kwargs: Any) -> str:
+    spans = list(spans)
+    return json.dumps({"spans": spans, "summary": summarize(spans)}, ensure_ascii=False, **kwargs)
@@ -0,0 +1,147 @@
+# agents/universe.py
+"""Acquirer universe cục bộ: dataset acquirer (strategic / PE) nạp thành mảng cột NumPy.
+
+Seed `agents/data/acquirers.csv` (số liệu XẤP XỈ, chỉ để xếp hạng; ACQUIRER_UNIVERSE_PATH để
+thay bằng dataset riêng, cùng cột):
+
+    name, type (strategic|financial), revenue_usd_b, revenue_growth, ebit_margin,
+    dry_powder_usd_b, sectors (phân cách ';'), geography
+
+Lọc / xếp hạng vectorized trên toàn bộ universe (không gọi LLM):
+- `eligible(...)`: strategic đủ doanh thu để hấp thụ target, PE đủ dry powder;
+- `sector_overlap(...)`: Jaccard giữa sector của target (nếu target có trong universe) và acquirer.
+Buyerlist dùng để dựng shortlist đã xếp hạng, LLM chỉ chấm Adjacency + viết rationale;
+potential_buyers dùng `peers` làm gợi ý cho StrategyFit. ACQUIRER_UNIVERSE_DISABLED=true -> universe rỗng.
+"""
+import csv
+import hashlib
+import io
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from agents.cache import env_flag
+from agents.entity import entity_id
+
+_PATH = os.path.join(os.path.dirname(__file__), "data", "acquirers.csv")
+
+
+def _floats(rows: List[Dict[str, str]], col: str, scale: float = 1.0) -> np.ndarray:
+    out = np.full(len(rows), np.nan)
+    for i, r in enumerate(rows):
+        try:
+            out[i] = float(r.get(col) or "nan") * scale
+        except ValueError:
+            pass
+    return out
+
+
+def _sectors(value: Optional[str]) -> List[str]:
+    return [s.strip().lower() for s in (value or "").split(";") if s.strip()]
+
+
+class AcquirerUniverse:
+    """Universe dạng cột: mỗi thuộc tính là 1 mảng dài N (NaN = chưa biết), sector = ma trận bool N × V."""
+
+    def __init__(self, rows: List[Dict[str, str]], version: str = ""):
+        self.version = version
+        self.names = [" ".join((r.get("name") or "").split()) for r in rows]
+        self.ids = [entity_id(n) for n in self.names]
+        self.kind = np.array(["financial" if (r.get("type") or "").strip().lower() == "financial" else "strategic"
+                              for r in rows])
+        self.revenue = _floats(rows, "revenue_usd_b", 1e9)
+        self.growth = _floats(rows, "revenue_growth")
+        self.margin = _floats(rows, "ebit_margin")
+        self.dry_powder = _floats(rows, "dry_powder_usd_b", 1e9)
+        self.geography = [(r.get("geography") or "").strip() for r in rows]
+        self.vocab = sorted({s for r in rows for s in _sectors(r.get("sectors"))})
+        col = {s: j for j, s in enumerate(self.vocab)}
+        self.sectors = np.zeros((len(rows), len(self.vocab)), dtype=bool)
+        for i, r in enumerate(rows):
+            self.sectors[i, [col[s] for s in _sectors(r.get("sectors"))]] = True
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "AcquirerUniverse":
+        path = path or os.getenv("ACQUIRER_UNIVERSE_PATH", _PATH)
+        with open(path, encoding="utf-8") as f:
+            raw = f.read()
+        # dòng bắt đầu bằng '#' là ghi chú (vd. nguồn / độ chính xác của số liệu)
+        body = "".join(line for line in io.StringIO(raw) if not line.lstrip().startswith("#"))
+        rows = [r for r in csv.DictReader(io.StringIO(body)) if (r.get("name") or "").strip()]
+        return cls(rows, version=hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def find(self, company: str) -> Optional[int]:
+        """Index của target trong universe ('NVIDIA Corporation (NASDAQ: NVDA; ...)' -> row NVIDIA)."""
+        key = entity_id((company or "").split(" (")[0])
+        return self.ids.index(key) if key in self.ids else None
+
+    def sector_overlap(self, target: Optional[np.ndarray]) -> np.ndarray:
+        """Jaccard(sector target, sector acquirer) cho mọi acquirer; NaN nếu không biết sector target."""
+        if target is None or not target.any():
+            return np.full(len(self), np.nan)
+        inter = (self.sectors & target).sum(axis=1)
+        union = (self.sectors | target).sum(axis=1)
+        return inter / np.maximum(union, 1)
+
+    def eligible(self, *, min_revenue: Optional[float] = None, min_dry_powder: Optional[float] = None,
+                 exclude: Iterable[int] = (), regions: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Mask bool: strategic có doanh thu >= min_revenue, PE có dry powder >= min_dry_powder.
+
+        Số liệu thiếu (NaN) không bị loại: không đủ thông tin để loại.
+        """
+        strategic = self.kind == "strategic"
+        ok_rev = np.ones(len(self), dtype=bool) if min_revenue is None else \
+            np.isnan(self.revenue) | (self.revenue >= min_revenue)
+        ok_dp = np.ones(len(self), dtype=bool) if min_dry_powder is None else \
+            np.isnan(self.dry_powder) | (self.dry_powder >= min_dry_powder)
+        mask = np.where(strategic, ok_rev, ok_dp)
+        if regions is not None:
+            wanted = {g.upper() for g in regions}
+            mask &= np.array([g.upper() in wanted for g in self.geography], dtype=bool)
+        for i in exclude:
+            mask[i] = False
+        return mask
+
+    def peers(self, company: str, k: int = 8) -> List[int]:
+        """Strategic acquirer cùng sector với target (lớn hơn target), xếp theo overlap rồi doanh thu."""
+        t = self.find(company)
+        if t is None:
+            return []
+        overlap = self.sector_overlap(self.sectors[t])
+        mask = self.eligible(min_revenue=None if np.isnan(self.revenue[t]) else self.revenue[t], exclude=[t])
+        idx = np.flatnonzero(mask & (self.kind == "strategic") & (overlap > 0))
+        order = np.lexsort((-np.nan_to_num(self.revenue[idx]), -overlap[idx]))
+        return [int(i) for i in idx[order][:k]]
+
+    def row(self, i: int) -> Dict[str, Any]:
+        def opt(x: float) -> Optional[float]:
+            return None if np.isnan(x) else float(x)
+        return {
+            "name": self.names[i], "type": str(self.kind[i]), "revenue": opt(self.revenue[i]),
+            "growth": opt(self.growth[i]), "margin": opt(self.margin[i]), "dry_powder": opt(self.dry_powder[i]),
+            "sectors": [s for s, on in zip(self.vocab, self.sectors[i]) if on], "geography": self.geography[i],
+        }
+
+
+_universe: Optional[AcquirerUniverse] = None
+_lock = threading.Lock()
+
+
+def get_universe() -> AcquirerUniverse:
+    """Universe của process (nạp 1 lần); rỗng nếu tắt hoặc không đọc được file."""
+    global _universe
+    with _lock:
+        if _universe is None:
+            if env_flag("ACQUIRER_UNIVERSE_DISABLED"):
+                _universe = AcquirerUniverse([])
+            else:
+                try:
+                    _universe = AcquirerUniverse.load()
+                except (OSError, csv.Error):
+                    _universe = AcquirerUniverse([])
+        return _universe
@@ -0,0 +1,244 @@
+# batch.py
+"""Batch research: chạy supervisor graph cho danh sách công ty với số run đồng thời giới hạn.
+
+    python batch.py targets.csv -o reports.jsonl --concurrency 8
+    python batch.py targets.jsonl -o reports/ --format md
+
+Input: CSV (cột `company`, hoặc cột đầu tiên), JSONL (`{"company": ...}`) hoặc TXT (mỗi dòng 1 tên).
+Kết quả ghi dần từng công ty (JSONL append / 1 file Markdown mỗi công ty), chạy lại
+cùng output thì bỏ qua công ty đã xong (resume sau crash). Mọi run dùng chung process
+nên dùng chung search memo + result cache.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+# ========================= INPUT =========================
+def read_companies(path: str) -> List[str]:
+    """CSV / JSONL / TXT -> danh sách tên (giữ thứ tự, bỏ trùng)."""
+    names: List[str] = []
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if ext == ".csv":
+            rows = list(csv.reader(f))
+            if rows:
+                header = [h.strip().lower() for h in rows[0]]
+                col = header.index("company") if "company" in header else 0
+                body = rows[1:] if "company" in header else rows
+                names = [r[col] for r in body if len(r) > col]
+        elif ext in (".jsonl", ".ndjson"):
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                obj = json.loads(line)
+                names.append(obj if isinstance(obj, str) else obj.get("company") or obj.get("input") or "")
+        else:
+            names = list(f)
+    seen, out = set(), []
+    for n in (s.strip() for s in names):
+        if n and n.casefold() not in seen:
+            seen.add(n.casefold())
+            out.append(n)
+    return out
+
+
+# ========================= OUTPUT =========================
+def _slug(name: str) -> str:
+    return re.sub(r"[^\w-]+", "_", name.strip()).strip("_")[:80] or "company"
+
+
+class _Sink:
+    """Ghi kết quả ngay khi mỗi run xong; biết công ty nào đã xong để resume."""
+
+    def __init__(self, out: str, fmt: str):
+        self.out, self.fmt = out, fmt
+        if fmt == "md":
+            os.makedirs(out, exist_ok=True)
+        elif os.path.dirname(os.path.abspath(out)):
+            os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+
+    def done(self) -> set:
+        if self.fmt == "md":
+            return {f[:-3] for f in os.listdir(self.out) if f.endswith(".md")}
+        ok = set()
+        if os.path.exists(self.out):
+            with open(self.out, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # dòng ghi dở khi crash
+                    if rec.get("status") == "ok":
+                        ok.add(_slug(rec.get("company", "")))
+        return ok
+
+    def write(self, rec: Dict[str, Any]) -> None:
+        if self.fmt == "md":
+            if rec["status"] != "ok":
+                return
+            path = os.path.join(self.out, _slug(rec["company"]) + ".md")
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(f"# {rec['company']}\n\n{rec['report_md']}\n")
+            os.replace(tmp, path)   # atomic: không để lại file .md dở
+            return
+        with open(self.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# ========================= STATS =========================
+@dataclass
+class BatchStats:
+    total: int = 0
+    skipped: int = 0
+    ok: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.time)
+    run_seconds: List[float] = field(default_factory=list)
+    node_ms: Dict[str, List[float]] = field(default_factory=dict)
+
+    @property
+    def finished(self) -> int:
+        return self.ok + self.failed
+
+    def throughput_per_min(self) -> float:
+        dt = time.time() - self.started_at
+        return self.finished / dt * 60 if dt > 0 else 0.0
+
+    def eta_s(self) -> Optional[float]:
+        rate = self.throughput_per_min() / 60
+        remaining = self.total - self.skipped - self.finished
+        return remaining / rate if rate > 0 else None
+
+    def summary(self) -> Dict[str, Any]:
+        def agg(xs: List[float]) -> Dict[str, float]:
+            return {"n": len(xs), "mean": statistics.fmean(xs), "p50": statistics.median(xs), "max": max(xs)}
+        return {
+            "total": self.total, "skipped": self.skipped, "ok": self.ok, "failed": self.failed,
+            "wall_s": round(time.time() - self.started_at, 1),
+            "throughput_per_min": round(self.throughput_per_min(), 2),
+            "run_s": agg(self.run_seconds) if self.run_seconds else {},
+            "node_ms": {n: agg(v) for n, v in sorted(self.node_ms.items()) if v},
+        }
+
+
+def _print_progress(stats: BatchStats, rec: Dict[str, Any]) -> None:
+    eta = stats.eta_s()
+    print(
+        f"[{stats.finished}/{stats.total - stats.skipped}] {rec['company']}: {rec['status']} "
+        f"in {rec['elapsed_s']:.1f}s | {stats.throughput_per_min():.2f} runs/min"
+        + (f" | eta {eta / 60:.1f} min" if eta is not None else ""),
+        file=sys.stderr, flush=True,
+    )
+
+
+# ========================= RUNNER =========================
+def _record(company: str, state: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+    from agents.tracing import summarize
+    from main import node_durations, render_report
+
+    return {
+        "company": company,
+        "status": "ok",
+        "elapsed_s": round(elapsed, 2),
+        "node_ms": node_durations(state),
+        "qc": state.get("qc_json") or {},
+        "trace": summarize(state.get("spans") or []),
+        "report_md": render_report(state),
+    }
+
+
+async def arun_batch(
+    companies: Iterable[str],
+    out: str,
+    *,
+    fmt: str = "jsonl",
+    concurrency: int = 4,
+    resume: bool = True,
+    force_refresh: bool = False,
+    refresh: bool = False,
+    on_progress: Optional[Callable[[BatchStats, Dict[str, Any]], None]] = _print_progress,
+) -> BatchStats:
+    """Run the supervisor graph for every company with at most `concurrency` runs in flight."""
+    from main import supervisor_graph
+
+    companies = list(companies)
+    sink = _Sink(out, fmt)
+    done = sink.done() if resume else set()
+    todo = [c for c in companies if _slug(c) not in done]
+    stats = BatchStats(total=len(companies), skipped=len(companies) - len(todo))
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(company: str) -> None:
+        async with sem:
+            t0 = time.time()
+            try:
+                state = await supervisor_graph.ainvoke(
+                    {"input": company, "force_refresh": force_refresh, "refresh": refresh},
+                    # thread riêng cho mỗi run (cần khi bật CHECKPOINT_DB)
+                    config={"recursion_limit": 100, "configurable": {"thread_id": uuid.uuid4().hex}},
+                )
+                rec = _record(company, state, time.time() - t0)
+                stats.ok += 1
+                stats.run_seconds.append(rec["elapsed_s"])
+                for node, ms in rec["node_ms"].items():
+                    stats.node_ms.setdefault(node, []).append(ms)
+            except Exception as e:
+                rec = {"company": company, "status": "error", "elapsed_s": round(time.time() - t0, 2),
+                       "error": f"{type(e).__name__}: {e}"}
+                stats.failed += 1
+            sink.write(rec)
+            if on_progress:
+                on_progress(stats, rec)
+
+    await asyncio.gather(*(one(c) for c in todo))
+    return stats
+
+
+def run_batch(companies: Iterable[str], out: str, **kwargs: Any) -> BatchStats:
+    """Sync wrapper of `arun_batch`."""
+    return asyncio.run(arun_batch(companies, out, **kwargs))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Batch company research over the supervisor graph.")
+    p.add_argument("input", help="CSV / JSONL / TXT list of company names")
+    p.add_argument("-o", "--out", required=True, help="output .jsonl file, or directory for --format md")
+    p.add_argument("--format", choices=("jsonl", "md"), default="jsonl")
+    p.add_argument("-c", "--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "4")))
+    p.add_argument("--no-resume", action="store_true", help="re-run companies already present in the output")
+    p.add_argument("--force-refresh", action="store_true", help="bypass the result cache")
+    p.add_argument("--refresh", action="store_true",
+                   help="update cached company/industry reports with news since they were generated")
+    p.add_argument("--metrics", help="write Prometheus text metrics for the whole batch to this file")
+    args = p.parse_args(argv)
+
+    stats = run_batch(
+        read_companies(args.input), args.out,
+        fmt=args.format, concurrency=args.concurrency,
+        resume=not args.no_resume, force_refresh=args.force_refresh, refresh=args.refresh,
+    )
+    print(json.dumps(stats.summary(), indent=2), file=sys.stderr)
+    if args.metrics:
+        from agents.tracing import prometheus_text
+
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(prometheus_text())
+    return 0 if stats.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
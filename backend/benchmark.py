@@ -0,0 +1,518 @@
+# benchmark.py
+"""Benchmark offline end-to-end cho supervisor graph (không tốn quota OpenAI/Tavily).
+
+ChatOpenAI (mọi model: chat_model / init_chat_model / deep agents) và HTTP call tới Tavily
+được thay bằng fake chạy local, latency lấy mẫu lognormal (median + sigma), kích thước
+response cấu hình được. Deep agent vẫn chạy vòng tool-call thật (fake LLM gọi
+`internet_search` `--agent-searches` lần rồi mới trả report).
+
+    python benchmark.py                                  # main graph, concurrency 1,4,16
+    python benchmark.py --graph all -c 1 8 32 --out bench.json
+    python benchmark.py --compare bench_baseline.json    # in chênh lệch so với lần trước
+    python benchmark.py --import-time 5                  # cold start: `import main` + dựng deep agent
+
+Mỗi (graph, concurrency) báo: wall time, throughput, latency/run (p50/p95), critical path
+(tính từ thời gian node đo được), overhead điều phối = latency - critical path, thời gian
+từng node, số LLM/search call và bộ nhớ (tracemalloc peak + max RSS).
+
+`--import-time N`: N lần `import main` trong subprocess mới, không có API key (server phải
+khởi động được), cộng thời gian dựng 2 deep agent ở lần dùng đầu và các package import chậm nhất.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+# ========================= FAKES =========================
+_ASSUMPTIONS = {
+    "base_year_revenue": "USD 60.9B",
+    "scenarios": {
+        "base": {"cagr": 0.18, "ebit_margin": 0.45},
+        "bull": {"cagr": 0.30, "ebit_margin": 0.52},
+        "bear": {"cagr": 0.05, "ebit_margin": 0.35},
+    },
+    "notes": ["synthetic benchmark assumptions"],
+}
+
+
+# ứng viên giả cho buyerlist (FitScore tính cục bộ, agents/buyerlist.py)
+_CANDIDATES = [
+    {"name": f"Synthetic Buyer {i}", "type": "financial" if i % 3 == 0 else "strategic", "revenue_usd": f"${10 * i}B",
+     "revenue_growth": 0.05 * i, "ebit_margin": 0.1 + 0.02 * i, "adjacency": 90 - 5 * i, "rationale": "synthetic"}
+    for i in range(1, 11)
+]
+
+# report giả đủ cấu trúc để qua QC cục bộ (agents/qc.py): benchmark đo 1 vòng, không rework
+_SYNTHETIC_REPORT = """# Section
+
+## Company Card
+{body}
+
+## Products/Services & Business Model
+## Financials / Funding
+## Technology & Capabilities
+## Market & Competition
+## Company & Industry Identification
+## Recent Trends
+## Industry M&A History
+| Date | Acquirer → Target | Value (USD) | Status | Rationale/notes | Source [#] |
+|------|-------------------|-------------|--------|------------------|------------|
+| 2024-01 | A → B | $1.0B | Closed | synthetic [1] | [1] |
+
+## Strategic buyers
+- Strategic Co — synthetic rationale [1]. Fit Score: 80
+## Financial (PE) buyers
+- PE Fund — synthetic rationale [1]. Fit Score: 70
+## Risks
+## Leadership & Governance
+## Notable Updates
+## Outlook
+## Conclusion
+## Assumptions & Caveats
+
+### Sources
+- [1] Synthetic source: https://example.com/source
+"""
+
+
+class Latency:
+    """Lognormal latency (ms) with a given median; `scale` compresses wall time for quick runs."""
+
+    def __init__(self, median_ms: float, sigma: float, scale: float, rng: random.Random):
+        self.median_ms, self.sigma, self.scale, self.rng = median_ms, sigma, scale, rng
+        self._lock = threading.Lock()
+
+    def sample_s(self) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        with self._lock:
+            ms = self.rng.lognormvariate(math.log(self.median_ms), self.sigma)
+        return ms * self.scale / 1000.0
+
+
+class Fakes:
+    """Patch ChatOpenAI + Tavily HTTP bằng fake local; đếm số call."""
+
+    def __init__(self, args: argparse.Namespace):
+        rng = random.Random(args.seed)
+        self.llm = Latency(args.llm_ms, args.llm_sigma, args.time_scale, rng)
+        self.search = Latency(args.search_ms, args.search_sigma, args.time_scale, rng)
+        self.llm_chars = args.llm_chars
+        self.agent_searches = args.agent_searches
+        self.search_results = args.search_results
+        self.snippet_chars = args.snippet_chars
+        self.llm_calls = 0
+        self.search_calls = 0
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    # ---- LLM ----
+    def _reply(self, messages: List[Any], tools: Optional[List[Dict[str, Any]]]):
+        from langchain_core.messages import AIMessage, ToolMessage
+        from langchain_core.outputs import ChatGeneration, ChatResult
+
+        with self._lock:
+            self.llm_calls += 1
+        prompt = "\n".join(str(m.content) for m in messages)
+        tool_names = {t.get("function", {}).get("name") for t in tools or []}
+        searched = sum(isinstance(m, ToolMessage) for m in messages)
+        if "internet_search" in tool_names and searched < self.agent_searches:
+            msg = AIMessage(content="", tool_calls=[{
+                "name": "internet_search",
+                "args": {"query": f"benchmark query {searched} {next(self._ids)}", "max_results": self.search_results},
+                "id": f"call_{next(self._ids)}",
+            }])
+        elif "base_year_revenue" in prompt and "scenarios" in prompt:
+            msg = AIMessage(content=json.dumps(_ASSUMPTIONS))
+        elif '"adjacency"' in prompt:
+            msg = AIMessage(content=json.dumps(_CANDIDATES))
+        else:
+            body = ("Synthetic benchmark paragraph with a citation [1]. " * (self.llm_chars // 50 + 1))[: self.llm_chars]
+            msg = AIMessage(content=_SYNTHETIC_REPORT.format(body=body))
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(msg.content) // 4 + 8
+        msg.usage_metadata = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens}
+        return ChatResult(generations=[ChatGeneration(message=msg)],
+                          llm_output={"token_usage": {"prompt_tokens": prompt_tokens,
+                                                      "completion_tokens": completion_tokens,
+                                                      "total_tokens": prompt_tokens + completion_tokens}})
+
+    # ---- Tavily ----
+    def _search_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self.search_calls += 1
+        q = payload.get("query", "")
+        n = int(payload.get("max_results") or self.search_results)
+        return {"query": q, "results": [
+            {"title": f"{q} — result {i}", "url": f"https://example.com/{zlib.crc32(q.encode()):08x}/{i}",
+             "content": ("Synthetic search snippet. " * (self.snippet_chars // 26 + 1))[: self.snippet_chars],
+             "score": round(1 - i / (n + 1), 3)}
+            for i in range(n)
+        ]}
+
+    def install(self) -> None:
+        from langchain_core.outputs import ChatGenerationChunk
+        from langchain_openai import ChatOpenAI
+
+        from agents import search
+
+        fakes = self
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(fakes.llm.sample_s())
+            return fakes._reply(messages, kwargs.get("tools"))
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            await asyncio.sleep(fakes.llm.sample_s())
+            return fakes._reply(messages, kwargs.get("tools"))
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            res = _generate(self, messages, stop, run_manager, **kwargs)
+            yield ChatGenerationChunk(message=_as_chunk(res.generations[0].message))
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            res = await _agenerate(self, messages, stop, run_manager, **kwargs)
+            yield ChatGenerationChunk(message=_as_chunk(res.generations[0].message))
+
+        ChatOpenAI._generate, ChatOpenAI._agenerate = _generate, _agenerate
+        ChatOpenAI._stream, ChatOpenAI._astream = _stream, _astream
+
+        def _post(payload, timeout=60):
+            time.sleep(fakes.search.sample_s())
+            return fakes._search_payload(payload)
+
+        async def _apost(payload, timeout=60):
+            await asyncio.sleep(fakes.search.sample_s())
+            return fakes._search_payload(payload)
+
+        search._post_search_once, search._apost_search_once = _post, _apost
+
+    def reset_counts(self) -> None:
+        self.llm_calls = self.search_calls = 0
+
+
+def _as_chunk(msg):
+    from langchain_core.messages import AIMessageChunk
+
+    return AIMessageChunk(
+        content=msg.content,
+        tool_call_chunks=[{"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i}
+                          for i, tc in enumerate(msg.tool_calls)],
+        usage_metadata=msg.usage_metadata,
+    )
+
+
+# ========================= NODE TIMING =========================
+def _node_timer(lanes: Optional[Dict[str, List[str]]] = None):
+    """Callback handler đo thời gian các node top-level của graph (áp dụng cho graph bất kỳ).
+
+    `lanes` (main.LANES): node gộp nhiều step chạy tuần tự -> đo thêm từng step theo tên.
+    """
+    lanes = lanes or {}
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class NodeTimer(BaseCallbackHandler):
+        def __init__(self) -> None:
+            self.started: Dict[UUID, tuple] = {}
+            self.durations_ms: Dict[str, float] = {}
+            self._lock = threading.Lock()
+
+        def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None,
+                           metadata=None, **kwargs):
+            meta = metadata or {}
+            node = meta.get("langgraph_node")
+            ns = meta.get("langgraph_checkpoint_ns") or ""
+            # chỉ node của graph ngoài cùng (không lấy node của deep agent bên trong);
+            # runnable con trùng tên node (vd. RunnableLambda của main._node) không tính lại
+            if node and "|" not in ns and kwargs.get("name") == node and parent_run_id not in self.started:
+                self.started[run_id] = (node, time.perf_counter())
+            elif node and "|" not in ns and kwargs.get("name") in lanes.get(node, ()):
+                self.started[run_id] = (kwargs["name"], time.perf_counter())
+
+        def _end(self, run_id) -> None:
+            hit = self.started.pop(run_id, None)
+            if hit:
+                with self._lock:
+                    node, t0 = hit
+                    self.durations_ms[node] = self.durations_ms.get(node, 0.0) + (time.perf_counter() - t0) * 1000
+
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            self._end(run_id)
+
+        def on_chain_error(self, error, *, run_id, **kwargs):
+            self._end(run_id)
+
+    return NodeTimer()
+
+
+# ========================= GRAPHS =========================
+def _graphs(which: str) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    if which in ("main", "all"):
+        from main import LANES, PIPELINE, supervisor_graph
+
+        # step trong lane được đo riêng, nên critical path tính trên PIPELINE (step-level)
+        deps = {k: list(v) for k, v in PIPELINE.items()}
+        deps.update({"resolve_entity": ["parse_input"], "announce_tools": ["resolve_entity"],
+                     "finalize": ["supervisor_qc"]})
+        out["main"] = {"graph": supervisor_graph, "deps": deps, "lanes": LANES, "input": lambda c: {"input": c}}
+    if which in ("supervisor", "all"):
+        from agents.supervisor import graph
+
+        g = graph.get_graph()
+        deps: Dict[str, List[str]] = {}
+        for e in g.edges:
+            if e.source.startswith("__") or e.target.startswith("__"):
+                continue
+            deps.setdefault(e.target, []).append(e.source)
+        out["supervisor"] = {"graph": graph, "deps": deps, "input": lambda c: {"input": c}}
+    # deep agent dựng lười ở lần dùng đầu (agents/registry.py): dựng trước để chỉ đo trạng thái
+    # ổn định; cold start đo riêng bằng --import-time
+    from agents.registry import get_agent
+    get_agent("company"), get_agent("industry")
+    return out
+
+
+def _pct(xs: List[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, max(0, math.ceil(p * len(xs)) - 1))]
+
+
+async def _run_level(spec: Dict[str, Any], concurrency: int, runs: int, fakes: Fakes) -> Dict[str, Any]:
+    from agents.dag import critical_path
+    from agents.search import clear_memo
+
+    clear_memo()
+    fakes.reset_counts()
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    crit: List[float] = []
+    node_ms: Dict[str, List[float]] = {}
+    paths: Dict[str, int] = {}
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with sem:
+            timer = _node_timer(spec.get("lanes"))
+            t0 = time.perf_counter()
+            try:
+                await spec["graph"].ainvoke(spec["input"](f"Benchmark Co {i}"),
+                                            config={"callbacks": [timer], "recursion_limit": 100})
+            except Exception as e:
+                errors += 1
+                print(f"run {i} failed: {type(e).__name__}: {e}", file=sys.stderr)
+                return
+            latencies.append((time.perf_counter() - t0) * 1000)
+            total, path = critical_path(spec["deps"], timer.durations_ms)
+            crit.append(total)
+            paths[" > ".join(path)] = paths.get(" > ".join(path), 0) + 1
+            for n, ms in timer.durations_ms.items():
+                node_ms.setdefault(n, []).append(ms)
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(runs)))
+    wall = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ok = len(latencies)
+    overhead = [lat - cp for lat, cp in zip(latencies, crit)]
+    return {
+        "concurrency": concurrency,
+        "runs": runs,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_runs_per_s": round(ok / wall, 3) if wall > 0 else None,
+        "latency_ms": _summary(latencies),
+        "critical_path_ms": _summary(crit),
+        "critical_path": max(paths, key=paths.get) if paths else None,
+        "orchestration_overhead_ms": _summary(overhead),
+        "node_ms": {n: round(statistics.fmean(v), 1) for n, v in sorted(node_ms.items())},
+        "llm_calls_per_run": round(fakes.llm_calls / max(ok, 1), 2),
+        "search_http_calls_per_run": round(fakes.search_calls / max(ok, 1), 2),
+        "tracemalloc_peak_mb": round(peak / 2**20, 2),
+        "max_rss_mb": round(_max_rss_mb(), 1),
+    }
+
+
+def _summary(xs: List[float]) -> Dict[str, float]:
+    if not xs:
+        return {}
+    return {"mean": round(statistics.fmean(xs), 1), "p50": round(_pct(xs, 0.5), 1),
+            "p95": round(_pct(xs, 0.95), 1), "max": round(max(xs), 1)}
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 1024  # macOS: bytes, Linux: KiB
+
+
+# ========================= IMPORT TIME =========================
+_IMPORT_PROBE = """
+import json, os, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "tvly-benchmark")
+from agents.registry import get_agent
+get_agent("company"), get_agent("industry")
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "first_agents_ms": (time.perf_counter() - t1) * 1000}))
+"""
+
+
+def _slowest_packages(stderr: str, top: int = 8) -> List[Dict[str, Any]]:
+    """Parse `-X importtime`: cumulative ms của từng top-level package (lấy lần import lớn nhất)."""
+    best: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        pkg = parts[2].strip().split(".")[0]
+        best[pkg] = max(best.get(pkg, 0.0), int(parts[1]) / 1000)
+    ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return [{"package": k, "cumulative_ms": round(v, 1)} for k, v in ranked]
+
+
+def _import_time(runs: int) -> Dict[str, Any]:
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "TAVILY_API_KEY")}
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    samples, stderr = [], ""
+    for i in range(runs):
+        cmd = [sys.executable] + (["-X", "importtime"] if i == 0 else []) + ["-c", _IMPORT_PROBE]
+        proc = subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"import probe failed:\n{proc.stderr[-2000:]}")
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        stderr = stderr or proc.stderr
+    # lần đầu chạy kèm -X importtime (chậm hơn) -> chỉ dùng để xếp hạng package
+    timed = samples[1:] or samples
+    return {"runs": runs,
+            "import_ms": _summary([s["import_ms"] for s in timed]),
+            "first_agents_ms": _summary([s["first_agents_ms"] for s in timed]),
+            "slowest_packages": _slowest_packages(stderr)}
+
+
+def _compare(current: Dict[str, Any], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        base = json.load(f)
+    if current.get("import_time") and base.get("import_time"):
+        new, old = current["import_time"]["import_ms"]["p50"], base["import_time"]["import_ms"]["p50"]
+        print(f"\nimport main p50: {new:,.0f}ms ({(new - old) / old:+.0%})")
+    index = {(r["graph"], r["concurrency"]): r for r in base.get("results", [])}
+    print(f"\n{'graph':<11}{'conc':>5}  {'p50 latency':>18}  {'overhead p50':>18}  {'peak MB':>14}")
+    for r in current.get("results", []):
+        b = index.get((r["graph"], r["concurrency"]))
+        if not b:
+            continue
+
+        def delta(get) -> str:
+            new, old = get(r), get(b)
+            if new is None or old in (None, 0):
+                return "n/a"
+            return f"{new:,.0f} ({(new - old) / old:+.0%})"
+        print(f"{r['graph']:<11}{r['concurrency']:>5}  "
+              f"{delta(lambda x: x['latency_ms'].get('p50')):>18}  "
+              f"{delta(lambda x: x['orchestration_overhead_ms'].get('p50')):>18}  "
+              f"{delta(lambda x: x['tracemalloc_peak_mb']):>14}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Offline benchmark of the research graphs with fake LLM/Tavily.")
+    p.add_argument("--graph", choices=("main", "supervisor", "all"), default="main")
+    p.add_argument("-c", "--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    p.add_argument("--runs", type=int, default=None, help="runs per level (default: max(concurrency, 4))")
+    p.add_argument("--llm-ms", type=float, default=800, help="median fake LLM latency")
+    p.add_argument("--llm-sigma", type=float, default=0.4)
+    p.add_argument("--llm-chars", type=int, default=2500, help="fake completion size")
+    p.add_argument("--search-ms", type=float, default=400, help="median fake Tavily latency")
+    p.add_argument("--search-sigma", type=float, default=0.3)
+    p.add_argument("--search-results", type=int, default=5)
+    p.add_argument("--snippet-chars", type=int, default=600)
+    p.add_argument("--agent-searches", type=int, default=2, help="tool-call rounds per deep agent")
+    p.add_argument("--time-scale", type=float, default=0.05, help="multiply every fake latency (1 = real time)")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--rate-limit", action="store_true", help="keep the shared rate limiter on")
+    p.add_argument("--out", default="bench_results.json")
+    p.add_argument("--compare", help="baseline results file to diff against")
+    p.add_argument("--import-time", type=int, metavar="N", help="only measure N cold imports of main")
+    args = p.parse_args(argv)
+
+    if args.import_time:
+        it = _import_time(args.import_time)
+        print(f"import main p50={it['import_ms']['p50']:,.0f}ms  "
+              f"first deep agents p50={it['first_agents_ms']['p50']:,.0f}ms", file=sys.stderr)
+        for row in it["slowest_packages"]:
+            print(f"  {row['package']:<24}{row['cumulative_ms']:>9,.1f}ms", file=sys.stderr)
+        report = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                  "python": platform.python_version(), "import_time": it}
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}", file=sys.stderr)
+        if args.compare:
+            _compare(report, args.compare)
+        return 0
+
+    # mọi thứ local: không cache giữa các run, không ghi .cache/
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("TAVILY_API_KEY", "tvly-benchmark")
+    os.environ["RESULT_CACHE_DISABLED"] = "true"
+    os.environ["SEARCH_CACHE_DISABLED"] = "true"
+    os.environ["LLM_MEMO_DISABLED"] = "true"
+    if not args.rate_limit:
+        os.environ["RATE_LIMIT_DISABLED"] = "true"
+
+    fakes = Fakes(args)
+    fakes.install()
+    graphs = _graphs(args.graph)
+
+    results = []
+    for name, spec in graphs.items():
+        for c in args.concurrency:
+            runs = args.runs or max(c, 4)
+            r = asyncio.run(_run_level(spec, c, runs, fakes))
+            r["graph"] = name
+            results.append(r)
+            print(f"{name:<11} c={c:<3} runs={runs:<3} wall={r['wall_s']:.2f}s "
+                  f"p50={r['latency_ms'].get('p50', 0):,.0f}ms "
+                  f"critical={r['critical_path_ms'].get('p50', 0):,.0f}ms "
+                  f"overhead={r['orchestration_overhead_ms'].get('p50', 0):,.0f}ms "
+                  f"peak={r['tracemalloc_peak_mb']}MB", file=sys.stderr)
+
+    import langgraph.version
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "langgraph": getattr(langgraph.version, "__version__", None),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.out}", file=sys.stderr)
+    if args.compare:
+        _compare(report, args.compare)
+    return 0 if not any(r["errors"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,9 @@
 # main.py
-import json, time, uuid
-from typing import TypedDict, Dict, Any, List
+import json, operator, os, time, uuid
+from typing import TypedDict, Dict, Any, Iterable, List, Optional, get_type_hints
 from typing_extensions import Annotated
 
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langchain_core.messages import (
@@ -10,15 +11,110 @@ from langchain_core.messages import (
 )
 
 # ==== agents / swarms ====
-from agents.company_agent import deep_research_agent
-from agents.industry_agent import industry_research_agent
-from agents.financial_model import run_financial_swarm
-from agents.potential_buyers import run_potential_buyers_swarm
-from agents.buyerlist import run_buyerlist
+from agents.cache import acached_call, cached_call
+from agents.checkpoint import make_checkpointer
+from agents import deadline
+from agents import routing
+from agents.dag import descendants
+from agents.deadline import MISSING, DeadlineExceeded, deadline_at, use_deadline
+from agents.entity import EntityCard, aresolve, resolve
+from agents.memo import refreshing
+from agents.qc import check_section
+from agents.refresh import arefresh_report, arefreshable_call, refresh_report, refreshable_call
+from agents.streaming import tool_stream
+from agents.sources import SourceRegistry, current_registry, registry_for, source_list_md, unwrap_citations, use_registry, with_citations
+from agents.tracing import node_trace
+from agents.universe import get_universe
+from agents.ratelimit import backoff_delay
+from agents.registry import get_agent
+from agents.financial_model import run_financial_swarm, arun_financial_swarm
+from agents.projections import AssumptionsError, parse_assumptions
+from agents.potential_buyers import run_potential_buyers_swarm, arun_potential_buyers_swarm
+from agents.buyerlist import run_buyerlist, arun_buyerlist
 
 QUALITY_THRESHOLD = 0.80
 MAX_ROUNDS = 1
 
+# ===================== PIPELINE (DAG) =====================
+# node -> các node phải xong trước (chỉ dependency thật). build_graph dựng edge từ đây:
+# mọi nhánh độc lập bắt đầu ngay tại announce_tools, QC join trên tất cả các nhánh.
+PIPELINE: Dict[str, List[str]] = {
+    "company":          ["announce_tools"],
+    "industry":         ["announce_tools"],
+    "financial_model":  ["announce_tools"],
+    "potential_buyers": ["announce_tools"],
+    "buyerlist":        ["financial_model"],
+    "supervisor_qc":    ["company", "industry", "buyerlist", "potential_buyers"],
+}
+
+# Chuỗi node chạy tuần tự trong 1 task (1 graph node). LangGraph chạy theo superstep: edge
+# thường financial_model -> buyerlist chỉ kích hoạt khi MỌI node cùng superstep xong, nên
+# buyerlist sẽ chờ cả company/industry. Gộp thành lane thì buyerlist chạy ngay sau
+# financial_model và latency end-to-end = max(nhánh) đúng như critical path trên PIPELINE.
+# Step sau step đầu chỉ được phụ thuộc step ngay trước (build_graph kiểm tra).
+LANES: Dict[str, List[str]] = {
+    "financial_lane": ["financial_model", "buyerlist"],
+}
+
+# QC section -> (field chứa text được chấm, các node phải chạy lại khi section bị flag)
+SECTIONS: Dict[str, tuple[str, List[str]]] = {
+    "company":   ("company_report",   ["company"]),
+    "industry":  ("industry_report",  ["industry"]),
+    "financial": ("financial_model",  ["financial_model"]),
+    "buyers":    ("potential_buyers", ["potential_buyers", "buyerlist"]),
+}
+
+# tool name (ToolCallBox ở FE) -> node
+TOOL_NODES: Dict[str, str] = {
+    "company_research":  "company",
+    "industry_research": "industry",
+    "financial_model":   "financial_model",
+    "potential_buyers":  "potential_buyers",
+    "buyerlist":         "buyerlist",
+}
+
+# Report của mỗi section chỉ có 1 bản trong state (field bên dưới). ToolMessage, AIMessage
+# cuối và kb chỉ giữ ref (tên field); FE resolve từ thread state khi render, server-side
+# dùng `render_report`.
+REPORT_SECTIONS: List[tuple[str, str]] = [   # (tiêu đề, field)
+    ("Company Report", "company_report"),
+    ("Industry Report", "industry_report"),
+    ("Financial Model ", "financial_model"),
+    ("Buyer List (uses Financial Model)", "buyerlist"),
+    ("Potential Buyers ", "potential_buyers"),
+]
+
+# tool name -> field chứa output của tool
+TOOL_REFS: Dict[str, str] = {
+    "company_research":  "company_report",
+    "industry_research": "industry_report",
+    "financial_model":   "financial_model",
+    "potential_buyers":  "potential_buyers",
+    "buyerlist":         "buyerlist",
+}
+
+# node có section trích nguồn theo số [n] của source registry (agents/sources.py)
+CITING_NODES = {"financial_model", "potential_buyers", "buyerlist"}
+
+# node -> route model của các LLM call trong node (agents/routing.py)
+NODE_ROUTES: Dict[str, List[str]] = {
+    "company":          ["company"],
+    "industry":         ["industry"],
+    "financial_model":  ["financial.assumptions", "financial.narrative", "financial.fallback_modeler"],
+    "potential_buyers": ["buyers.strategy_fit", "buyers.capability_match", "buyers.deal_precedent",
+                         "buyers.aggregate"],
+    "buyerlist":        ["buyerlist"],
+}
+
+# ước lượng thô (ms) để in critical path khi chưa có số đo thật: python -m agents.dag
+NODE_COST_HINT_MS: Dict[str, float] = {
+    "company": 90_000,
+    "industry": 100_000,
+    "financial_model": 25_000,
+    "potential_buyers": 30_000,
+    "buyerlist": 15_000,
+}
+
 def merge_dict(a: Dict[str, Any] | None, b: Dict[str, Any] | None) -> Dict[str, Any]:
     # hợp nhất nông; nếu cần deep-merge có thể tự viết đệ quy
     return {**(a or {}), **(b or {})}
@@ -31,7 +127,17 @@ class ChatState(TypedDict, total=False):
     messages: Annotated[List[BaseMessage], add_messages]
 
     company_query: str
+    # entity card chuẩn của company_query (agents/entity.py), resolve 1 lần cho mọi nhánh
+    entity: Dict[str, Any]
+    # id của run (source registry, ...), cấp ở parse_input
+    run_id: str
     round: int
+    # bỏ qua result cache cho run này (vẫn ghi kết quả mới vào cache)
+    force_refresh: bool
+    # epoch hết ngân sách latency của run (agents/deadline.py); None = không giới hạn
+    deadline: float
+    # company/industry: cập nhật report cũ bằng tin mới thay vì dùng lại nguyên (agents/refresh.py)
+    refresh: bool
 
     company_report: str
     industry_report: str
@@ -41,7 +147,10 @@ class ChatState(TypedDict, total=False):
     
     potential_buyers: str
     buyerlist: str 
-    qc_json: Dict[str, Any]
+    # mỗi nhánh tự ghi QC của section mình ngay khi xong -> merge
+    qc_json: Annotated[Dict[str, Any], merge_dict]
+    # node cần chạy lại trong vòng rework hiện tại
+    rework_nodes: List[str]
 
     feedback_company: str
     feedback_industry: str
@@ -50,7 +159,12 @@ class ChatState(TypedDict, total=False):
 
     # stream timing
     tool_ids: Dict[str, str]
-    tool_started: Dict[str, float]
+    # tool name -> epoch lúc node bắt đầu (merge: các nhánh song song cùng ghi)
+    tool_started: Annotated[Dict[str, float], merge_dict]
+    # span node / LLM / search của run (agents.tracing), cộng dồn qua các vòng rework
+    spans: Annotated[List[Dict[str, Any]], operator.add]
+    # source registry của run: "n" -> source (agents.sources), để dựng lại registry khi resume
+    sources: Annotated[Dict[str, Dict[str, Any]], merge_dict]
     
     kb: Annotated[Dict[str, Any], merge_dict]
 
@@ -77,19 +191,89 @@ def _coerce_str(x: Any) -> str:
     except Exception:
         return str(x)
 
+AGENT_ATTEMPTS = 4
+
 def _run_agent(agent, prompt: str) -> str:
 
     last_err = None
-    for attempt in range(4):
+    for attempt in range(AGENT_ATTEMPTS):
         try:
             out = agent.invoke({"messages": [{"role": "user", "content": prompt}]},
                                config={"recursion_limit": 100})
             return _coerce_str(out)
         except Exception as e:
             last_err = e
-            time.sleep(0.8 * (2 ** attempt))
+            if attempt < AGENT_ATTEMPTS - 1:
+                deadline.sleep(backoff_delay(attempt, e))
     return f"[tool_error] Upstream model error: {type(last_err).__name__}: {last_err}"
 
+async def _arun_agent(agent, prompt: str) -> str:
+    """Async twin of `_run_agent`: ainvoke + asyncio.sleep, không giữ worker thread."""
+    last_err = None
+    for attempt in range(AGENT_ATTEMPTS):
+        try:
+            out = await agent.ainvoke({"messages": [{"role": "user", "content": prompt}]},
+                                      config={"recursion_limit": 100})
+            return _coerce_str(out)
+        except Exception as e:
+            last_err = e
+            if attempt < AGENT_ATTEMPTS - 1:
+                await deadline.asleep(backoff_delay(attempt, e))
+    return f"[tool_error] Upstream model error: {type(last_err).__name__}: {last_err}"
+
+def _node_model(node: str) -> str:
+    # model hiện tại của các route trong node -> key result cache đổi khi route đổi model / fallback
+    return routing.key_for(*NODE_ROUTES[node])
+
+def _entity(state: ChatState) -> EntityCard:
+    card = state.get("entity")
+    return EntityCard.from_dict(card) if card else EntityCard.from_query(state["company_query"])
+
+def _entity_brief(state: ChatState) -> str:
+    # khối RESOLVED ENTITY cho prompt của swarm; search query chỉ dùng card.name
+    card = _entity(state)
+    return card.brief() if card.resolved else ""
+
+def _research_query(state: ChatState) -> str:
+    # query gốc (giữ ngôn ngữ của user) + card đã resolve -> deep agent bỏ qua bước disambiguate
+    card = _entity(state)
+    q = state["company_query"]
+    return f"{q}\n\n{card.brief()}" if card.resolved else q
+
+def _cached(node: str, state: ChatState, feedback: str, fn, *, model: str):
+    compute = fn
+    if node in CITING_NODES:
+        # cache kèm các nguồn được trích; khi dùng lại thì đánh số lại theo registry của run này
+        compute = lambda: with_citations(fn())
+    # key theo entity id: "nvidia" / "NVIDIA Corp" / "NVDA" dùng chung entry
+    out = cached_call(node, _entity(state).id, feedback, compute,
+                      model=model, force_refresh=bool(state.get("force_refresh")))
+    return unwrap_citations(out)
+
+async def _acached(node: str, state: ChatState, feedback: str, afn, *, model: str):
+    compute = afn
+    if node in CITING_NODES:
+        async def compute():
+            return with_citations(await afn())
+    out = await acached_call(node, _entity(state).id, feedback, compute,
+                             model=model, force_refresh=bool(state.get("force_refresh")))
+    return unwrap_citations(out)
+
+def _cached_report(node: str, state: ChatState, feedback: str, fn, *, model: str):
+    # report cũ (kể cả quá TTL) -> chỉ viết lại section bị ảnh hưởng bởi tin mới
+    card = _entity(state)
+    return refreshable_call(node, card.id, feedback, fn,
+                            lambda prior, since: refresh_report(node, card.name, prior, since),
+                            model=model, force_refresh=bool(state.get("force_refresh")),
+                            refresh=bool(state.get("refresh")))
+
+async def _acached_report(node: str, state: ChatState, feedback: str, afn, *, model: str):
+    card = _entity(state)
+    return await arefreshable_call(node, card.id, feedback, afn,
+                                   lambda prior, since: arefresh_report(node, card.name, prior, since),
+                                   model=model, force_refresh=bool(state.get("force_refresh")),
+                                   refresh=bool(state.get("refresh")))
+
 def _make_revision_prompt(base_query: str, feedback: str) -> str:
     if feedback:
         return (
@@ -161,284 +345,524 @@ def n_parse_input(state: ChatState) -> Dict[str, Any]:
         from langchain_core.messages import HumanMessage
         msg_list.append(HumanMessage(content=q))
 
-    return {"company_query": q, "round": 0, "messages": msg_list}
+    raw = state.get("input")
+    force = bool(raw.get("force_refresh")) if isinstance(raw, dict) else bool(state.get("force_refresh"))
+    refresh = bool(raw.get("refresh")) if isinstance(raw, dict) else bool(state.get("refresh"))
+    budget = raw.get("deadline_s") if isinstance(raw, dict) else None
+
+    return {"company_query": q, "run_id": uuid.uuid4().hex, "round": 0, "force_refresh": force,
+            "refresh": refresh, "deadline": deadline_at(budget), "messages": msg_list}
+
+
+def n_resolve_entity(state: ChatState) -> Dict[str, Any]:
+    return {"entity": resolve(state["company_query"]).to_dict()}
+
+async def an_resolve_entity(state: ChatState) -> Dict[str, Any]:
+    return {"entity": (await aresolve(state["company_query"])).to_dict()}
 
 
 def n_announce_tools(state: ChatState) -> Dict[str, Any]:
-    names = ["company_research", "industry_research", "financial_model", "potential_buyers", "buyerlist"]
+    names = list(TOOL_NODES)
     tool_ids = {n: uuid.uuid4().hex for n in names}
     tool_calls = [{"id": tool_ids[n], "type":"function", "function":{"name": n, "arguments": "{}"}} for n in names]
     ai = AIMessage(content="", additional_kwargs={"tool_calls": tool_calls})
     return {"messages": [ai], "tool_ids": tool_ids, "tool_started": {}}
 
-def _tool_done(name: str, state: ChatState, content: str, *, elapsed_ms: int | None = None) -> Dict[str, Any]:
+def _tool_done(name: str, state: ChatState, *, elapsed_ms: int | None = None) -> Dict[str, Any]:
     tid = (state.get("tool_ids") or {}).get(name) or uuid.uuid4().hex
     if elapsed_ms is None:
         started = (state.get("tool_started") or {}).get(name, time.time())
         elapsed_ms = int((time.time() - started) * 1000)
 
+    # output nằm ở state[TOOL_REFS[name]] (cùng update); message chỉ giữ ref
     tool_msg = ToolMessage(
-        content=_coerce_str(content),
+        content="",
         name=name,
         tool_call_id=tid,
-        additional_kwargs={"elapsed_ms": int(elapsed_ms)},
+        additional_kwargs={"elapsed_ms": int(elapsed_ms), "state_ref": TOOL_REFS[name]},
     )
     return {"messages": [tool_msg]}
 
-def n_company(state: ChatState) -> Dict[str, Any]:
-    q  = state["company_query"]
-    fb = state.get("feedback_company", "")
-    prompt = _make_revision_prompt(q, fb)
+# Mỗi node có 2 biến thể: sync (graph.invoke) và async (graph.ainvoke / langgraph server).
+# Phần dựng input và ghi state dùng chung, chỉ khác chỗ gọi agent/swarm.
 
-    t0 = time.time()
-    txt = _run_agent(deep_research_agent, prompt)
-    dt = int((time.time() - t0) * 1000)
-
-    done = _tool_done("company_research", state, txt, elapsed_ms=dt)
+def _company_update(state: ChatState, q: str, fb: str, txt: str, dt: int) -> Dict[str, Any]:
+    done = _tool_done("company_research", state, elapsed_ms=dt)
     return {
         "company_report": txt,
-        # ghi vào kb để agent khác dùng lại
+        "qc_json": qc_section("company", txt),
+        # ghi vào kb để agent khác dùng lại (report đọc qua ref, không copy)
         "kb": {
             "company": {
                 "query": q,
                 "feedback": fb,
-                "report_md": txt,   # có thể thay bằng JSON rút gọn nếu bạn đã trích xuất card
+                "report_ref": "company_report",
             }
         },
         **done,
     }
 
-def n_industry(state: ChatState) -> Dict[str, Any]:
+def n_company(state: ChatState) -> Dict[str, Any]:
     q  = state["company_query"]
-    fb = state.get("feedback_industry", "")
-    prompt = _make_revision_prompt(q, fb)
+    fb = state.get("feedback_company", "")
+    prompt = _make_revision_prompt(_research_query(state), fb)
 
     t0 = time.time()
-    txt = _run_agent(industry_research_agent, prompt)
+    txt = _cached_report("company", state, fb, lambda: _run_agent(get_agent("company"), prompt), model=_node_model("company"))
     dt = int((time.time() - t0) * 1000)
+    return _company_update(state, q, fb, txt, dt)
 
-    done = _tool_done("industry_research", state, txt, elapsed_ms=dt)
+async def an_company(state: ChatState) -> Dict[str, Any]:
+    q  = state["company_query"]
+    fb = state.get("feedback_company", "")
+    prompt = _make_revision_prompt(_research_query(state), fb)
+
+    t0 = time.time()
+    txt = await _acached_report("company", state, fb, lambda: _arun_agent(get_agent("company"), prompt), model=_node_model("company"))
+    dt = int((time.time() - t0) * 1000)
+    return _company_update(state, q, fb, txt, dt)
+
+def _industry_update(state: ChatState, fb: str, txt: str, dt: int) -> Dict[str, Any]:
+    done = _tool_done("industry_research", state, elapsed_ms=dt)
     return {
         "industry_report": txt,
+        "qc_json": qc_section("industry", txt),
         "kb": {
             "industry": {
                 "feedback": fb,
-                "report_md": txt,   # nếu có bảng M&A riêng, bạn có thể lưu ma_table_md tại đây
+                "report_ref": "industry_report",
             }
         },
         **done,
     }
 
-def n_financial(state: ChatState) -> Dict[str, Any]:
-    q  = state["company_query"]
-    fb = _coerce_str(state.get("feedback_financial", ""))
+def n_industry(state: ChatState) -> Dict[str, Any]:
+    fb = state.get("feedback_industry", "")
+    prompt = _make_revision_prompt(_research_query(state), fb)
 
     t0 = time.time()
-    md, assumptions = "", ""
-    try:
-        out = run_financial_swarm(q, feedback=fb)
-        if isinstance(out, dict):
-            md = _coerce_str(out.get("markdown", ""))
-            assumptions = _coerce_str(out.get("assumptions_json", ""))
-        else:
-            md = _coerce_str(out)
-            assumptions = ""
-    except Exception as e:
-        md = f"[tool_error] {type(e).__name__}: {e}"
-        assumptions = ""
+    txt = _cached_report("industry", state, fb, lambda: _run_agent(get_agent("industry"), prompt), model=_node_model("industry"))
+    dt = int((time.time() - t0) * 1000)
+    return _industry_update(state, fb, txt, dt)
+
+async def an_industry(state: ChatState) -> Dict[str, Any]:
+    fb = state.get("feedback_industry", "")
+    prompt = _make_revision_prompt(_research_query(state), fb)
 
+    t0 = time.time()
+    txt = await _acached_report("industry", state, fb, lambda: _arun_agent(get_agent("industry"), prompt), model=_node_model("industry"))
     dt = int((time.time() - t0) * 1000)
-    done = _tool_done("financial_model", state, md, elapsed_ms=dt)
+    return _industry_update(state, fb, txt, dt)
+
+def _financial_update(state: ChatState, fb: str, out: Any, dt: int) -> Dict[str, Any]:
+    if isinstance(out, dict):
+        md = _coerce_str(out.get("markdown", ""))
+        assumptions = _coerce_str(out.get("assumptions_json", ""))
+        parsed = out.get("assumptions")
+    else:
+        md = _coerce_str(out)
+        assumptions, parsed = "", None
+    if parsed is None and assumptions:
+        # kết quả cache cũ (trước khi swarm trả assumptions đã validate)
+        try:
+            parsed = parse_assumptions(assumptions).to_dict()
+        except AssumptionsError:
+            parsed = None
+
+    done = _tool_done("financial_model", state, elapsed_ms=dt)
     return {
         "financial_model": md,
         "financial_assumptions": assumptions,
+        "qc_json": qc_section("financial", md),
         "kb": {
             "financial": {
                 "feedback": fb,
-                "model_md": md,
-                "assumptions_json": assumptions,
+                "model_ref": "financial_model",
+                "assumptions_ref": "financial_assumptions",
+                # typed (projections.Assumptions.to_dict), None nếu không hợp lệ; buyerlist dùng trực tiếp
+                "assumptions": parsed,
             }
         },
         **done,
     }
 
-def n_buyers(state: ChatState) -> Dict[str, Any]:
-    q  = state["company_query"]
-    fb = _coerce_str(state.get("feedback_buyers", ""))
+def n_financial(state: ChatState) -> Dict[str, Any]:
+    q, ent = _entity(state).name, _entity_brief(state)
+    fb = _coerce_str(state.get("feedback_financial", ""))
 
     t0 = time.time()
     try:
-        out = run_potential_buyers_swarm(q, feedback=fb)
-        txt = _coerce_str(out)
+        out = _cached("financial_model", state, fb,
+                      lambda: run_financial_swarm(q, feedback=fb, entity=ent), model=_node_model("financial_model"))
     except Exception as e:
-        txt = f"[tool_error] {type(e).__name__}: {e}"
+        out = f"[tool_error] {type(e).__name__}: {e}"
+    dt = int((time.time() - t0) * 1000)
+    return _financial_update(state, fb, out, dt)
+
+async def an_financial(state: ChatState) -> Dict[str, Any]:
+    q, ent = _entity(state).name, _entity_brief(state)
+    fb = _coerce_str(state.get("feedback_financial", ""))
 
+    t0 = time.time()
+    try:
+        out = await _acached("financial_model", state, fb,
+                             lambda: arun_financial_swarm(q, feedback=fb, entity=ent), model=_node_model("financial_model"))
+    except Exception as e:
+        out = f"[tool_error] {type(e).__name__}: {e}"
     dt = int((time.time() - t0) * 1000)
-    done = _tool_done("potential_buyers", state, txt, elapsed_ms=dt)
+    return _financial_update(state, fb, out, dt)
+
+def _buyers_update(state: ChatState, fb: str, txt: str, dt: int) -> Dict[str, Any]:
+    done = _tool_done("potential_buyers", state, elapsed_ms=dt)
     return {
         "potential_buyers": txt,
+        "qc_json": qc_section("buyers", txt),
         "kb": {
             "pb": {
                 "feedback": fb,
-                "summary_md": txt,
-                # nếu bạn có mảng sources/citations, lưu vào đây: "citations": [...]
+                "summary_ref": "potential_buyers",
             }
         },
         **done,
     }
 
-def n_buyerlist(state: ChatState) -> Dict[str, Any]:
-    q   = state["company_query"]
-    # ưu tiên lấy từ kb nếu đã có, fallback sang field state
-    fm  = _coerce_str((state.get("kb", {}) or {}).get("financial", {}).get("model_md")
-                      or state.get("financial_model", ""))
-    ass = _coerce_str((state.get("kb", {}) or {}).get("financial", {}).get("assumptions_json")
-                      or state.get("financial_assumptions", ""))
-    fb  = _coerce_str(state.get("feedback_buyers", ""))
+def _pbuyers_enabled() -> bool:
+    # potential_buyers cần web sources; thiếu key thì bỏ qua (không tốn LLM call)
+    return bool(os.getenv("TAVILY_API_KEY"))
+
+_PBUYERS_SKIPPED = "Skipped: no web search provider configured (TAVILY_API_KEY is not set)."
+
+def n_buyers(state: ChatState) -> Dict[str, Any]:
+    q, ent = _entity(state).name, _entity_brief(state)
+    fb = _coerce_str(state.get("feedback_buyers", ""))
+    if not _pbuyers_enabled():
+        return _buyers_update(state, fb, _PBUYERS_SKIPPED, 0)
 
     t0 = time.time()
     try:
-        txt = run_buyerlist(q, fm, ass, feedback=fb)
+        out = _cached("potential_buyers", state, fb,
+                      lambda: run_potential_buyers_swarm(q, feedback=fb, entity=ent), model=_node_model("potential_buyers"))
+        txt = _coerce_str(out)
     except Exception as e:
         txt = f"[tool_error] {type(e).__name__}: {e}"
+    dt = int((time.time() - t0) * 1000)
+    return _buyers_update(state, fb, txt, dt)
 
+async def an_buyers(state: ChatState) -> Dict[str, Any]:
+    q, ent = _entity(state).name, _entity_brief(state)
+    fb = _coerce_str(state.get("feedback_buyers", ""))
+    if not _pbuyers_enabled():
+        return _buyers_update(state, fb, _PBUYERS_SKIPPED, 0)
+
+    t0 = time.time()
+    try:
+        out = await _acached("potential_buyers", state, fb,
+                             lambda: arun_potential_buyers_swarm(q, feedback=fb, entity=ent), model=_node_model("potential_buyers"))
+        txt = _coerce_str(out)
+    except Exception as e:
+        txt = f"[tool_error] {type(e).__name__}: {e}"
     dt = int((time.time() - t0) * 1000)
-    done = _tool_done("buyerlist", state, txt, elapsed_ms=dt)
+    return _buyers_update(state, fb, txt, dt)
+
+def _buyerlist_inputs(state: ChatState) -> tuple[str, str, str, str, str, Optional[Dict[str, Any]]]:
+    q   = _entity(state).name
+    ent = _entity_brief(state)
+    fm  = _coerce_str(state.get("financial_model", ""))
+    ass = _coerce_str(state.get("financial_assumptions", ""))
+    fb  = _coerce_str(state.get("feedback_buyers", ""))
+    typed = ((state.get("kb") or {}).get("financial") or {}).get("assumptions")
+    return q, ent, fm, ass, fb, typed
+
+def _buyerlist_key(fb: str, fm: str, ass: str, typed: Optional[Dict[str, Any]]) -> str:
+    # buyerlist phụ thuộc output financial -> đưa vào key qua feedback (assumptions typed: chỉ cần nó)
+    # + phiên bản acquirer universe: đổi dataset -> shortlist khác
+    return json.dumps([fb, typed, get_universe().version] if typed else [fb, fm, ass], ensure_ascii=False, sort_keys=True)
+
+def _buyerlist_update(state: ChatState, fb: str, ass: str, typed: Optional[Dict[str, Any]], txt: str, dt: int) -> Dict[str, Any]:
+    done = _tool_done("buyerlist", state, elapsed_ms=dt)
     return {
         "buyerlist": txt,
         "kb": {
             "buyerlist": {
                 "feedback": fb,
-                "summary_md": txt,
+                "summary_ref": "buyerlist",
                 "used_assumptions": bool(ass),
+                "computed_scores": bool(typed),
             }
         },
         **done,
     }
 
+def n_buyerlist(state: ChatState) -> Dict[str, Any]:
+    q, ent, fm, ass, fb, typed = _buyerlist_inputs(state)
 
-def qc_score(company: str, industry: str, financial: str, buyers: str) -> dict:
+    t0 = time.time()
+    try:
+        txt = _cached("buyerlist", state, _buyerlist_key(fb, fm, ass, typed),
+                      lambda: run_buyerlist(q, fm, ass, feedback=fb, assumptions=typed, entity=ent), model=_node_model("buyerlist"))
+    except Exception as e:
+        txt = f"[tool_error] {type(e).__name__}: {e}"
+    dt = int((time.time() - t0) * 1000)
+    return _buyerlist_update(state, fb, ass, typed, txt, dt)
 
-    def score(x: str) -> float:
-        n = len(x or "")
-        if n >= 2000: return 9.0
-        if n >= 1000: return 8.5
-        if n >= 600:  return 8.0
-        if n >= 300:  return 7.5
-        if n >= 150:  return 7.0
-        return 6.5
+async def an_buyerlist(state: ChatState) -> Dict[str, Any]:
+    q, ent, fm, ass, fb, typed = _buyerlist_inputs(state)
+
+    t0 = time.time()
+    try:
+        txt = await _acached("buyerlist", state, _buyerlist_key(fb, fm, ass, typed),
+                             lambda: arun_buyerlist(q, fm, ass, feedback=fb, assumptions=typed, entity=ent),
+                             model=_node_model("buyerlist"))
+    except Exception as e:
+        txt = f"[tool_error] {type(e).__name__}: {e}"
+    dt = int((time.time() - t0) * 1000)
+    return _buyerlist_update(state, fb, ass, typed, txt, dt)
+
+
+def qc_section(section: str, text: str, known: Optional[Iterable[int]] = None) -> Dict[str, Any]:
+    """QC một section ngay khi nhánh của nó xong (ghi vào qc_json qua merge_dict).
+
+    Chấm cấu trúc cục bộ bằng agents.qc (heading, citation, bảng, số liệu); `known` = các số [n]
+    của source registry (mặc định: registry của run hiện tại).
+    """
+    if known is None:
+        known = [s.n for s in current_registry().all()]
+    result = check_section(section, _coerce_str(text), known=known)
     return {
-        "company_score":   score(company),
-        "industry_score":  score(industry),
-        "financial_score": score(financial),
-        "buyers_score":    score(buyers),
-        "needs_rework_company":   False,
-        "needs_rework_industry":  False,
-        "needs_rework_financial": False,
-        "needs_rework_buyers":    False,
-        "feedback_company":   "",
-        "feedback_industry":  "",
-        "feedback_financial": "",
-        "feedback_buyers":    "",
+        f"{section}_score": result.score,
+        # chỉ rework khi chạy lại sửa được (lỗi upstream không vào cache nên lần sau gọi thật)
+        f"needs_rework_{section}": result.needs_rework(QUALITY_THRESHOLD),
+        f"feedback_{section}": result.feedback(),
+        f"{section}_issues": [i.message for i in result.issues],
     }
 
+def qc_score(company: str, industry: str, financial: str, buyers: str) -> dict:
+    out: Dict[str, Any] = {}
+    for section, text in (("company", company), ("industry", industry),
+                          ("financial", financial), ("buyers", buyers)):
+        out.update(qc_section(section, text))
+    return out
+
 def n_qc(state: ChatState) -> Dict[str, Any]:
-    return {"qc_json": qc_score(
-        _coerce_str(state.get("company_report", "")),
-        _coerce_str(state.get("industry_report", "")),
-        _coerce_str(state.get("financial_model", "")),
-        _coerce_str(state.get("potential_buyers", "")),
-    )}
+    # join: các nhánh đã tự chấm section của mình; chỉ bù section còn thiếu
+    qc = state.get("qc_json") or {}
+    missing = {}
+    for section, (field, _) in SECTIONS.items():
+        if f"{section}_score" not in qc:
+            known = [src.n for src in SourceRegistry(state.get("sources")).all()]
+            missing.update(qc_section(section, state.get(field, ""), known=known))
+    return {"qc_json": missing}
+
+def _flagged_sections(state: ChatState) -> List[str]:
+    # needs_rework đã gồm ngưỡng QUALITY_THRESHOLD + lỗi có sửa được bằng rework không (agents.qc)
+    qc = state.get("qc_json") or {}
+    return [s for s in SECTIONS if qc.get(f"needs_rework_{s}")]
+
+def rework_targets(sections: List[str]) -> List[str]:
+    """Node cần chạy lại cho các section bị flag, bỏ node sẽ tự chạy lại vì là downstream
+    của node khác trong danh sách (vd buyerlist khi financial_model đã được rerun)."""
+    nodes = [n for s in sections for n in SECTIONS[s][1]]
+    # theo từng node: descendants(PIPELINE, nodes) bỏ qua node vừa là root vừa là downstream
+    downstream = {d for n in nodes for d in descendants(PIPELINE, [n])}
+    return [n for n in dict.fromkeys(nodes) if n not in downstream]
 
 def n_set_feedback(state: ChatState) -> Dict[str, Any]:
     qc = state.get("qc_json") or {}
-    return {
+    sections = _flagged_sections(state)
+    out: Dict[str, Any] = {
         "round": (state.get("round") or 0) + 1,
-        "feedback_company": _coerce_str(qc.get("feedback_company", "")),
-        "feedback_industry": _coerce_str(qc.get("feedback_industry", "")),
-        "feedback_financial": _coerce_str(qc.get("feedback_financial", "")),
-        "feedback_buyers": _coerce_str(qc.get("feedback_buyers", "")),
+        "rework_nodes": rework_targets(sections),
     }
+    # chỉ đổi feedback của section bị flag; section khác giữ nguyên kết quả cũ
+    for section in sections:
+        out[f"feedback_{section}"] = _coerce_str(qc.get(f"feedback_{section}", ""))
+    return out
 
 def router(state: ChatState) -> str:
-    qc = state.get("qc_json") or {}
-    def need(flag: str, score_key: str) -> bool:
-        return bool(qc.get(flag)) or (float(qc.get(score_key, 0.0)) < QUALITY_THRESHOLD)
-    redo = any([
-        need("needs_rework_company", "company_score"),
-        need("needs_rework_industry", "industry_score"),
-        need("needs_rework_financial", "financial_score"),
-        need("needs_rework_buyers", "buyers_score"),
-    ])
+    if deadline.expired(state.get("deadline")):
+        return "end"  # hết ngân sách: không rework, finalize với các section đã có
+    redo = bool(_flagged_sections(state))
     if redo and (state.get("round") or 0) < MAX_ROUNDS:
         return "redo"
     return "end"
 
+def _sources_md(state: Dict[str, Any]) -> str:
+    # danh sách nguồn hợp nhất: chỉ các [n] thực sự được trích trong các section
+    text = "\n".join(_coerce_str(state.get(k, "")) for k in ("financial_model", "buyerlist", "potential_buyers"))
+    cited = SourceRegistry(state.get("sources")).cited(text)
+    return source_list_md(cited) if cited else ""
+
+def _missing_sections(state: Dict[str, Any]) -> List[str]:
+    """Field của các section không xong (hết deadline / chưa chạy)."""
+    return [key for _, key in REPORT_SECTIONS
+            if not _coerce_str(state.get(key, "")).strip() or _coerce_str(state.get(key, "")).startswith(MISSING)]
+
+def _section_text(state: Dict[str, Any], key: str) -> str:
+    return _coerce_str(state.get(key, "")).strip() or f"{MISSING} Section not available."
+
+def render_report(state: Dict[str, Any]) -> str:
+    """Report cuối đầy đủ (resolve các ref của AIMessage do n_finalize tạo) từ state."""
+    body = "\n\n---\n\n".join(f"## {title}\n\n" + _section_text(state, key)
+                               for title, key in REPORT_SECTIONS)
+    sources = _sources_md(state)
+    if sources:
+        body += "\n\n---\n\n## Sources\n\n" + sources
+    return body
+
 def n_finalize(state: ChatState) -> Dict[str, Any]:
-    comp = _coerce_str(state.get("company_report", ""))
-    ind  = _coerce_str(state.get("industry_report", ""))
-    fin  = _coerce_str(state.get("financial_model", ""))
-    bl   = _coerce_str(state.get("buyerlist", ""))  
-    buy  = _coerce_str(state.get("potential_buyers", ""))
-    
-    body = (
-        "## Company Report\n\n" + comp +
-        "\n\n---\n\n## Industry Report\n\n" + ind +
-        "\n\n---\n\n## Financial Model \n\n" + fin +
-        "\n\n---\n\n## Buyer List (uses Financial Model)\n\n" + bl +    
-        "\n\n---\n\n## Potential Buyers \n\n" + buy
-    )
-    
-    return {"messages": [AIMessage(content=body)]}
+    # AIMessage chỉ mang ref tới các section (FE ghép từ thread state), không copy report
+    report = {"sections": [{"title": t, "ref": k} for t, k in REPORT_SECTIONS],
+              "sources_md": _sources_md(state),
+              # section không xong trong deadline (FE hiển thị marker thay cho nội dung)
+              "missing": _missing_sections(state)}
+    return {"messages": [AIMessage(content="", additional_kwargs={"report": report})]}
 
 # ======================= BUILD GRAPH ======================
 
-# Helper router: quyết định có chạy potential_buyers hay bỏ qua
-def decide_pbuyers(state: ChatState) -> Dict[str, Any]:
-    import os
-    has_sources = bool(os.getenv("TAVILY_API_KEY"))
-    # nếu cần tinh vi hơn, bạn có thể set cờ khác trong state rồi đọc ở đây
-    return {"route": "potential" if has_sources else "skip"}
-
-
-def build_graph():
+def node_durations(state: Dict[str, Any]) -> Dict[str, float]:
+    """elapsed_ms thực đo (từ ToolMessage) theo node, dùng cho agents.dag.critical_path."""
+    out: Dict[str, float] = {}
+    for m in state.get("messages") or []:
+        if isinstance(m, ToolMessage) and m.name in TOOL_NODES:
+            out[TOOL_NODES[m.name]] = float((m.additional_kwargs or {}).get("elapsed_ms", 0))
+    return out
+
+
+def _node(name: str, func, afunc):
+    """Node chạy `func` khi graph.invoke và `afunc` khi graph.ainvoke/astream.
+
+    Token LLM phát ra trong node được gắn tool id của node (xem agents.streaming),
+    FE render partial section ngay trong ToolCallBox tương ứng. Span của node và mọi
+    LLM/search call bên trong được ghi vào state["spans"] (xem agents.tracing).
+    Các nhánh cùng run dùng chung 1 source registry (đánh số [n] thống nhất).
+    """
+    tool = next((t for t, n in TOOL_NODES.items() if n == name), None)
+
+    def timed_out(state: ChatState) -> Dict[str, Any]:
+        # hết deadline giữa chừng: section ghi marker, các nhánh khác vẫn giữ kết quả
+        if not tool:
+            return {}
+        text = f"{MISSING} Not completed within the run's latency budget (RUN_DEADLINE_S / deadline_s)."
+        return {TOOL_REFS[tool]: text, **_tool_done(tool, state)}
+
+    def traced(update: Dict[str, Any], spans: List[Dict[str, Any]], started: float, reg) -> Dict[str, Any]:
+        out = {**update, "spans": spans}
+        if tool:
+            out["tool_started"] = {tool: started}
+        if len(reg):
+            out["sources"] = reg.to_state()
+        return out
+
+    def run(state: ChatState) -> Dict[str, Any]:
+        started = time.time()
+        reg = registry_for(state.get("run_id"), state.get("sources"))
+        with node_trace(name) as spans, use_registry(reg), refreshing(bool(state.get("force_refresh"))), \
+                tool_stream(tool, (state.get("tool_ids") or {}).get(tool)), use_deadline(state.get("deadline")):
+            try:
+                update = func(state)
+            except DeadlineExceeded:
+                update = timed_out(state)
+        return traced(update, spans, started, reg)
+
+    async def arun(state: ChatState) -> Dict[str, Any]:
+        started = time.time()
+        reg = registry_for(state.get("run_id"), state.get("sources"))
+        with node_trace(name) as spans, use_registry(reg), refreshing(bool(state.get("force_refresh"))), \
+                tool_stream(tool, (state.get("tool_ids") or {}).get(tool)), use_deadline(state.get("deadline")):
+            try:
+                update = await deadline.wait_for(afunc(state))
+            except DeadlineExceeded:
+                update = timed_out(state)
+        return traced(update, spans, started, reg)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+
+# field có reducer (Annotated[..., reducer]) của ChatState, để gộp update của các step trong lane
+_REDUCERS = {k: t.__metadata__[0] for k, t in get_type_hints(ChatState, include_extras=True).items()
+             if getattr(t, "__metadata__", None)}
+
+
+def merge_updates(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Áp update `b` lên `a` như LangGraph áp vào state (field có reducer thì gộp, còn lại ghi đè)."""
+    out = dict(a)
+    for k, v in b.items():
+        out[k] = _REDUCERS[k](out[k], v) if k in _REDUCERS and k in out else v
+    return out
+
+
+def graph_node(node: str) -> str:
+    """Graph node chạy `node` của PIPELINE (lane chứa nó, hoặc chính nó)."""
+    return next((lane for lane, steps in LANES.items() if node in steps), node)
+
+
+def rework_entry(node: str) -> str:
+    """Graph node để chạy lại `node`: step đầu của lane -> cả lane (downstream trong lane chạy lại
+    theo), step giữa lane -> node riêng của step đó."""
+    lane = graph_node(node)
+    return lane if lane == node or LANES[lane][0] == node else node
+
+
+def _lane(name: str, steps: List[RunnableLambda]):
+    """Chạy các step tuần tự trong 1 task; step sau thấy state đã áp update của step trước."""
+
+    def run(state: ChatState) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for step in steps:
+            out = merge_updates(out, step.invoke(merge_updates(state, out)))
+        return out
+
+    async def arun(state: ChatState) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for step in steps:
+            out = merge_updates(out, await step.ainvoke(merge_updates(state, out)))
+        return out
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+
+def build_graph(checkpointer=None):
     g = StateGraph(ChatState)
 
     # === Nodes ===
     g.add_node("parse_input", n_parse_input)
+    g.add_node("resolve_entity", _node("resolve_entity", n_resolve_entity, an_resolve_entity))
     g.add_node("announce_tools", n_announce_tools)
-    g.add_node("company", n_company)
-    g.add_node("industry", n_industry)
-    g.add_node("financial_model", n_financial)
-    g.add_node("buyerlist", n_buyerlist)
-    g.add_node("decide_pbuyers", decide_pbuyers)   # NEW router
-    g.add_node("potential_buyers", n_buyers)
-    g.add_node("supervisor_qc", n_qc)
+    steps = {
+        "company":          _node("company", n_company, an_company),
+        "industry":         _node("industry", n_industry, an_industry),
+        "financial_model":  _node("financial_model", n_financial, an_financial),
+        "buyerlist":        _node("buyerlist", n_buyerlist, an_buyerlist),
+        "potential_buyers": _node("potential_buyers", n_buyers, an_buyers),
+    }
+    for lane, names in LANES.items():
+        for prev, step in zip(names, names[1:]):
+            if PIPELINE.get(step) != [prev]:
+                raise ValueError(f"lane {lane}: {step} must depend only on {prev}")
+        g.add_node(lane, _lane(lane, [steps[n] for n in names]))
+    # node riêng cho mọi node không nằm trong lane, và cho step giữa lane (chỉ dùng khi rework)
+    standalone = [n for n in steps if rework_entry(n) == n]
+    for n in standalone:
+        g.add_node(n, steps[n])
+    # defer: QC chỉ chạy khi không còn nhánh nào đang chạy (join cho cả vòng đầu lẫn vòng rework)
+    g.add_node("supervisor_qc", n_qc, defer=True)
     g.add_node("set_feedback", n_set_feedback)
     g.add_node("finalize", n_finalize)
 
     # === Edges ===
     g.add_edge(START, "parse_input")
-    g.add_edge("parse_input", "announce_tools")
-
-    # chạy song song từ announce_tools
-    g.add_edge("announce_tools", "company")
-    g.add_edge("announce_tools", "industry")
-    g.add_edge("announce_tools", "financial_model")   # song song với industry
-
-    # chuỗi tài chính -> buyerlist
-    g.add_edge("financial_model", "buyerlist")
-
-    # quyết định có chạy potential_buyers không
-    g.add_edge("buyerlist", "decide_pbuyers")
-    g.add_conditional_edges(
-        "decide_pbuyers",
-        lambda s: s.get("route", "skip"),
-        {"potential": "potential_buyers", "skip": "supervisor_qc"},
-    )
-
-    # nếu có chạy potential_buyers thì đi QC, còn không thì đã rẽ sang QC ở trên
-    g.add_edge("potential_buyers", "supervisor_qc")
+    g.add_edge("parse_input", "resolve_entity")
+    g.add_edge("resolve_entity", "announce_tools")
+
+    # nhánh dựng từ PIPELINE (edge trong cùng lane đã là thứ tự step). Join ở supervisor_qc là
+    # deferred node (không dùng barrier edge) vì vòng rework chỉ chạy lại một phần các nhánh.
+    edges = {(graph_node(dep), graph_node(node)) for node, deps in PIPELINE.items() for dep in deps}
+    # step giữa lane chạy riêng (rework) nối thẳng tới downstream của nó
+    edges |= {(dep, graph_node(node)) for node, deps in PIPELINE.items() for dep in deps
+              if dep in standalone and graph_node(dep) != dep and graph_node(node) != graph_node(dep)}
+    for src, dst in sorted(edges):
+        if src != dst:
+            g.add_edge(src, dst)
 
     # QC -> set_feedback (redo) hoặc finalize
     g.add_conditional_edges(
@@ -446,12 +870,21 @@ def build_graph():
         router,  # hàm router hiện có của bạn
         {"redo": "set_feedback", "end": "finalize"},
     )
-    g.add_edge("set_feedback", "company")
+    # redo: chỉ chạy lại (song song) các node bị flag + downstream qua edge sẵn có;
+    # section không bị flag giữ nguyên kết quả.
+    g.add_conditional_edges(
+        "set_feedback",
+        lambda s: [rework_entry(n) for n in s.get("rework_nodes") or []] or ["supervisor_qc"],
+        [*{rework_entry(n) for _, nodes in SECTIONS.values() for n in nodes}, "supervisor_qc"],
+    )
 
     g.add_edge("finalize", END)
 
-    return g.compile()
+    return g.compile(checkpointer=checkpointer)
 
 
-supervisor_graph = build_graph()
+# LangGraph API server (langgraph dev / platform) tự quản lý persistence + serializer, không dùng
+# checkpointer dưới đây (checkpoint server chỉ gọn nhờ state 1 bản/report). Chạy ngoài server
+# (batch, script) thì CHECKPOINT_DB=path bật checkpointer SQLite gọn (agents/checkpoint.py)
+supervisor_graph = build_graph(make_checkpointer() if os.getenv("CHECKPOINT_DB") else None)
 app = supervisor_graph
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# chạy pytest từ backend/ hoặc repo root đều import được `agents.*`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
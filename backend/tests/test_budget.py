@@ -0,0 +1,54 @@
+import pytest
+
+from agents import budget
+from agents.budget import count_tokens, trim_fields
+from agents.financial_model import _fallback_modeler_prompt, _narrative_prompt
+from agents.refresh import _refresh_prompt
+from agents.sources import Source
+
+
+@pytest.fixture(autouse=True)
+def approx_tokens(monkeypatch):
+    # chars / 4: không phụ thuộc tiktoken / mạng
+    monkeypatch.setenv("TOKEN_COUNT_APPROX", "true")
+    budget._encoding.cache_clear()
+    yield
+    budget._encoding.cache_clear()
+
+
+def test_trim_fields_under_budget_is_unchanged():
+    fields = {"a": "x" * 40, "b": "y" * 40}
+    assert trim_fields("t", fields, budget=1000) == fields
+
+
+def test_trim_fields_cuts_lowest_priority_first_and_respects_keep():
+    fields = {"main": "m\n" * 400, "extra": "e\n" * 400, "pinned": "p\n" * 400}
+    out = trim_fields("t", fields, priority={"extra": 1}, keep=("pinned",), budget=500)
+    assert out["pinned"] == fields["pinned"] and out["main"] == fields["main"]
+    assert "[truncated" in out["extra"]
+    assert sum(count_tokens(v) for v in out.values()) <= 500
+
+
+# dedent sau khi chèn dữ liệu nhiều dòng giữ lại lề của template -> prompt có thể nhỉnh hơn ngân sách vài %
+def test_narrative_prompt_keeps_table(monkeypatch):
+    monkeypatch.setenv("PROMPT_BUDGET_NARRATIVE", "400")
+    table = "| Scenario | Metric |\n" + "| Base | Revenue |\n" * 40
+    prompt = _narrative_prompt("Acme", '{"notes": "' + "n" * 4000 + '"}', table)
+    assert table in prompt
+    assert "[truncated" in prompt and count_tokens(prompt) <= 400 * 1.1
+
+
+def test_fallback_modeler_prompt_is_budgeted(monkeypatch):
+    monkeypatch.setenv("PROMPT_BUDGET_FALLBACK_MODELER", "300")
+    prompt = _fallback_modeler_prompt("Acme", "junk " * 2000)
+    assert "[truncated" in prompt and count_tokens(prompt) <= 300 * 1.1
+
+
+def test_refresh_prompt_trims_news_not_sections(monkeypatch):
+    monkeypatch.setenv("PROMPT_BUDGET_REFRESH", "500")
+    body = "- item [1]\n" * 60
+    news = [Source(n=i, url=f"https://news{i}.example.com/a", title=f"Story {i}", snippet="s" * 300)
+            for i in range(2, 30)]
+    prompt = _refresh_prompt(0.0, [("### Notable Updates", body)], news)
+    assert body.strip() in prompt
+    assert "[2]" in prompt and "[29]" not in prompt
@@ -0,0 +1,129 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from agents import buyerlist as bl
+from agents.buyerlist import (NEUTRAL_FIT, Bands, Candidate, band_fit, derive_bands, fit_scores, render_buyerlist,
+                              shortlist)
+from agents.projections import parse_assumptions
+from agents.universe import AcquirerUniverse
+
+
+def _assumptions(revenue="USD 10B"):
+    return parse_assumptions({
+        "base_year_revenue": revenue,
+        "scenarios": {"base": {"cagr": 0.10, "ebit_margin": 0.20},
+                      "bull": {"cagr": 0.20, "ebit_margin": 0.25},
+                      "bear": {"cagr": 0.02, "ebit_margin": 0.15}},
+    })
+
+
+class FakeLLM:
+    def __init__(self, content):
+        self.content, self.prompts = content, []
+
+    def invoke(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return type("Msg", (), {"content": self.content})()
+
+
+# ---------- bands ----------
+def test_derive_bands():
+    b = derive_bands(_assumptions())
+    assert b.growth == pytest.approx((0.02, 0.20))
+    assert b.margin == pytest.approx((0.15, 0.25))
+    assert b.min_revenue == pytest.approx(10e9 * bl.MIN_REVENUE_MULTIPLE)
+
+
+def test_derive_bands_unknown_revenue():
+    assert derive_bands(_assumptions("unknown")).min_revenue is None
+
+
+# ---------- scoring ----------
+def test_band_fit_edges():
+    x = np.array([0.10, 0.02, 0.20, 0.20 + 0.15 / 2, -0.5, math.nan])
+    assert band_fit(x, (0.02, 0.20), 0.15).tolist() == pytest.approx([100, 100, 100, 50, 0, NEUTRAL_FIT])
+
+
+def test_fit_scores_missing_metrics_are_neutral():
+    bands = Bands(growth=(0.0, 0.1), margin=(0.1, 0.2))
+    s = fit_scores(np.array([0.05, math.nan]), np.array([math.nan, 0.15]), np.array([math.nan, 120.0]), bands)
+    assert s["growth_fit"].tolist() == [100, NEUTRAL_FIT]
+    assert s["margin_fit"].tolist() == [NEUTRAL_FIT, 100]
+    assert s["adjacency"].tolist() == [NEUTRAL_FIT, 100]          # NaN -> trung tính, > 100 -> clip
+    w = bl.WEIGHTS
+    assert s["fit_score"].tolist() == pytest.approx([w[0] * 100 + w[1] * 50 + w[2] * 50,
+                                                     w[0] * 50 + w[1] * 100 + w[2] * 100])
+
+
+def test_render_ranks_and_flags_small_strategics():
+    a = _assumptions()
+    cands = [
+        Candidate("Far Co", "strategic", 100e9, 0.60, 0.60, 10),
+        Candidate("Close Co", "strategic", 100e9, 0.10, 0.20, 90),
+        Candidate("Small Co", "strategic", 5e9, 0.10, 0.20, 90),
+        Candidate("Fund", "financial", None, None, None, None, dry_powder=20e9),
+    ]
+    md = render_buyerlist(a, cands)
+    strategic = md.split("## Strategic")[1].split("## Financial")[0]
+    assert strategic.index("Close Co") < strategic.index("Far Co")
+    assert "(below band)" in strategic and "1 strategic candidate(s) are below" in md
+    # PE không có growth/margin/adjacency -> mọi thành phần trung tính
+    assert "| 1 | Fund | 50 | 50 | 50 | 50 | $20.00B dry powder |" in md
+    assert "## Assumptions & Caveats" in md
+
+
+# ---------- shortlist ----------
+def test_shortlist_empty_universe(monkeypatch):
+    monkeypatch.setattr(bl, "get_universe", lambda: AcquirerUniverse([]))
+    assert shortlist("Acme", _assumptions()) == []
+
+
+def test_shortlist_filters_by_band_and_ranks(monkeypatch):
+    rows = [
+        {"name": "Target Inc", "type": "strategic", "revenue_usd_b": "10", "revenue_growth": "0.1",
+         "ebit_margin": "0.2", "sectors": "widgets;software", "geography": "US"},
+        {"name": "Big Fit", "type": "strategic", "revenue_usd_b": "100", "revenue_growth": "0.1",
+         "ebit_margin": "0.2", "sectors": "widgets;software", "geography": "US"},
+        {"name": "Big Far", "type": "strategic", "revenue_usd_b": "100", "revenue_growth": "0.9",
+         "ebit_margin": "0.9", "sectors": "retail", "geography": "US"},
+        {"name": "Too Small", "type": "strategic", "revenue_usd_b": "5", "revenue_growth": "0.1",
+         "ebit_margin": "0.2", "sectors": "widgets", "geography": "US"},
+        {"name": "Rich Fund", "type": "financial", "dry_powder_usd_b": "50", "sectors": "software", "geography": "US"},
+        {"name": "Poor Fund", "type": "financial", "dry_powder_usd_b": "1", "sectors": "software", "geography": "US"},
+    ]
+    monkeypatch.setattr(bl, "get_universe", lambda: AcquirerUniverse(rows))
+    out = shortlist("Target Inc", _assumptions())
+    assert [c.name for c in out] == ["Big Fit", "Big Far", "Rich Fund"]
+    assert out[0].adjacency == pytest.approx(100.0) and out[1].adjacency == 0.0
+
+
+# ---------- public API ----------
+def test_fallback_without_assumptions_uses_llm_table(monkeypatch):
+    llm = FakeLLM("| Buyer | FitScore |\n|---|---|\n| X | 70 |")
+    monkeypatch.setattr(bl, "_llm", lambda: llm)
+    md = bl.run_buyerlist("Acme", "# Financial Model", '{"bad": 1}', assumptions=None)
+    assert md.startswith("| Buyer |") and md.endswith(bl._FALLBACK_NOTE)
+    assert '{"bad": 1}' in llm.prompts[0]
+
+
+def test_small_universe_falls_back_to_llm_candidates(monkeypatch):
+    monkeypatch.setattr(bl, "get_universe", lambda: AcquirerUniverse([]))
+    llm = FakeLLM(json.dumps([
+        {"name": "Alpha", "type": "strategic", "revenue_usd": "USD 80B", "revenue_growth": "12%",
+         "ebit_margin": "22%", "adjacency": 80, "rationale": "overlap"},
+        {"name": "Beta Capital", "type": "financial (PE)", "revenue_growth": None, "adjacency": 60},
+    ]))
+    monkeypatch.setattr(bl, "_llm", lambda: llm)
+    md = bl.run_buyerlist("Acme", "", "", assumptions=_assumptions().to_dict())
+    assert "TARGET PROFILE" in llm.prompts[0]
+    assert "| 1 | Alpha |" in md and "| 1 | Beta Capital |" in md
+
+
+def test_parse_candidates_out_of_range_rates_are_unknown():
+    [c] = bl.parse_candidates(json.dumps([
+        {"name": "Alpha", "revenue_growth": 12, "ebit_margin": 0.2, "adjacency": 50},
+    ]))
+    assert c.growth is None and c.margin == pytest.approx(0.2)
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from agents import cache as cache_mod
+from agents.cache import ResultCache, acached_call, cache_key, cached_call, normalize_company
+from agents.entity import entity_id
+
+
+class Clock:
+    def __init__(self, t=1_000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(cache_mod.time, "time", c)
+    return c
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    for name in ("RESULT_CACHE_DISABLED", "RESULT_CACHE_FORCE_REFRESH"):
+        monkeypatch.delenv(name, raising=False)
+    c = ResultCache(str(tmp_path / "results.sqlite"), ttl_s=60, max_entries=10)
+    monkeypatch.setattr(cache_mod, "_cache", c)
+    return c
+
+
+def _counting(value):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return value
+    return fn, calls
+
+
+# ---------- ResultCache ----------
+def test_ttl_expiry(cache, clock):
+    cache.put("k", {"md": "x"}, node="company")
+    clock.t += 60
+    assert cache.get("k") == {"md": "x"}
+    clock.t += 1
+    assert cache.get("k") is None
+    # entry hết hạn bị xoá khi get, peek cũng không thấy nữa
+    assert cache.peek("k") is None
+
+
+def test_ttl_zero_never_expires(tmp_path, clock):
+    c = ResultCache(str(tmp_path / "r.sqlite"), ttl_s=0, max_entries=10)
+    c.put("k", "v")
+    clock.t += 10 ** 9
+    assert c.get("k") == "v"
+
+
+def test_peek_returns_stale_entry_without_touching_it(cache, clock):
+    cache.put("k", "v")
+    clock.t += 120
+    assert cache.peek("k") == ("v", 1_000.0)
+    assert cache.get("k") is None
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path, clock):
+    c = ResultCache(str(tmp_path / "r.sqlite"), ttl_s=0, max_entries=2)
+    c.put("a", 1)
+    clock.t += 1
+    c.put("b", 2)
+    clock.t += 1
+    assert c.get("a") == 1          # a mới được truy cập -> b là LRU
+    clock.t += 1
+    c.put("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+
+
+# ---------- key normalization ----------
+def test_normalize_company():
+    assert normalize_company("  NVIDIA  Corp. ") == "nvidia corp"
+    assert cache_key("company", "NVIDIA Corp.") == cache_key("company", " nvidia  corp")
+
+
+def test_key_separates_node_feedback_and_model():
+    base = cache_key("company", "nvidia", "", "m1")
+    assert base != cache_key("industry", "nvidia", "", "m1")
+    assert base != cache_key("company", "nvidia", "fix sources", "m1")
+    assert base != cache_key("company", "nvidia", "", "m2")
+
+
+def test_name_variants_share_one_entry(cache):
+    # main.py key theo card.id (entity_id) -> "nvidia" và "NVIDIA Corp" dùng chung entry
+    fn, calls = _counting("# NVIDIA report")
+    assert cached_call("company", entity_id("nvidia"), "", fn) == "# NVIDIA report"
+    assert cached_call("company", entity_id("NVIDIA Corp"), "", fn) == "# NVIDIA report"
+    assert len(calls) == 1
+
+
+# ---------- cached_call / acached_call ----------
+def test_cached_call_hit_and_force_refresh(cache):
+    fn, calls = _counting({"markdown": "# M"})
+    cached_call("financial", "acme", "", fn)
+    cached_call("financial", "acme", "", fn)
+    assert len(calls) == 1
+    cached_call("financial", "acme", "", fn, force_refresh=True)
+    assert len(calls) == 2
+
+
+def test_tool_errors_are_not_cached(cache):
+    fn, calls = _counting("partial report [tool_error] tavily quota exceeded")
+    cached_call("company", "acme", "", fn)
+    cached_call("company", "acme", "", fn)
+    assert len(calls) == 2
+    assert cache.peek(cache_key("company", "acme")) is None
+
+
+def test_disabled_bypasses_cache(cache, monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_DISABLED", "true")
+    fn, calls = _counting("v")
+    cached_call("company", "acme", "", fn)
+    cached_call("company", "acme", "", fn)
+    assert len(calls) == 2
+    assert cache.peek(cache_key("company", "acme")) is None
+
+
+def test_acached_call(cache):
+    calls = []
+
+    async def afn(value):
+        calls.append(value)
+        return value
+
+    async def main():
+        first = await acached_call("buyers", "acme", "", lambda: afn("# B"))
+        second = await acached_call("buyers", "ACME", "", lambda: afn("# other"))
+        errored = await acached_call("buyers", "beta", "", lambda: afn("[tool_error] x"))
+        return first, second, errored
+
+    assert asyncio.run(main()) == ("# B", "# B", "[tool_error] x")
+    assert calls == ["# B", "[tool_error] x"]
+    assert cache.peek(cache_key("buyers", "beta")) is None
@@ -0,0 +1,147 @@
+import operator
+from typing import Annotated, List, TypedDict
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from agents.checkpoint import BlobSerializer, BlobStore, SQLiteSaver, make_checkpointer
+
+REPORT = "# Report\n" + "lorem ipsum dolor sit amet " * 200   # > CHECKPOINT_BLOB_MIN_CHARS
+
+
+def _blob_count(saver: SQLiteSaver) -> int:
+    return saver._conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+
+
+def _put(saver: SQLiteSaver, thread: str, values: dict, parent: str = None, **metadata):
+    cp = empty_checkpoint()
+    cp["channel_values"] = values
+    cp["channel_versions"] = {k: saver.get_next_version(None, None) for k in values}
+    config = {"configurable": {"thread_id": thread, "checkpoint_ns": "", "checkpoint_id": parent}}
+    return saver.put(config, cp, {"source": "loop", "step": 0, **metadata}, cp["channel_versions"])
+
+
+class State(TypedDict, total=False):
+    messages: Annotated[List, add_messages]
+    report: str
+    steps: Annotated[List[str], operator.add]
+
+
+def _graph(saver):
+    g = StateGraph(State)
+    g.add_node("write", lambda s: {"report": REPORT, "messages": [AIMessage(REPORT)], "steps": ["write"]})
+    g.add_node("review", lambda s: {"messages": [AIMessage("ok")], "steps": ["review"]})
+    g.add_edge(START, "write")
+    g.add_edge("write", "review")
+    g.add_edge("review", END)
+    return g.compile(checkpointer=saver)
+
+
+def test_graph_roundtrip_and_resume(tmp_path):
+    path = str(tmp_path / "cp.sqlite")
+    config = {"configurable": {"thread_id": "t1"}}
+    _graph(SQLiteSaver(path)).invoke({"messages": [HumanMessage("go")]}, config)
+
+    # process mới: đọc lại từ file, không dựa vào cache nóng
+    state = _graph(SQLiteSaver(path)).get_state(config)
+    assert state.values["report"] == REPORT
+    assert state.values["messages"][1].content == REPORT
+    assert state.values["steps"] == ["write", "review"]
+    assert len(list(SQLiteSaver(path).list(config))) >= 3
+
+
+def test_same_report_stored_once():
+    saver = SQLiteSaver(":memory:")
+    graph = _graph(saver)
+    for thread in ("a", "b"):
+        graph.invoke({"messages": [HumanMessage("go")]}, {"configurable": {"thread_id": thread}})
+    # report nằm ở field + message, qua mọi superstep và 2 thread: 1 blob
+    assert _blob_count(saver) == 1
+    raw = saver._conn.execute("SELECT SUM(LENGTH(value)) FROM channel_values").fetchone()[0]
+    assert raw < len(REPORT)
+
+
+def test_vacuum_then_reput_survives_restart(tmp_path):
+    path = str(tmp_path / "cp.sqlite")
+    saver = SQLiteSaver(path)
+    _put(saver, "t1", {"report": REPORT})
+    saver.delete_thread("t1")
+    assert saver.vacuum_blobs() == 1
+    assert _blob_count(saver) == 0
+
+    cfg = _put(saver, "t2", {"report": REPORT})
+    assert _blob_count(saver) == 1
+    # như restart process: cache nóng rỗng
+    assert SQLiteSaver(path).get_tuple(cfg).checkpoint["channel_values"]["report"] == REPORT
+
+
+def test_vacuum_keeps_live_blobs():
+    saver = SQLiteSaver(":memory:")
+    _put(saver, "t1", {"report": REPORT})
+    _put(saver, "t2", {"report": REPORT})
+    saver.delete_thread("t1")
+    assert saver.vacuum_blobs() == 0
+    assert _blob_count(saver) == 1
+
+
+def test_failed_put_rolls_back_blobs(tmp_path):
+    path = str(tmp_path / "cp.sqlite")
+    saver = SQLiteSaver(path)
+    cp = empty_checkpoint()
+    cp["channel_values"] = {"report": REPORT, "bad": object()}   # không serialize được
+    cp["channel_versions"] = {"report": "1", "bad": "1"}
+    with pytest.raises(Exception):
+        saver.put({"configurable": {"thread_id": "t", "checkpoint_ns": ""}}, cp, {}, cp["channel_versions"])
+    assert _blob_count(saver) == 0
+
+    cfg = _put(saver, "t", {"report": REPORT})
+    assert SQLiteSaver(path).get_tuple(cfg).checkpoint["channel_values"]["report"] == REPORT
+
+
+def test_put_writes_roundtrip():
+    saver = SQLiteSaver(":memory:")
+    cfg = _put(saver, "t", {"x": 1})
+    saver.put_writes(cfg, [("report", REPORT), ("x", 2)], task_id="task")
+    saver.put_writes(cfg, [("report", "other")], task_id="task")   # write thường giữ bản đầu
+    writes = saver.get_tuple(cfg).pending_writes
+    assert writes == [("task", "report", REPORT), ("task", "x", 2)]
+
+
+def test_list_filter_before_limit():
+    saver = SQLiteSaver(":memory:")
+    ids = []
+    parent = None
+    for step in range(4):
+        cfg = _put(saver, "t", {"n": step}, parent=parent, step=step, source="input" if step == 0 else "loop")
+        parent = cfg["configurable"]["checkpoint_id"]
+        ids.append(parent)
+    _put(saver, "other", {"n": 0})
+
+    thread = {"configurable": {"thread_id": "t"}}
+    assert [c.config["configurable"]["checkpoint_id"] for c in saver.list(thread)] == ids[::-1]
+    assert len(list(saver.list(None))) == 5
+    assert [c.metadata["step"] for c in saver.list(thread, filter={"source": "loop"})] == [3, 2, 1]
+    assert [c.metadata["step"] for c in saver.list(thread, filter={"source": "loop"}, limit=2)] == [3, 2]
+    before = {"configurable": {"thread_id": "t", "checkpoint_id": ids[2]}}
+    assert [c.metadata["step"] for c in saver.list(thread, before=before)] == [1, 0]
+    latest = saver.get_tuple(thread)
+    assert latest.checkpoint["channel_values"] == {"n": 3}
+    assert latest.parent_config["configurable"]["checkpoint_id"] == ids[2]
+
+
+def test_blob_serializer_in_memory():
+    serde = BlobSerializer(BlobStore(), min_chars=10)
+    value = {"a": "x" * 20, "m": [AIMessage("y" * 20)], "l": ["z" * 20, 1], "short": "s"}
+    typ, data = serde.dumps_typed(value)
+    assert b"x" * 20 not in data
+    assert serde.loads_typed((typ, data)) == value
+
+
+def test_make_checkpointer(monkeypatch, tmp_path):
+    monkeypatch.delenv("CHECKPOINT_DB", raising=False)
+    assert isinstance(make_checkpointer().serde, BlobSerializer)
+    monkeypatch.setenv("CHECKPOINT_DB", str(tmp_path / "x.sqlite"))
+    assert isinstance(make_checkpointer(), SQLiteSaver)
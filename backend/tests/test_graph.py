@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def timeline(monkeypatch):
+    """Node giả: company chậm (1 s), financial_model nhanh; ghi lúc buyerlist bắt đầu / company xong."""
+    events = {}
+
+    def fake(field, delay, start=None, end=None):
+        async def run(state):
+            if start:
+                events[start] = time.perf_counter()
+            await asyncio.sleep(delay)
+            if end:
+                events[end] = time.perf_counter()
+            return {field: f"{field} text"}
+        return run
+
+    monkeypatch.setattr(main, "an_resolve_entity", lambda state: asyncio.sleep(0, {}))
+    monkeypatch.setattr(main, "an_company", fake("company_report", 1.0, end="company_done"))
+    monkeypatch.setattr(main, "an_industry", fake("industry_report", 0.05))
+    monkeypatch.setattr(main, "an_financial", fake("financial_model", 0.1))
+    monkeypatch.setattr(main, "an_buyers", fake("potential_buyers", 0.05))
+    monkeypatch.setattr(main, "an_buyerlist", fake("buyerlist", 0.05, start="buyerlist_start"))
+    monkeypatch.setattr(main, "MAX_ROUNDS", 0)
+    return events
+
+
+def test_buyerlist_starts_before_slow_sibling_finishes(timeline):
+    graph = main.build_graph()
+    out = asyncio.run(graph.ainvoke({"input": "Acme Corp"}))
+    assert timeline["buyerlist_start"] < timeline["company_done"] - 0.5
+    assert out["financial_model"] == "financial_model text"
+    assert out["buyerlist"] == "buyerlist text"
+
+
+def test_lane_layout():
+    assert main.graph_node("buyerlist") == "financial_lane"
+    assert main.rework_entry("financial_model") == "financial_lane"
+    assert main.rework_entry("buyerlist") == "buyerlist"
+    assert main.rework_entry("company") == "company"
+    # buyers flagged -> potential_buyers + buyerlist riêng; financial flagged -> cả lane
+    assert main.rework_targets(["buyers"]) == ["potential_buyers", "buyerlist"]
+    assert main.rework_targets(["financial", "buyers"]) == ["financial_model", "potential_buyers"]
+
+
+def test_merge_updates_uses_state_reducers():
+    a = {"spans": [1], "qc_json": {"a": 1}, "financial_model": "x"}
+    b = {"spans": [2], "qc_json": {"b": 2}, "financial_model": "y"}
+    assert main.merge_updates(a, b) == {"spans": [1, 2], "qc_json": {"a": 1, "b": 2}, "financial_model": "y"}
+
+
+def test_swarms_search_by_name_and_get_entity_block(monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_DISABLED", "true")
+    seen = {}
+
+    def swarm(company, feedback=None, *, entity=""):
+        seen.update(company=company, entity=entity)
+        return {"markdown": "# Financial Model", "assumptions_json": "", "assumptions": None}
+
+    monkeypatch.setattr(main, "run_financial_swarm", swarm)
+    card = {"id": "nvidia", "name": "NVIDIA Corporation", "ticker": "NVDA", "exchange": "NASDAQ",
+            "domain": "nvidia.com", "resolved_by": "seed"}
+    main.n_financial({"company_query": "nvda", "entity": card})
+    assert seen["company"] == "NVIDIA Corporation"
+    assert "RESOLVED ENTITY" in seen["entity"] and "Ticker: NVDA" in seen["entity"]
@@ -0,0 +1,93 @@
+import pytest
+
+from agents.projections import CAGR_RANGE, AssumptionsError, _rate, parse_assumptions, parse_rate, parse_usd
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1%", 0.01),
+    ("0.5%", 0.005),
+    ("1.5%", 0.015),
+    ("-1%", -0.01),
+    (" 25 % ", 0.25),
+    (2.0, 2.0),        # số trần luôn là thập phân: CAGR 200% hợp lệ
+    ("2", 2.0),
+    (0.12, 0.12),
+    ("0.12", 0.12),
+    (-0.05, -0.05),
+])
+def test_rate(value, expected):
+    assert _rate(value, "x", CAGR_RANGE) == pytest.approx(expected)
+
+
+def test_parse_rate_does_not_guess_percent():
+    assert parse_rate(12) == 12.0
+    assert parse_rate("12%") == pytest.approx(0.12)
+
+
+@pytest.mark.parametrize("value", [None, "n/a", "", True])
+def test_rate_rejects_non_numbers(value):
+    with pytest.raises(AssumptionsError):
+        _rate(value, "x", CAGR_RANGE)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("USD 60.9B", 60.9e9),
+    ("$26.97 billion", 26.97e9),
+    ("FY2024 revenue $60.9B", 60.9e9),
+    ("1,234 million", 1.234e9),
+    (6.09e10, 6.09e10),
+    ("FY2024 revenue: 60.9", 60.9),
+    ("60.9", 60.9),
+])
+def test_parse_usd(value, expected):
+    assert parse_usd(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("value", ["unknown", "FY2024", "2023-2024", None, 0, -5, True])
+def test_parse_usd_none(value):
+    assert parse_usd(value) is None
+
+
+def _scenarios(bear_cagr="-1%"):
+    return {
+        "base": {"cagr": "1%", "ebit_margin": "20%"},
+        "bull": {"cagr": "1.5%", "ebit_margin": 0.25},
+        "bear": {"cagr": bear_cagr, "ebit_margin": "10%"},
+    }
+
+
+def test_parse_assumptions_percent_strings():
+    a = parse_assumptions({"base_year_revenue": "USD 10B", "scenarios": _scenarios()})
+    assert a.base_year_revenue == pytest.approx(10e9)
+    assert a.scenarios["base"].cagr == pytest.approx(0.01)
+    assert a.scenarios["bull"].cagr == pytest.approx(0.015)
+    assert a.scenarios["bear"].cagr == pytest.approx(-0.01)
+    assert a.scenarios["bear"].ebit_margin == pytest.approx(0.10)
+
+
+def test_parse_assumptions_from_text_roundtrip():
+    text = '```json\n{"base_year_revenue": "unknown", "scenarios": {"base": {"cagr": 0.1, "ebit_margin": 0.2},' \
+           ' "Bull": {"cagr": 0.2, "ebit_margin": 0.3}, "bear": {"cagr": 0.0, "ebit_margin": 0.1}}, "notes": ["[1]"]}\n```'
+    a = parse_assumptions(text)
+    assert a.base_year_revenue is None
+    assert a.notes == ["[1]"]
+    assert type(a).from_dict(a.to_dict()) == a
+
+
+@pytest.mark.parametrize("obj, match", [
+    ("no json here", "no JSON"),
+    ({"scenarios": []}, "scenarios"),
+    ({"scenarios": {"base": {"cagr": 0.1, "ebit_margin": 0.2}}}, "missing scenario 'bull'"),
+    ({"scenarios": {**_scenarios(), "bear": {"cagr": "-95%", "ebit_margin": 0.1}}}, "bear.cagr out of range"),
+    # số trần không có '%' không bị đoán là phần trăm
+    ({"scenarios": {**_scenarios(), "base": {"cagr": 12, "ebit_margin": 0.2}}}, "base.cagr out of range: 12.0"),
+    ({"scenarios": {**_scenarios(), "bear": {"cagr": 0.0, "ebit_margin": 10}}}, "bear.ebit_margin out of range"),
+])
+def test_parse_assumptions_errors(obj, match):
+    with pytest.raises(AssumptionsError, match=match):
+        parse_assumptions(obj)
+
+
+def test_parse_assumptions_keeps_bare_fraction_above_one():
+    a = parse_assumptions({"scenarios": {**_scenarios(), "bull": {"cagr": 2.0, "ebit_margin": 0.25}}})
+    assert a.scenarios["bull"].cagr == 2.0
@@ -0,0 +1,207 @@
+import pytest
+
+from agents.deadline import MISSING
+from agents.qc import Issue, QCResult, check_section, parse_number, parse_tables
+
+FILLER = " ".join(["word"] * 300)
+
+COMPANY = f"""# Acme Corp
+## Company Card
+Acme makes widgets [1]. {FILLER}
+## Products/Services
+Widgets [2].
+## Financials
+Revenue grew [1].
+## Technology
+## Market & Competition
+## Risks
+## Leadership
+## Notable Updates
+## Conclusion
+## Sources
+- [1] Acme IR: https://acme.example/ir
+- [2] News: https://news.example/acme
+"""
+
+INDUSTRY = f"""# Widgets
+## Company & Industry Identification
+Acme is a widget maker [1]. {FILLER}
+## Recent Trends
+Consolidation [1].
+## Industry M&A History
+| Date | Acquirer | Target | Value | Status | Rationale | Source |
+|------|----------|--------|-------|--------|-----------|--------|
+| 2024-03 | Big Co | Small Co | $1.2B | Closed | scale | [1] |
+## Risks
+## Outlook
+## Sources
+- [1] Deal news: https://news.example/deal
+"""
+
+PROJECTION = """# Financial Model
+Scenario table below explains the Base, Bull and Bear cases with revenue, EBIT and EBIT margin for
+each year of the three year horizon, computed from the validated assumptions.
+
+| Scenario | Metric | Year0 | Year1 | Year2 | Year3 |
+|---|---|---|---|---|---|
+| Base | Revenue | $100B | $110B | $121B | $133.1B |
+| Base | EBIT | $20B | $22B | $24.2B | {ebit3} |
+| Base | EBIT Margin | 20% | 20% | 20% | 20% |
+
+### Sanity notes
+- computed locally
+"""
+
+BUYERS = """# Potential Buyers
+## Strategic
+- Big Co — adjacent products and shared customers [1]. Fit Score: 85
+- Other Co — geographic expansion into Asia and overlap [2]. Fit Score: {score}
+## Financial (PE)
+- Fund A — buy-and-build platform with roll-up strategy in the sector [1]. Fit Score: 70
+## Assumptions & Caveats
+- Scores are indicative and based on public sources only; they assume current valuations and financing conditions
+  remain broadly stable over the next twelve months and that no regulatory objections arise for the strategic buyers.
+"""
+
+
+def checks(result: QCResult):
+    return {i.check for i in result.issues if i.penalty > 0}
+
+
+# ---------- parse ----------
+@pytest.mark.parametrize("cell, expected", [
+    ("$1.25B", 1.25e9), ("12.5%", 0.125), ("1,234.5", 1234.5), ("-3M", -3e6), ("n/a", None),
+])
+def test_parse_number(cell, expected):
+    assert parse_number(cell) == (pytest.approx(expected) if expected is not None else None)
+
+
+def test_parse_tables_detects_malformed_rows():
+    md = "## T\n| a | b |\n|---|---|\n| 1 | 2 |\n| 3 |\n"
+    (table,) = parse_tables(md)
+    assert table.heading == "t" and table.header == ["a", "b"] and not table.well_formed
+
+
+# ---------- clean fixtures ----------
+@pytest.mark.parametrize("section, text", [
+    ("company", COMPANY), ("industry", INDUSTRY), ("financial", PROJECTION.format(ebit3="$26.62B")),
+])
+def test_well_formed_sections_pass(section, text):
+    r = check_section(section, text)
+    assert r.score == 1.0 and not r.needs_rework(0.8), r.issues
+
+
+def test_buyers_pass_with_known_registry():
+    r = check_section("buyers", BUYERS.format(score=60), known=[1, 2])
+    assert r.score == 1.0, r.issues
+
+
+# ---------- special states ----------
+def test_tool_error_always_reworks():
+    r = check_section("company", COMPANY + "\n[tool_error] boom")
+    assert checks(r) == {"tool_error"} and r.needs_rework(0.0)
+    assert "upstream error" in r.feedback()
+
+
+def test_deadline_and_skipped_are_not_reworked():
+    late = check_section("company", f"{MISSING} Not completed.")
+    skipped = check_section("buyers", "Skipped: no web search provider configured.")
+    assert late.score == 0.0 and not late.needs_rework(0.8)
+    assert skipped.score == 1.0 and not skipped.needs_rework(0.8)
+
+
+def test_empty_section():
+    r = check_section("industry", "  ")
+    assert checks(r) == {"length"} and r.needs_rework(0.8)
+
+
+# ---------- headings ----------
+def test_missing_headings():
+    text = COMPANY.replace("## Leadership\n", "").replace("## Conclusion\n", "")
+    r = check_section("company", text)
+    (issue,) = r.issues
+    assert issue.check == "headings" and "Leadership, Conclusion" in issue.message
+
+
+def test_translated_headings_are_not_compared():
+    titles = ["Thẻ công ty", "Sản phẩm", "Tài chính", "Công nghệ", "Thị trường", "Rủi ro", "Lãnh đạo",
+              "Cập nhật", "Kết luận", "Nguồn"]
+    text = "\n".join(f"## {t}\nNội dung [1]. {FILLER if i == 0 else ''}" for i, t in enumerate(titles))
+    text += "\n- [1] Nguồn: https://x.example\n"
+    assert "headings" not in checks(check_section("company", text))
+
+
+# ---------- citations ----------
+def test_dangling_and_unused_citations():
+    text = COMPANY.replace("Revenue grew [1].", "Revenue grew [1, 9].").replace("Widgets [2].", "Widgets.")
+    r = check_section("company", text)
+    dangling = [i for i in r.issues if "[9]" in i.message]
+    unused = [i for i in r.issues if "never cited" in i.message]
+    assert dangling and dangling[0].fixable
+    assert unused and unused[0].penalty == 0 and not unused[0].fixable
+
+
+def test_missing_sources_list():
+    text = COMPANY.split("## Sources")[0]
+    assert any("Sources list" in i.message for i in check_section("company", text).issues)
+
+
+def test_registry_citations():
+    text = BUYERS.format(score=60)
+    assert "citations" in checks(check_section("buyers", text, known=[1]))      # [2] dangling
+    assert "citations" not in checks(check_section("buyers", text, known=[]))   # run không có nguồn
+
+
+# ---------- tables ----------
+def test_industry_table_missing_and_malformed():
+    no_table = INDUSTRY.split("| Date")[0] + "## Risks\n## Outlook\n## Sources\n- [1] x: https://x.example\n"
+    assert any("Add the required table" in i.message for i in check_section("industry", no_table).issues)
+
+    missing_cols = INDUSTRY.replace("| Status | Rationale |", "| Notes | Rationale |")
+    assert any("missing columns: Status" in i.message for i in check_section("industry", missing_cols).issues)
+
+    broken = INDUSTRY.replace("| 2024-03 | Big Co | Small Co | $1.2B | Closed | scale | [1] |",
+                              "| 2024-03 | Big Co | Small Co | $1.2B | [1] |")
+    assert any("malformed" in i.message for i in check_section("industry", broken).issues)
+
+
+def test_deal_dates_need_a_year():
+    text = INDUSTRY.replace("| 2024-03 |", "| recently |")
+    assert any("no parseable Date" in i.message for i in check_section("industry", text).issues)
+
+
+# ---------- numbers ----------
+def test_projection_arithmetic():
+    r = check_section("financial", PROJECTION.format(ebit3="$30B"))
+    (issue,) = r.issues
+    assert issue.check == "numbers" and "Base" in issue.message and issue.penalty == 0.25
+
+
+def test_fit_scores():
+    out_of_range = check_section("buyers", BUYERS.format(score=140), known=[1, 2])
+    assert any("between 0 and 100" in i.message for i in out_of_range.issues)
+    no_scores = check_section("buyers", BUYERS.replace("Fit Score", "Score").format(score=1), known=[1, 2])
+    assert any("Give every buyer a Fit Score" in i.message for i in no_scores.issues)
+
+
+def test_buyer_groups_and_caveats():
+    text = BUYERS.format(score=60).replace("## Financial (PE)\n- Fund A — buy-and-build", "- Fund A — buy-and-build")
+    text = text.replace("## Assumptions & Caveats", "## Notes")
+    msgs = " ".join(i.message for i in check_section("buyers", text, known=[1, 2]).issues)
+    assert "Financial (PE)" in msgs and "Assumptions & Caveats" in msgs
+
+
+# ---------- threshold / fixable ----------
+def test_needs_rework_requires_fixable_issue_below_threshold():
+    fixable = QCResult("x", 0.7, [Issue("table", "fix table", 0.3)])
+    unfixable = QCResult("x", 0.7, [Issue("deadline", "late", 0.3, fixable=False)])
+    assert fixable.needs_rework(0.8) and not fixable.needs_rework(0.7)
+    assert not unfixable.needs_rework(0.8)
+    assert unfixable.feedback() == ""
+    assert fixable.feedback().endswith("- fix table")
+
+
+def test_score_is_clamped_and_feedback_lists_fixes():
+    r = check_section("industry", "# Widgets\nshort text without anything")
+    assert r.score == 0.0 and r.needs_rework(0.8)
+    assert r.feedback().startswith("Fix these issues")
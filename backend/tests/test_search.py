@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agents import deadline, search
+
+
+@pytest.fixture(autouse=True)
+def _isolated(monkeypatch):
+    monkeypatch.setenv("TAVILY_API_KEY", "test")
+    monkeypatch.setenv("SEARCH_CACHE_DISABLED", "true")
+    monkeypatch.setattr(search, "limiter_for", lambda *a: None)
+    search._memo.clear()
+    yield
+    search._memo.clear()
+
+
+def test_follower_retries_when_leader_aborts(monkeypatch):
+    calls = []
+    started = threading.Event()
+
+    def post(payload, timeout=60):
+        calls.append(payload["query"])
+        if len(calls) == 1:
+            started.set()
+            time.sleep(0.2)
+            raise deadline.DeadlineExceeded("leader deadline")
+        return {"results": [{"url": "u"}]}
+
+    monkeypatch.setattr(search, "_post_search_once", post)
+    out = {}
+
+    def leader():
+        with pytest.raises(deadline.DeadlineExceeded):
+            search._search("q", 3, "general", False)
+
+    t = threading.Thread(target=leader)
+    t.start()
+    started.wait(1)
+    out["follower"] = search._search("q", 3, "general", False)
+    t.join()
+    assert out["follower"] == ({"results": [{"url": "u"}]}, "http")
+    assert len(calls) == 2
+
+
+def test_follower_wait_is_bounded_by_deadline(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def post(payload, timeout=60):
+        started.set()
+        release.wait(2)
+        return {"results": []}
+
+    monkeypatch.setattr(search, "_post_search_once", post)
+    t = threading.Thread(target=search._search, args=("slow", 3, "general", False))
+    t.start()
+    started.wait(1)
+    t0 = time.time()
+    with deadline.use_deadline(time.time() + 0.1):
+        with pytest.raises(deadline.DeadlineExceeded):
+            search._search("slow", 3, "general", False)
+    assert time.time() - t0 < 1
+    release.set()
+    t.join()
+
+
+def test_async_follower_retries_when_leader_cancelled(monkeypatch):
+    calls = []
+
+    async def apost(payload, timeout=60):
+        calls.append(payload["query"])
+        if len(calls) == 1:
+            await asyncio.sleep(1)
+        return {"results": [{"url": "u"}]}
+
+    monkeypatch.setattr(search, "_apost_search_once", apost)
+
+    async def main():
+        leader = asyncio.create_task(search._asearch("aq", 3, "general", False))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(search._asearch("aq", 3, "general", False))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == ({"results": [{"url": "u"}]}, "http")
+    assert len(calls) == 2
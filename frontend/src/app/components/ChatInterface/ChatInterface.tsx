@@ -11,7 +11,7 @@ import type { SubAgent, TodoItem, ToolCall } from "../../types/types";
 import { useChat } from "../../hooks/useChat";
 import styles from "./ChatInterface.module.scss";
 import { Message } from "@langchain/langgraph-sdk";
-import { extractStringFromMessageContent } from "../../utils/utils";
+import { extractStringFromMessageContent, resolveMessageText } from "../../utils/utils";
 
 interface ChatInterfaceProps {
   threadId: string | null;
@@ -38,7 +38,7 @@ export const ChatInterface = React.memo<ChatInterfaceProps>(function ChatInterfa
   const [isThreadHistoryOpen, setIsThreadHistoryOpen] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
-  const { messages, isLoading, sendMessage, stopStream } = useChat(
+  const { messages, values, isLoading, sendMessage, stopStream, getStreamToolCallId } = useChat(
     threadId, setThreadId, onTodosUpdate, onFilesUpdate,
   );
 
@@ -76,9 +76,19 @@ export const ChatInterface = React.memo<ChatInterfaceProps>(function ChatInterfa
     const ensureId = (v?: string) =>
       v || (globalThis.crypto?.randomUUID?.() ?? `tool-${Math.random().toString(36).slice(2)}`);
 
+    // token LLM đang stream của từng tool (không render thành bubble riêng)
+    const partials = new Map<string, string[]>();
+
     messages.forEach((m: Message) => {
       // AI => tìm tool_use / tool_calls để tạo pending
       if (m.type === "ai") {
+        const streamToolId = getStreamToolCallId(m);
+        if (streamToolId) {
+          const text = extractStringFromMessageContent(m);
+          if (text.trim()) partials.set(streamToolId, [...(partials.get(streamToolId) ?? []), text]);
+          return;
+        }
+
         const tcs: any[] = [];
         if (m.additional_kwargs?.tool_calls && Array.isArray(m.additional_kwargs.tool_calls)) {
           tcs.push(...m.additional_kwargs.tool_calls);
@@ -97,7 +107,12 @@ export const ChatInterface = React.memo<ChatInterfaceProps>(function ChatInterfa
           return { id, name, args, status: "pending", startedAt: now };
         });
 
-        map.set(m.id!, { message: m, toolCalls });
+        // AIMessage cuối (report) chỉ mang ref -> ghép nội dung từ thread state để render
+        const message =
+          toolCalls.length === 0 && (m as any).additional_kwargs?.report
+            ? ({ ...m, content: resolveMessageText(m, values) } as Message)
+            : m;
+        map.set(m.id!, { message, toolCalls });
         return;
       }
 
@@ -117,7 +132,7 @@ export const ChatInterface = React.memo<ChatInterfaceProps>(function ChatInterfa
           data.toolCalls[idx] = {
             ...data.toolCalls[idx],
             status: "completed",
-            result: extractStringFromMessageContent(m),
+            result: resolveMessageText(m, values),
             elapsedMs: typeof elapsedFromBackend === "number" ? elapsedFromBackend : elapsedFromTimer,
           };
           delete toolTimers.current[tcid];
@@ -132,12 +147,22 @@ export const ChatInterface = React.memo<ChatInterfaceProps>(function ChatInterfa
       }
     });
 
+    if (partials.size > 0) {
+      for (const [, data] of map.entries()) {
+        data.toolCalls = data.toolCalls.map((t) =>
+          t.status === "pending" && partials.has(t.id)
+            ? { ...t, partial: partials.get(t.id)!.join("\n\n") }
+            : t,
+        );
+      }
+    }
+
     const arr = Array.from(map.values());
     return arr.map((d, i) => {
       const prev = i > 0 ? arr[i - 1].message : null;
       return { ...d, showAvatar: d.message.type !== prev?.type };
     });
-  }, [messages]);
+  }, [messages, values, getStreamToolCallId]);
 
   return (
     <div className={styles.container}>
@@ -85,6 +85,7 @@ export const ToolCallBox = React.memo<ToolCallBoxProps>(({ toolCall, isStreaming
 
   const hasArgs = toolCall.args && Object.keys(toolCall.args || {}).length > 0;
   const hasResult = !!toolCall.result;
+  const hasPartial = !hasResult && !!toolCall.partial;
 
   return (
     <div className={styles.container}>
@@ -93,7 +94,7 @@ export const ToolCallBox = React.memo<ToolCallBoxProps>(({ toolCall, isStreaming
         size="sm"
         onClick={toggle}
         className={styles.header}
-        disabled={!hasArgs && !hasResult}
+        disabled={!hasArgs && !hasResult && !hasPartial}
       >
         <div className={styles.headerLeft}>
           {open ? <ChevronDown size={14} /> : <ChevronRight size={14} />}
@@ -105,7 +106,7 @@ export const ToolCallBox = React.memo<ToolCallBoxProps>(({ toolCall, isStreaming
         </div>
       </Button>
 
-      {open && (hasArgs || hasResult) && (
+      {open && (hasArgs || hasResult || hasPartial) && (
         <div className={styles.content}>
           {hasArgs && (
             <div className={styles.section}>
@@ -113,6 +114,12 @@ export const ToolCallBox = React.memo<ToolCallBoxProps>(({ toolCall, isStreaming
               <pre className={styles.codeBlock}>{JSON.stringify(toolCall.args, null, 2)}</pre>
             </div>
           )}
+          {hasPartial && (
+            <div className={styles.section}>
+              <h4 className={styles.sectionTitle}>Streaming…</h4>
+              <pre className={styles.codeBlock}>{toolCall.partial}</pre>
+            </div>
+          )}
           {hasResult && (
             <div className={styles.section}>
               <h4 className={styles.sectionTitle}>Result</h4>
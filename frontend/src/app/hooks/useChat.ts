@@ -17,6 +17,9 @@ type GraphState = {
 
   // để submit { input: string } không lỗi kiểu
   input?: string;
+
+  // report của từng section (bản duy nhất); ToolMessage / AIMessage cuối chỉ giữ ref tới các field này
+  [field: string]: unknown;
 };
 
 export function useChat(
@@ -74,10 +77,25 @@ export function useChat(
 
   const stopStream = useCallback(() => stream.stop(), [stream]);
 
+  // metadata của token stream (messages-tuple): backend gắn ui_tool_call_id
+  // để ghép partial output vào đúng ToolCallBox
+  const getStreamToolCallId = useCallback(
+    (message: Message): string | undefined => {
+      const meta = stream.getMessagesMetadata(message)?.streamMetadata as
+        | Record<string, unknown>
+        | undefined;
+      const id = meta?.ui_tool_call_id;
+      return typeof id === "string" ? id : undefined;
+    },
+    [stream],
+  );
+
   return {
     messages: stream.messages,
+    values: stream.values as Record<string, unknown>,
     isLoading: stream.isLoading,
     sendMessage,
     stopStream,
+    getStreamToolCallId,
   };
 }
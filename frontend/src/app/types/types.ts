@@ -3,6 +3,7 @@ export interface ToolCall {
   name: string;
   args: any;
   result?: string;
+  partial?: string;    // token đang stream (trước khi có result)
   status: "pending" | "completed" | "error";
   startedAt?: number;  
   elapsedMs?: number;  
@@ -10,3 +10,26 @@ export function extractStringFromMessageContent(message: Message): string {
           .join("")
       : "";
 }
+
+// Backend chỉ giữ 1 bản report / section trong thread state; ToolMessage mang
+// additional_kwargs.state_ref, AIMessage cuối mang additional_kwargs.report (danh sách ref).
+export function resolveMessageText(message: Message, values: Record<string, unknown> | undefined): string {
+  const text = extractStringFromMessageContent(message);
+  const kwargs = (message as any).additional_kwargs ?? {};
+  const field = (key: unknown) => {
+    const v = typeof key === "string" ? values?.[key] : undefined;
+    return typeof v === "string" ? v : "";
+  };
+
+  if (!text && typeof kwargs.state_ref === "string") return field(kwargs.state_ref);
+
+  const report = kwargs.report;
+  if (!text && report && Array.isArray(report.sections)) {
+    let body = report.sections
+      .map((s: { title: string; ref: string }) => `## ${s.title}\n\n${field(s.ref)}`)
+      .join("\n\n---\n\n");
+    if (report.sources_md) body += `\n\n---\n\n## Sources\n\n${report.sources_md}`;
+    return body;
+  }
+  return text;
+}